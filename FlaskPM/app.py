@@ -1,13 +1,28 @@
 from flask import Flask, request, jsonify
 from config import Config
+from http_cache import NO_STORE
 from routes.auth_routes import auth_bp
 from routes.view_routes import view_bp
 from routes.api_routes import api_bp
+import metrics
+import query_budget
+import app_logging
+import session_store
+import json_provider
+import compression
 import re
 
+log = app_logging.get_logger('app')
+
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    # Cookie holds an opaque session id; the data lives server-side (session_store.py)
+    session_store.init_app(app)
+    # orjson-backed jsonify when available (json_provider.py)
+    json_provider.init_app(app)
+    # gzip/brotli for large text responses; registered first so it runs after every other hook
+    compression.init_app(app)
 
     # Init CORS (Robust RegEx for Mobile/Ngrok/Netlify)
     from flask_cors import CORS
@@ -22,25 +37,19 @@ def create_app():
              "http://localhost",
              "capacitor://localhost"
          ],
-         allow_headers=["Content-Type", "Authorization", "ngrok-skip-browser-warning"],
+         allow_headers=["Content-Type", "Authorization", "ngrok-skip-browser-warning", "If-None-Match"],
+         expose_headers=["ETag", "X-Request-ID"],
          methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
 
-    @app.after_request
-    def after_request(response):
-        origin = request.headers.get('Origin')
-        if origin:
-            print(f"  [CORS] Handshake with {origin}")
-        return response
+    # One JSON access-log record per request (request id, timing, origin, auth kind, query count),
+    # written by a background thread; see app_logging.py
+    app_logging.init_app(app)
+    Config.validate()
 
-    @app.before_request
-    def log_request_info():
-        # Enhanced Logging to help debug mobile connectivity
-        origin = request.headers.get('Origin', 'No Origin')
-        print(f"--- [{request.method}] {request.path} from {origin} ---")
-        if 'Authorization' not in request.headers:
-            print("  (!) Missing Authorization Header")
-        else:
-            print("  (✓) Authorization Header Present")
+    # Per-endpoint latency / status / query counts, exported at /metrics
+    metrics.init_app(app)
+    # N+1 / query budget checks (QUERY_DEBUG=1|strict, debug and testing modes)
+    query_budget.init_app(app)
 
     @app.route('/api/ping')
     def ping():
@@ -66,9 +75,11 @@ def create_app():
 
     @app.after_request
     def add_header(response):
-        response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-        response.headers["Pragma"] = "no-cache"
-        response.headers["Expires"] = "0"
+        # Default policy is no-store; routes opt into caching via http_cache (ETag / cache_policy)
+        if "Cache-Control" not in response.headers:
+            response.headers["Cache-Control"] = NO_STORE
+            response.headers["Pragma"] = "no-cache"
+            response.headers["Expires"] = "0"
         # Ensure CORS headers are set for credentials
         # response.headers['Access-Control-Allow-Credentials'] = 'true' 
         # (CORS library handles this usually, but good to check if issues persist)
@@ -102,18 +113,18 @@ def create_app():
                     if admin:
                         res = admin.table('users').select('id').eq('id', user_id).execute()
                         if not res.data:
-                            print(f"User {user_id} not found in DB. Forcing logout.")
+                            log.info("User not found in DB, forcing logout", extra={'user_id': user_id})
                             session.clear()
                             if '/api/' in request.path:
                                  from flask import jsonify
                                  return jsonify({"error": "User record deleted"}), 401
                             return redirect(url_for('view_bp.login'))
                 except Exception as e:
-                    print(f"Session check error: {e}")
+                    log.warning("Session check error: %s", e)
 
     # Reverse Geocode API (OSM Fallback)
-    import requests
     from flask import request, jsonify
+    import resilience
 
     # Reverse Geocode API (OSM Fallback) - Zoom 18
     @app.route("/api/reverse-geocode")
@@ -135,7 +146,12 @@ def create_app():
         }
 
         try:
-            r = requests.get(url, params=params, headers=headers, timeout=6)
+            import requests  # first use only: keeps it out of worker boot
+            # Breaker + bulkhead: a slow Nominatim fails fast to the coordinates fallback below
+            r = resilience.nominatim.call(lambda: requests.get(
+                url, params=params, headers=headers, timeout=(2, resilience.nominatim.timeout)
+            ))
+            r.raise_for_status()
             data = r.json()
             addr = data.get("address", {})
 
@@ -209,7 +225,7 @@ def create_app():
                 return jsonify({"location": location})
 
         except Exception as e:
-            print("Reverse geo error:", e)
+            log.warning("Reverse geo error: %s", e)
 
         return jsonify({"location": f"{lat}, {lon}"})
 
@@ -0,0 +1,241 @@
+"""
+Structured, non-blocking logging.
+
+- One JSON object per line: ts, level, logger, msg, request_id and any extra fields.
+- Callers only enqueue records (QueueHandler); a single background thread formats and writes
+  them, so request threads never wait on stdout. When the queue is full, records are dropped
+  and counted instead of blocking (the drop count is logged once the queue drains).
+- Sampling for high-volume lines: log.debug("...", extra=sample(0.01)) keeps ~1% of them.
+- The access log is one record per request (method, path, status, duration_ms, queries...).
+  Fast successful requests can be sampled with LOG_REQUEST_SAMPLE; errors and slow requests
+  (LOG_SLOW_MS) are always kept.
+
+Environment: LOG_LEVEL (INFO), LOG_FORMAT (json | text), LOG_QUEUE_SIZE, LOG_REQUEST_SAMPLE (1.0),
+LOG_SLOW_MS (1000).
+"""
+import os
+import sys
+import copy
+import json
+import time
+import uuid
+import queue
+import atexit
+import random
+import logging
+import threading
+import contextvars
+import logging.handlers
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+LOG_REQUEST_SAMPLE = float(os.environ.get('LOG_REQUEST_SAMPLE', 1.0))
+LOG_SLOW_MS = float(os.environ.get('LOG_SLOW_MS', 1000))
+
+ROOT_LOGGER = 'pm'
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+request_id_var = contextvars.ContextVar('pm_request_id', default=None)
+
+# LogRecord attributes that are not user-supplied fields
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'sample'}
+
+
+def get_logger(name):
+    """Logger under the 'pm' namespace (handlers are set up once by setup())."""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def sample(rate, **fields):
+    """extra= for a sampled line: kept with probability 'rate'."""
+    return {'sample': rate, **fields}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and key != 'request_id':
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, separators=(',', ':'))
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable variant for local development (LOG_FORMAT=text)."""
+    def format(self, record):
+        fields = ' '.join(f"{k}={v}" for k, v in record.__dict__.items() if k not in _RESERVED and k != 'request_id')
+        rid = f" [{record.request_id}]" if getattr(record, 'request_id', None) else ''
+        line = f"{record.levelname:<7} {record.name}{rid}: {record.getMessage()}"
+        line = f"{line}  {fields}" if fields else line
+        if record.exc_text:
+            line += '\n' + record.exc_text
+        return line
+
+
+class ContextFilter(logging.Filter):
+    """Stamps the request id and applies per-record sampling (runs in the caller's thread)."""
+    def filter(self, record):
+        rate = getattr(record, 'sample', None)
+        if rate is not None and rate < 1 and random.random() >= rate:
+            return False
+        record.request_id = request_id_var.get()
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks: a full queue drops the record and counts it."""
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def prepare(self, record):
+        # Resolve the message and traceback now (args may change after the call returns),
+        # but leave the JSON formatting to the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def take_dropped(self):
+        with self._lock:
+            dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+class _DropReporter(logging.Handler):
+    """Listener-side: reports records dropped by the queue handler."""
+    def __init__(self, source, target):
+        super().__init__()
+        self.source = source
+        self.target = target
+
+    def emit(self, record):
+        dropped = self.source.take_dropped()
+        if dropped:
+            note = logging.LogRecord(ROOT_LOGGER, logging.WARNING, __file__, 0,
+                                     "Log queue full: %d record(s) dropped", (dropped,), None)
+            self.target.handle(note)
+
+
+class StdoutHandler(logging.StreamHandler):
+    """stdout as it was at setup(); if that stream was closed since (a test runner's capture,
+    closed before the exit-time flush), whatever sys.stdout is now."""
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    def emit(self, record):
+        if getattr(self.stream, 'closed', False):
+            self.stream = sys.stdout
+        super().emit(record)
+
+
+_listener = None
+_listener_pid = None
+_setup_lock = threading.Lock()
+
+
+def setup():
+    """
+    Installs the queue handler on the 'pm' logger. Idempotent; in a forked worker (where the
+    parent's writer thread doesn't exist) it starts a fresh queue and writer.
+    """
+    global _listener, _listener_pid
+    with _setup_lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            return
+        stream = StdoutHandler()
+        stream.setFormatter(TextFormatter() if LOG_FORMAT == 'text' else JsonFormatter())
+
+        handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+        handler.addFilter(ContextFilter())
+
+        logger = logging.getLogger(ROOT_LOGGER)
+        logger.handlers = [handler]
+        logger.setLevel(LOG_LEVEL)
+        logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(handler.queue, stream, _DropReporter(handler, stream))
+        _listener.start()
+        if _listener_pid is None:
+            atexit.register(shutdown)
+        _listener_pid = os.getpid()
+
+
+def shutdown():
+    """Flushes queued records (called at exit)."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            _listener.stop()
+        _listener = None
+
+
+# ---------------- REQUEST LOG ----------------
+access_log = get_logger('request')
+
+
+def init_app(app):
+    setup()
+    from flask import request, g
+
+    @app.before_request
+    def start_request_log():
+        rid = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex[:16]
+        g.request_id = rid[:64]
+        g.request_log_token = request_id_var.set(g.request_id)
+        g.request_log_start = time.perf_counter()
+
+    @app.after_request
+    def write_request_log(response):
+        start = g.get('request_log_start')
+        if start is None:
+            return response
+        duration_ms = (time.perf_counter() - start) * 1000
+        response.headers[REQUEST_ID_HEADER] = g.request_id
+
+        status = response.status_code
+        important = status >= 500 or duration_ms >= LOG_SLOW_MS
+        if important or LOG_REQUEST_SAMPLE >= 1 or random.random() < LOG_REQUEST_SAMPLE:
+            tally = g.get('metrics_queries')
+            level = logging.ERROR if status >= 500 else logging.WARNING if duration_ms >= LOG_SLOW_MS else logging.INFO
+            access_log.log(level, "%s %s %s", request.method, request.path, status, extra={
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.url_rule.rule if request.url_rule else None,
+                'status': status,
+                'duration_ms': round(duration_ms, 2),
+                'queries': tally.count if tally else None,
+                'db_ms': round(tally.seconds * 1000, 2) if tally else None,
+                'origin': request.headers.get('Origin'),
+                'auth': 'bearer' if 'Authorization' in request.headers else ('session' if request.cookies else None),
+                'bytes': response.calculate_content_length(),
+            })
+        return response
+
+    @app.teardown_request
+    def end_request_log(exc):
+        token = g.pop('request_log_token', None)
+        if token is not None:
+            request_id_var.reset(token)
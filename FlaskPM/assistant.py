@@ -0,0 +1,426 @@
+"""
+AI chat assistant (/api/chat).
+
+Per-message work is kept to the model call itself:
+  - one GenerativeModel handle per process (created on first use),
+  - a workspace context snapshot refreshed in the background every CONTEXT_TTL_SECONDS
+    instead of two count queries per message,
+  - a TTL + LRU response cache keyed by the normalized prompt and the context version, so
+    repeated questions are answered without calling the model.
+stream_answer() serves /api/chat/stream (Server-Sent Events): tokens are forwarded as the model
+produces them and generation is cancelled when the client goes away. At most
+ASSISTANT_MAX_CONCURRENCY model calls run per process, so chat can't tie up every worker thread,
+and Gemini calls go through the 'gemini' circuit breaker (resilience.py): when it is failing or
+timing out, chat fails fast with AssistantUnavailable instead of waiting on it.
+Set ASSISTANT_MODEL=fake to use FakeModel (local, no API key) in development and tests.
+Questions are grounded with the top RETRIEVAL_TOP_K tasks/projects/comments the user can see,
+looked up in the in-process index (search_index.py).
+"""
+import os
+import re
+import time
+import queue
+import hashlib
+import threading
+import warnings
+from types import SimpleNamespace
+from collections import OrderedDict
+from config import Config
+from app_logging import get_logger
+import resilience
+
+log = get_logger('assistant')
+
+MODEL_NAME = os.environ.get('GEMINI_MODEL', 'gemini-1.5-flash')
+CONTEXT_TTL_SECONDS = int(os.environ.get('ASSISTANT_CONTEXT_TTL', 60))
+RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get('ASSISTANT_CACHE_TTL', 600))
+RESPONSE_CACHE_ENTRIES = int(os.environ.get('ASSISTANT_CACHE_ENTRIES', 256))
+# 'gemini' (default) or 'fake'
+MODEL_BACKEND = os.environ.get('ASSISTANT_MODEL', 'gemini')
+
+MAX_CONCURRENCY = int(os.environ.get('ASSISTANT_MAX_CONCURRENCY', 4))
+# How long a request waits for a free slot before getting "busy"
+SLOT_WAIT_SECONDS = 2
+# SSE comment sent while the model is quiet (also how disconnects get noticed between tokens)
+STREAM_HEARTBEAT_SECONDS = 10
+STREAM_TIMEOUT_SECONDS = 120
+RETRIEVAL_TOP_K = int(os.environ.get('ASSISTANT_RETRIEVAL_TOP_K', 5))
+
+PROMPT_TEMPLATE = '''
+You are the AI assistant for Antigravity PM.
+
+Context:
+{context}
+
+Relevant items:
+{relevant}
+
+User:
+{message}
+
+Rules:
+- Be friendly and concise (max 60 words)
+- Stay related to projects/tasks
+- Guide user to UI for actions
+- Base answers about specific tasks/projects on the relevant items only
+'''
+
+
+# ---------------- MODEL HANDLE ----------------
+_model = None
+_model_lock = threading.Lock()
+
+
+class FakeModel:
+    """
+    Local stand-in for GenerativeModel: answers with canned text, streamed word by word with a
+    small delay, so streaming, cancellation and concurrency can be exercised without Gemini.
+    """
+    def __init__(self, chunk_delay=0.05):
+        self.chunk_delay = chunk_delay
+
+    def _reply(self, prompt):
+        question = prompt.split('User:')[-1].split('Rules:')[0].strip()
+        return f"(offline assistant) You asked: \"{question}\". Open the Projects or Tasks page to take action."
+
+    def _chunks(self, text):
+        for word in re.findall(r'\S+\s*', text):
+            time.sleep(self.chunk_delay)
+            yield SimpleNamespace(text=word)
+
+    def generate_content(self, prompt, stream=False):
+        text = self._reply(prompt)
+        if stream:
+            return self._chunks(text)
+        time.sleep(self.chunk_delay)
+        return SimpleNamespace(text=text)
+
+
+def is_configured():
+    return MODEL_BACKEND == 'fake' or bool(Config.GEMINI_API_KEY)
+
+
+def get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None and MODEL_BACKEND == 'fake':
+                _model = FakeModel()
+            elif _model is None:
+                # Suppress Google's FutureWarning
+                warnings.filterwarnings("ignore", category=FutureWarning)
+                import google.generativeai as genai
+                genai.configure(api_key=Config.GEMINI_API_KEY)
+                _model = genai.GenerativeModel(MODEL_NAME)
+    return _model
+
+
+# ---------------- CONTEXT SNAPSHOT ----------------
+
+class ContextSnapshot:
+    """
+    Workspace summary for the prompt. The first call loads it; after that a stale snapshot is
+    served while a background thread refreshes it, so messages never wait on the database.
+    'version' changes whenever the text does (it is part of the response cache key).
+    """
+    def __init__(self, loader, ttl=CONTEXT_TTL_SECONDS):
+        self.loader = loader
+        self.ttl = ttl
+        self.text = None
+        self.version = None
+        self.loaded_at = 0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _refresh(self):
+        try:
+            text = self.loader()
+        except Exception as e:
+            log.warning("Context error: %s", e)
+            text = self.text or "Workspace data unavailable"
+        with self._lock:
+            self.text = text
+            self.version = hashlib.sha1(text.encode()).hexdigest()[:12]
+            self.loaded_at = time.time()
+            self._refreshing = False
+
+    def get(self):
+        with self._lock:
+            stale = time.time() - self.loaded_at >= self.ttl
+            first = self.text is None
+            if stale and not first and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._refresh, daemon=True).start()
+        if first:
+            self._refresh()
+        return self.text, self.version
+
+
+def load_workspace_context():
+    from utils import supabase
+    p = supabase.table("projects").select("id", count="exact").limit(1).execute()
+    t = supabase.table("tasks").select("id", count="exact").limit(1).execute()
+    return f"Projects: {p.count}, Tasks: {t.count}"
+
+
+context_snapshot = ContextSnapshot(load_workspace_context)
+
+
+# ---------------- RESPONSE CACHE ----------------
+
+class ResponseCache:
+    """Small thread-safe LRU with per-entry expiry."""
+    def __init__(self, max_entries=RESPONSE_CACHE_ENTRIES, ttl=RESPONSE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if not entry:
+                return None
+            value, expires = entry
+            if expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.time() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+response_cache = ResponseCache()
+
+
+def normalize_prompt(message):
+    """'  What can you DO?? ' and 'what can you do' share a cache entry."""
+    text = re.sub(r'\s+', ' ', message.lower()).strip()
+    return text.rstrip('?!. ')
+
+
+def build_prompt(message, context, snippets=()):
+    relevant = "\n".join(f"- {s}" for s in snippets) or "(none found)"
+    return PROMPT_TEMPLATE.format(context=context, relevant=relevant, message=message)
+
+
+def retrieve(message, user_id):
+    """Relevant snippets for the user plus a short digest of them (part of the cache key)."""
+    if not user_id:
+        return [], None
+    try:
+        from search_index import retrieve as search
+        snippets = search(message, user_id, k=RETRIEVAL_TOP_K)
+    except Exception as e:
+        log.warning("Retrieval error: %s", e)
+        snippets = []
+    digest = hashlib.sha1("\n".join(snippets).encode()).hexdigest()[:12] if snippets else None
+    return snippets, digest
+
+
+# ---------------- CONCURRENCY ----------------
+chat_slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+
+
+class AssistantBusy(Exception):
+    pass
+
+
+class AssistantUnavailable(Exception):
+    def __init__(self, retry_after=0):
+        super().__init__("The assistant is temporarily unavailable. Please try again in a minute.")
+        self.retry_after = retry_after
+
+
+class Slot:
+    """
+    One of the chat_slots, held for as long as the model is actually working on a request.
+    The thread that calls the model wraps the call in start()/release(); the request side
+    calls abandon() when it stops waiting (finished, timed out, client gone). The slot goes
+    back when both are done, exactly once, so a model call that outlives its request still
+    counts against ASSISTANT_MAX_CONCURRENCY.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running = False
+        self._abandoned = False
+        self._released = False
+
+    def start(self):
+        """False when the request already gave up: don't call the model at all."""
+        with self._lock:
+            if self._abandoned:
+                return False
+            self._running = True
+            return True
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        chat_slots.release()
+
+    def abandon(self):
+        with self._lock:
+            self._abandoned = True
+            running = self._running
+        if not running:
+            self.release()
+
+
+def acquire_slot(timeout=SLOT_WAIT_SECONDS):
+    if not chat_slots.acquire(timeout=timeout):
+        raise AssistantBusy("The assistant is busy right now. Please try again in a moment.")
+    return Slot()
+
+
+def answer(message, user_id=None):
+    """Returns (response_text, cached). Raises AssistantBusy when all slots are taken."""
+    context, version = context_snapshot.get()
+    snippets, digest = retrieve(message, user_id)
+    # Answers grounded on different items (other user, data changed) are cached separately
+    key = (normalize_prompt(message), version, digest)
+
+    cached = response_cache.get(key)
+    if cached is not None:
+        return cached, True
+
+    slot = acquire_slot()
+
+    def generate(prompt):
+        # Runs on the 'gemini' bulkhead, possibly after call() stopped waiting for it
+        if not slot.start():
+            return None
+        try:
+            return get_model().generate_content(prompt)
+        finally:
+            slot.release()
+
+    try:
+        response = resilience.gemini.call(generate, build_prompt(message, context, snippets))
+    except (resilience.DependencyUnavailable, resilience.DependencyTimeout):
+        raise AssistantUnavailable(resilience.gemini.breaker.retry_after())
+    finally:
+        slot.abandon()
+    if not response or not getattr(response, "text", None):
+        raise Exception("Empty response from Gemini")
+
+    response_cache.set(key, response.text)
+    return response.text, False
+
+
+# ---------------- STREAMING ----------------
+
+def cancel_stream(stream):
+    # Gemini streams wrap a gRPC/REST iterator that can be cancelled from another thread
+    iterator = getattr(stream, '_iterator', None)
+    cancel = getattr(iterator, 'cancel', None)
+    if cancel:
+        try:
+            cancel()
+        except Exception:
+            pass
+
+
+def stream_answer(message, user_id=None, slot=None, heartbeat=STREAM_HEARTBEAT_SECONDS, timeout=STREAM_TIMEOUT_SECONDS):
+    """
+    Generator of (event, payload) pairs for one answer:
+      ('token', text)*, then ('done', {'cached': bool}) or ('error', message);
+      ('ping', None) while waiting on the model.
+    The model is read on a separate thread so the caller keeps control between tokens;
+    closing this generator (client disconnected) stops generation.
+    'slot' (from acquire_slot) is released by the model thread when it actually finishes, or
+    here when no model call is needed; the caller should also abandon() it when the response
+    closes, in case the generator was never started.
+    """
+    slot = slot or acquire_slot()
+    try:
+        yield from _stream_answer(message, user_id, slot, heartbeat, timeout)
+    finally:
+        slot.abandon()
+
+
+def _stream_answer(message, user_id, slot, heartbeat, timeout):
+    context, version = context_snapshot.get()
+    snippets, digest = retrieve(message, user_id)
+    key = (normalize_prompt(message), version, digest)
+
+    cached = response_cache.get(key)
+    if cached is not None:
+        yield 'token', cached
+        yield 'done', {'cached': True}
+        return
+
+    events = queue.Queue()
+    cancelled = threading.Event()
+    holder = {}
+
+    def produce():
+        if not slot.start():
+            return
+        parts = []
+        try:
+            # Failures and stalls (see first_token below) count against the 'gemini' breaker
+            with resilience.gemini.guard():
+                holder['stream'] = get_model().generate_content(build_prompt(message, context, snippets), stream=True)
+                for chunk in holder['stream']:
+                    if cancelled.is_set():
+                        log.info("Chat stream cancelled (client disconnected)")
+                        return
+                    text = getattr(chunk, 'text', None)
+                    if text:
+                        parts.append(text)
+                        events.put(('token', text))
+                if not parts:
+                    raise Exception("Empty response from Gemini")
+            # Only complete answers are cached
+            response_cache.set(key, ''.join(parts))
+            events.put(('done', {'cached': False}))
+        except resilience.DependencyUnavailable:
+            events.put(('error', str(AssistantUnavailable())))
+        except Exception as e:
+            if not cancelled.is_set():
+                log.error("Gemini stream error: %r", e)
+                events.put(('error', "I'm having trouble thinking right now. Please try again later."))
+        finally:
+            # Only now is the model done with this request
+            slot.release()
+
+    threading.Thread(target=produce, daemon=True, name='chat-stream').start()
+
+    started = time.time()
+    deadline = started + timeout
+    first_token = started + resilience.gemini.timeout
+    got_token = False
+    try:
+        while True:
+            try:
+                event = events.get(timeout=heartbeat)
+            except queue.Empty:
+                now = time.time()
+                if now > deadline or (not got_token and now > first_token):
+                    if not got_token:
+                        # The producer is stuck on the model: let the breaker know
+                        resilience.gemini.breaker.record_failure()
+                    yield 'error', "The assistant took too long to answer."
+                    return
+                yield 'ping', None
+                continue
+            got_token = got_token or event[0] == 'token'
+            yield event
+            if event[0] in ('done', 'error'):
+                return
+    finally:
+        cancelled.set()
+        cancel_stream(holder.get('stream'))
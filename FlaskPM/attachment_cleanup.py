@@ -0,0 +1,257 @@
+"""
+Attachment storage cleanup.
+
+- purge_storage_orphans(): drains the storage_orphans queue (filled by the task_attachments
+  delete trigger in setup_attachment_cleanup.sql, including cascaded task/project deletes) with
+  batched storage.remove([...]) calls.
+- reconcile_bucket(): full sweep that diffs the bucket listing against the keys referenced by
+  task_attachments / attachment_blobs and removes anything unreferenced (catches objects leaked
+  before the trigger existed, failed uploads, etc.). Tables are read by key (keyset pages) and
+  every batch is re-checked against the DB right before it is removed.
+"""
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from utils import get_supabase_admin, keyset_rows
+from storage import get_storage, content_key, ATTACHMENTS_BUCKET
+from thumbnails import thumbnail_keys
+from app_logging import get_logger
+
+log = get_logger('attachment_cleanup')
+
+# Keys per storage.remove() call / per queue read
+ORPHAN_BATCH_SIZE = 100
+# Upper bound on batches per purge run (the scheduler picks up the rest next tick)
+ORPHAN_MAX_BATCHES = 20
+# Rows per page when collecting referenced keys
+REFERENCE_PAGE_SIZE = 1000
+# Objects younger than this are never swept (uploads in flight, previews not yet recorded)
+RECONCILE_GRACE_HOURS = 24
+
+THUMB_KEY = re.compile(r'^thumbs/[0-9a-f]{2}/([0-9a-f]{64})-(?:thumb|preview)\.webp$')
+BLOB_KEY = re.compile(r'^blobs/[0-9a-f]{2}/([0-9a-f]{64})$')
+# Per-row thumbnails of attachments stored before deduplication: <task_id>/thumbs/<attachment_id>-...
+LEGACY_THUMB_KEY = re.compile(r'^[^/]+/thumbs/([^/]+)-(?:thumb|preview)\.webp$')
+
+
+def content_hash_of(path):
+    """The content hash a content-addressed key (original or thumbnail) belongs to, or None."""
+    m = BLOB_KEY.match(path) or THUMB_KEY.match(path)
+    return m.group(1) if m else None
+
+
+def batched(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def live_keys(admin_client, paths):
+    """Subset of 'paths' that is referenced again (content re-uploaded after being queued)."""
+    paths = list(paths)
+    live = set()
+    b_res = admin_client.table('attachment_blobs').select('storage_path').in_('storage_path', paths).execute()
+    live.update(r['storage_path'] for r in b_res.data or [])
+    a_res = admin_client.table('task_attachments').select('storage_path').in_('storage_path', paths).execute()
+    live.update(r['storage_path'] for r in a_res.data or [])
+
+    thumb_hashes = {m.group(1): p for p in paths for m in [THUMB_KEY.match(p)] if m}
+    if thumb_hashes:
+        t_res = admin_client.table('attachment_blobs').select('content_hash').in_('content_hash', list(thumb_hashes)).execute()
+        live_hashes = {r['content_hash'] for r in t_res.data or []}
+        live.update(p for p in paths if (m := THUMB_KEY.match(p)) and m.group(1) in live_hashes)
+    return live
+
+
+def claim_blobs(admin_client, hashes):
+    """
+    Content hashes whose objects may be removed now (setup_attachment_dedup.sql). A claimed blob
+    can't be re-acquired until finish_blobs(): uploads of the same content wait for the removal
+    and then store the object again, so a reference never points at a removed object.
+    """
+    if not hashes:
+        return set()
+    res = admin_client.rpc('claim_attachment_blobs', {'p_content_hashes': sorted(hashes)}).execute()
+    return {b['content_hash'] for b in res.data or []}
+
+
+def finish_blobs(admin_client, hashes):
+    if hashes:
+        admin_client.rpc('finish_attachment_blobs', {'p_content_hashes': sorted(hashes)}).execute()
+
+
+def remove_blobs(admin_client, hashes, storage=None):
+    """Removes released blobs (object + thumbnails) under a claim. Returns the claimed hashes."""
+    claimed = claim_blobs(admin_client, hashes)
+    if claimed:
+        blobs = admin_client.table('attachment_blobs').select('content_hash, storage_path')\
+            .in_('content_hash', sorted(claimed)).execute()
+        keys = [key for b in blobs.data or [] for key in (b['storage_path'], *thumbnail_keys(None, b['content_hash']))]
+        (storage or get_storage()).remove(keys)
+        finish_blobs(admin_client, claimed)
+    return claimed
+
+
+def removable_keys(admin_client, paths):
+    """
+    Subset of queued 'paths' that can be removed, plus the blob claims to finish afterwards.
+    Content-addressed keys need a claim on their blob; other keys must not be referenced again.
+    """
+    by_hash = {}
+    plain = set()
+    for path in paths:
+        content_hash = content_hash_of(path)
+        if content_hash:
+            by_hash.setdefault(content_hash, set()).add(path)
+        else:
+            plain.add(path)
+
+    removable = plain - live_keys(admin_client, plain) if plain else set()
+    claimed = set()
+    if by_hash:
+        try:
+            claimed = claim_blobs(admin_client, by_hash)
+        except Exception as e:
+            # Claim RPCs missing (setup_attachment_dedup.sql not re-run): leave these to reconcile
+            log.warning("Blob claim failed, keeping %d queued blob keys: %s", len(by_hash), e)
+        # Unclaimed hashes are live again, mid-upload or already removed: keep their objects.
+        # A claimed blob goes as a whole: its other keys may sit in a later batch, unclaimable
+        # once this claim is finished.
+        for content_hash in claimed:
+            removable |= by_hash[content_hash]
+            removable.update((content_key(content_hash), *thumbnail_keys(None, content_hash)))
+    return removable, claimed
+
+
+def purge_storage_orphans(admin_client=None, batch_size=ORPHAN_BATCH_SIZE, max_batches=ORPHAN_MAX_BATCHES):
+    """Removes queued orphan objects in batches. Returns the number of objects removed."""
+    admin_client = admin_client or get_supabase_admin()
+    if not admin_client:
+        return 0
+
+    removed = 0
+    for _ in range(max_batches):
+        res = admin_client.table('storage_orphans').select('id, bucket, storage_path').order('id').limit(batch_size).execute()
+        rows = res.data or []
+        if not rows:
+            break
+
+        by_bucket = {}
+        for row in rows:
+            by_bucket.setdefault(row.get('bucket') or ATTACHMENTS_BUCKET, set()).add(row['storage_path'])
+
+        for bucket, paths in by_bucket.items():
+            paths, claimed = removable_keys(admin_client, paths)
+            if paths:
+                # Objects that are already gone are simply skipped by Storage
+                get_storage(bucket).remove(sorted(paths))
+                removed += len(paths)
+            finish_blobs(admin_client, claimed)
+
+        # Only dequeue after the removes went through; a failure leaves the rows for the next run
+        admin_client.table('storage_orphans').delete().in_('id', [r['id'] for r in rows]).execute()
+        if len(rows) < batch_size:
+            break
+
+    if removed:
+        log.info("Storage cleanup: removed %d orphaned objects", removed)
+    return removed
+
+
+def referenced_keys(admin_client):
+    """Every object key the attachment tables still point at (originals and thumbnails)."""
+    keys = set()
+    attachments = keyset_rows(
+        lambda: admin_client.table('task_attachments').select('id, task_id, storage_path, content_hash, thumbnail_url'),
+        'id', REFERENCE_PAGE_SIZE)
+    for row in attachments:
+        if row.get('storage_path'):
+            keys.add(row['storage_path'])
+        if row.get('content_hash'):
+            keys.update(thumbnail_keys(None, row['content_hash']))
+        elif row.get('thumbnail_url'):
+            keys.update(thumbnail_keys(row))
+
+    blobs = keyset_rows(lambda: admin_client.table('attachment_blobs').select('content_hash, storage_path'), 'content_hash', REFERENCE_PAGE_SIZE)
+    for row in blobs:
+        keys.add(row['storage_path'])
+        keys.update(thumbnail_keys(None, row['content_hash']))
+    return keys
+
+
+def still_orphaned(admin_client, paths):
+    """
+    Re-checks candidates right before removal: drops any key referenced since the sweep read
+    the tables (new attachment rows, revived blobs, legacy thumbnails of an existing row).
+    """
+    paths = set(paths)
+    if not paths:
+        return []
+    live = live_keys(admin_client, paths)
+    legacy = {m.group(1): p for p in paths - live for m in [LEGACY_THUMB_KEY.match(p)] if m}
+    if legacy:
+        res = admin_client.table('task_attachments').select('id').in_('id', list(legacy)).execute()
+        live.update(legacy[str(r['id'])] for r in res.data or [])
+    return sorted(paths - live)
+
+
+def reconcile_bucket(admin_client=None, dry_run=True, grace_hours=RECONCILE_GRACE_HOURS, bucket=ATTACHMENTS_BUCKET):
+    """
+    Diffs the bucket listing against the referenced keys and removes unreferenced objects older
+    than the grace period. With dry_run only the report is produced.
+    """
+    admin_client = admin_client or get_supabase_admin()
+    storage = get_storage(bucket)
+    if not admin_client or not storage:
+        raise RuntimeError("Admin client not available")
+
+    # List first: anything uploaded after the listing can't be swept by mistake
+    # (path -> updated_at; a path listed twice by an offset-paged walk counts once)
+    listing = dict(storage.list_objects())
+    referenced = referenced_keys(admin_client)
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=grace_hours)
+
+    orphans = sorted(
+        path for path, updated_at in listing.items()
+        if path not in referenced and (updated_at is None or updated_at < cutoff)
+    )
+
+    removed = 0
+    if not dry_run:
+        for batch in batched(orphans, ORPHAN_BATCH_SIZE):
+            batch = still_orphaned(admin_client, batch)
+            if batch:
+                storage.remove(batch)
+                removed += len(batch)
+        log.info("Storage reconcile: %d objects, %d orphaned, %d removed", len(listing), len(orphans), removed)
+
+    return {
+        "bucket": bucket,
+        "dry_run": dry_run,
+        "objects": len(listing),
+        "referenced": len(referenced),
+        "orphaned": len(orphans),
+        "removed": removed,
+        "sample": orphans[:20]
+    }
+
+
+# ---------------- BACKGROUND PURGE ----------------
+# Delete endpoints call request_purge() so storage is freed shortly after the DB rows go,
+# without making the request wait on Storage. Requests made while a purge is queued coalesce.
+_purge_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='storage-purge')
+_purge_queued = threading.Event()
+
+
+def _run_purge():
+    _purge_queued.clear()
+    try:
+        purge_storage_orphans()
+    except Exception as e:
+        log.error("Storage Cleanup Error: %s", e)
+
+
+def request_purge():
+    if not _purge_queued.is_set():
+        _purge_queued.set()
+        _purge_pool.submit(_run_purge)
@@ -0,0 +1,318 @@
+"""
+Resized, cached member avatars for /api/avatars/<user_id>.
+
+Each (user, size) is rendered once to a small WebP:
+  - from the user's avatar_url (Google profile image), downloaded and centre-cropped, or
+  - locally as an initials avatar when there is no avatar_url or the download fails.
+Renders live in an in-process LRU (hot set) backed by a disk cache shared by all workers.
+Every render records the version it was made from (avatar_version(): the same hash the
+frontend puts in ?v=), so a URL for a newer picture is never answered with an older render,
+even by a worker whose memory copy predates invalidate().
+invalidate() drops a user's renders (called when set_session sees a new avatar_url or the
+name changes) and re-renders the sizes that were cached in the background.
+Only https images on the Supabase project and Google's avatar hosts are downloaded.
+"""
+import io
+import os
+import re
+import glob
+import time
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from app_logging import get_logger
+
+log = get_logger('avatars')
+
+# Requested sizes are snapped up to one of these, so the cache holds a handful of variants
+AVATAR_SIZES = (32, 48, 64, 96, 128, 256)
+DEFAULT_SIZE = 64
+MEMORY_CACHE_ENTRIES = int(os.environ.get('AVATAR_MEMORY_CACHE_ENTRIES', 512))
+# How long a render is trusted before the user row is looked at again
+MEMORY_TTL_SECONDS = 10 * 60
+# A render whose version was just checked against the user row answers requests for other
+# versions (stale or made-up ?v=) for this long instead of looking the user up again
+VERIFIED_SECONDS = 10
+# Unknown user ids are remembered for this long (the route is public)
+MISSING_TTL_SECONDS = 60
+DISK_TTL_SECONDS = 7 * 24 * 3600
+DOWNLOAD_TIMEOUT = 5
+MAX_SOURCE_BYTES = 5 * 1024 * 1024
+
+# Background colours for initials avatars (picked deterministically per user)
+PALETTE = ((16, 185, 129), (59, 130, 246), (139, 92, 246), (236, 72, 153),
+           (245, 158, 11), (239, 68, 68), (20, 184, 166), (100, 116, 139))
+
+# Hosts avatar_url may point at: Google profile pictures and the project's own Storage
+GOOGLE_AVATAR_HOST = re.compile(r'^lh\d+\.googleusercontent\.com$')
+EXTRA_AVATAR_HOSTS = {h.strip().lower() for h in os.environ.get('AVATAR_ALLOWED_HOSTS', '').split(',') if h.strip()}
+
+_memory = OrderedDict()   # (user_id, size) -> (bytes, etag, stored_at, version, checked_at)
+_memory_lock = threading.Lock()
+# Striped: a fixed set of locks however many ids the public route is asked for
+_render_locks = [threading.Lock() for _ in range(64)]
+_refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='avatars')
+
+
+def snap_size(requested):
+    try:
+        requested = int(requested)
+    except (TypeError, ValueError):
+        return DEFAULT_SIZE
+    for size in AVATAR_SIZES:
+        if requested <= size:
+            return size
+    return AVATAR_SIZES[-1]
+
+
+def initials(name):
+    parts = [p for p in (name or '').replace('@', ' ').split() if p]
+    if not parts:
+        return '?'
+    if len(parts) == 1:
+        return parts[0][0].upper()
+    return (parts[0][0] + parts[-1][0]).upper()
+
+
+def _font(size):
+    from PIL import ImageFont
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1: bitmap font only
+        return ImageFont.load_default()
+
+
+def render_initials(user_id, name, size):
+    from PIL import Image, ImageDraw
+    color = PALETTE[int(hashlib.md5(str(user_id).encode()).hexdigest(), 16) % len(PALETTE)]
+    img = Image.new('RGB', (size, size), color)
+    draw = ImageDraw.Draw(img)
+    draw.text((size / 2, size / 2), initials(name), fill=(255, 255, 255), font=_font(int(size * 0.42)), anchor='mm')
+    return img
+
+
+def avatar_version(user):
+    """
+    Short hash of the picture URL and name, identical to the frontend's avatarSrc() 'v'
+    (djb2 over UTF-16 code units, unsigned 32-bit, base 36).
+    """
+    text = f"{user.get('avatar_url') or ''}|{user.get('full_name') or ''}"
+    units = text.encode('utf-16-le')
+    h = 5381
+    for i in range(0, len(units), 2):
+        h = (h * 33 + int.from_bytes(units[i:i + 2], 'little')) & 0xFFFFFFFF
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    out = ''
+    while True:
+        h, r = divmod(h, 36)
+        out = digits[r] + out
+        if not h:
+            return out
+
+
+def allowed_source(url):
+    """Whether avatar_url may be fetched by the server (https on an allow-listed host only)."""
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        return False
+    host = (parsed.hostname or '').lower()
+    if parsed.scheme != 'https' or not host:
+        return False
+    supabase_host = (urlparse(Config.SUPABASE_URL or '').hostname or '').lower()
+    return bool(GOOGLE_AVATAR_HOST.match(host)) or host == supabase_host or host in EXTRA_AVATAR_HOSTS
+
+
+def fetch_image(url):
+    if not allowed_source(url):
+        raise ValueError("Avatar host not allowed")
+    import requests
+    from PIL import Image, ImageOps
+    # No redirects: the target host must be the allow-listed one
+    with requests.get(url, timeout=DOWNLOAD_TIMEOUT, stream=True, allow_redirects=False) as res:
+        res.raise_for_status()
+        if res.is_redirect:
+            raise ValueError("Avatar URL redirects")
+        data = io.BytesIO()
+        for chunk in res.iter_content(64 * 1024):
+            data.write(chunk)
+            if data.tell() > MAX_SOURCE_BYTES:
+                raise ValueError("Avatar image too large")
+    data.seek(0)
+    img = Image.open(data)
+    img.draft('RGB', (AVATAR_SIZES[-1], AVATAR_SIZES[-1]))
+    return ImageOps.exif_transpose(img).convert('RGB')
+
+
+def render(user_id, user, size):
+    """WebP bytes for one user/size (remote photo when possible, initials otherwise)."""
+    # Pillow is imported on first render, not at worker boot
+    from PIL import Image, ImageOps
+    img = None
+    if user.get('avatar_url'):
+        try:
+            img = ImageOps.fit(fetch_image(user['avatar_url']), (size, size), Image.LANCZOS)
+        except Exception as e:
+            log.warning("Avatar fetch failed for %s: %s", user_id, e)
+    if img is None:
+        img = render_initials(user_id, user.get('full_name') or user.get('email'), size)
+    out = io.BytesIO()
+    img.save(out, 'WEBP', quality=85)
+    return out.getvalue()
+
+
+# ---------------- CACHE ----------------
+
+def _user_dir(user_id):
+    # user ids are UUIDs; anything else is hashed so it can't escape the cache dir
+    safe_id = str(user_id) if str(user_id).replace('-', '').isalnum() else hashlib.sha1(str(user_id).encode()).hexdigest()
+    return os.path.join(Config.AVATAR_CACHE_DIR, safe_id)
+
+
+def _disk_path(user_id, size, version):
+    return os.path.join(_user_dir(user_id), f"{size}-{version}.webp")
+
+
+def _read_disk(user_id, size, version=None):
+    """(bytes, version) of a fresh disk render: the requested version, or the newest one."""
+    if version is not None:
+        paths = [_disk_path(user_id, size, version)]
+    else:
+        paths = sorted(glob.glob(os.path.join(_user_dir(user_id), f"{size}-*.webp")), key=_mtime, reverse=True)[:1]
+    for path in paths:
+        if time.time() - _mtime(path) < DISK_TTL_SECONDS:
+            try:
+                with open(path, 'rb') as f:
+                    return f.read(), os.path.basename(path)[len(f"{size}-"):-len('.webp')]
+            except OSError:
+                pass
+    return None, None
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0
+
+
+def _write_disk(user_id, size, version, data):
+    path = _disk_path(user_id, size, version)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{threading.get_ident()}.part"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+    # Older versions of this size are no longer served
+    for old in glob.glob(os.path.join(os.path.dirname(path), f"{size}-*.webp")):
+        if old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+def _remember(key, data, etag, version, checked_at=0):
+    with _memory_lock:
+        _memory[key] = (data, etag, time.time(), version, checked_at)
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_CACHE_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def _render_lock(key):
+    return _render_locks[hash(key) % len(_render_locks)]
+
+
+def load_user(user_id):
+    from utils import get_supabase_admin
+    res = get_supabase_admin().table('users').select('full_name, email, avatar_url').eq('id', user_id).execute()
+    return res.data[0] if res.data else None
+
+
+def _cached(key, version):
+    """The memory entry that may answer a request for 'version' (None: any current render)."""
+    now = time.time()
+    with _memory_lock:
+        hit = _memory.get(key)
+        if not hit:
+            return None
+        ttl = MISSING_TTL_SECONDS if hit[0] is None else MEMORY_TTL_SECONDS
+        if now - hit[2] >= ttl:
+            return None
+        if hit[0] is not None and version is not None and hit[3] != version and now - hit[4] >= VERIFIED_SECONDS:
+            # Another version was asked for and ours wasn't checked lately: look at the user row
+            return None
+        _memory.move_to_end(key)
+        return hit
+
+
+def get_avatar(user_id, size, version=None, load_user=load_user):
+    """
+    Returns (webp_bytes, etag, version) for the user's current picture, or (None, None, None)
+    for unknown users. 'version' is the ?v= the client asked for: a cached render of another
+    version is only served after the user row confirmed it is the current one.
+    The user row is only loaded on a cache miss.
+    """
+    key = (str(user_id), size)
+    hit = _cached(key, version)
+    if hit:
+        return hit[0], hit[1], hit[3]
+
+    # One render per key at a time; concurrent requests wait and reuse it
+    with _render_lock(key):
+        hit = _cached(key, version)
+        if hit:
+            return hit[0], hit[1], hit[3]
+
+        data, disk_version = _read_disk(user_id, size, version)
+        if data is not None:
+            etag = hashlib.sha1(data).hexdigest()[:16]
+            _remember(key, data, etag, disk_version)
+            return data, etag, disk_version
+
+        user = load_user(user_id)
+        if user is None:
+            _remember(key, None, None, None)
+            return None, None, None
+        current = avatar_version(user)
+        data, _ = _read_disk(user_id, size, current)
+        if data is None:
+            data = render(user_id, user, size)
+            _write_disk(user_id, size, current, data)
+        etag = hashlib.sha1(data).hexdigest()[:16]
+        _remember(key, data, etag, current, checked_at=time.time())
+        return data, etag, current
+
+
+def invalidate(user_id, refresh=True):
+    """
+    Drops every cached size for a user. With 'refresh', the sizes that were cached are
+    re-rendered in the background so the next page load is still a cache hit.
+    Other workers keep their in-memory copies until they expire, but never serve them for
+    a newer ?v= (see get_avatar).
+    """
+    user_id = str(user_id)
+    with _memory_lock:
+        for key in [k for k in _memory if k[0] == user_id]:
+            del _memory[key]
+
+    user_dir = _user_dir(user_id)
+    sizes = []
+    if os.path.isdir(user_dir):
+        sizes = sorted({int(n.split('-')[0]) for n in os.listdir(user_dir) if n.endswith('.webp') and n.split('-')[0].isdigit()})
+        shutil.rmtree(user_dir, ignore_errors=True)
+
+    if refresh and sizes:
+        def rerender():
+            for size in sizes:
+                try:
+                    get_avatar(user_id, size)
+                except Exception as e:
+                    log.warning("Avatar refresh failed for %s: %s", user_id, e)
+        _refresh_pool.submit(rerender)
@@ -0,0 +1,334 @@
+"""
+Benchmark: API throughput and latency against an in-process Supabase stand-in.
+
+The real Flask app (create_app, real routes) runs with its Supabase clients swapped for
+fake_supabase.FakeSupabaseClient, seeded from datasets.py at one or more scales. Every query
+waits --latency-ms (plus up to --jitter-ms) to model the round trip to hosted Supabase.
+Nothing leaves the machine: SMTP, Nominatim and Gemini are failed via resilience fault injection.
+
+Measured: req/s, p50/p90/p99 for the dashboard endpoints and attendance punch, and the
+duration of one scheduler tick (deadline + calendar reminder checks). The JSON report
+carries the git commit and parameters so runs can be compared across commits.
+
+Usage (from FlaskPM/):
+    python benchmarks/bench_api.py
+    python benchmarks/bench_api.py --scales small medium large --latency-ms 20 --concurrency 8 --output bench.json
+    python benchmarks/bench_api.py --compare before.json after.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import socket
+import argparse
+import platform
+import itertools
+import threading
+import subprocess
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Keep the access log out of the timings and the terminal
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from fake_supabase import FakeDatabase, FakeSupabaseClient, install
+from datasets import SCALES, generate
+
+REPORT_VERSION = 1
+
+
+# ---------------- HARNESS ----------------
+
+def create_bench_app(db):
+    """The production app wired to the stand-in database, with outbound services failed fast."""
+    import metrics
+    import resilience
+    from app import create_app
+
+    install(metrics.instrument(FakeSupabaseClient(db)))
+    for name in ('smtp', 'nominatim', 'gemini'):
+        resilience.inject_fault(name, error=True)
+    return create_app()
+
+
+class Clients:
+    """Logged-in test clients, one per (thread, user): browser session cookie or Bearer token."""
+
+    def __init__(self, app, users, auth='session'):
+        self.app = app
+        self.users = {u['id']: u for u in users}
+        self.auth = auth
+        self.local = threading.local()
+
+    def get(self, user_id):
+        cache = self.local.__dict__.setdefault('clients', {})
+        client = cache.get(user_id)
+        if client is None:
+            client = cache[user_id] = self.app.test_client()
+            user = self.users[user_id]
+            if self.auth == 'session':
+                with client.session_transaction() as sess:
+                    sess['user'] = {'id': user_id, 'email': user['email'],
+                                    'user_metadata': {'full_name': user['full_name']}}
+        return client
+
+    def headers(self, user_id):
+        return {'Authorization': f"Bearer fake-{user_id}"} if self.auth == 'bearer' else {}
+
+    def request(self, method, path, user_id, **kwargs):
+        response = self.get(user_id).open(path, method=method, headers=self.headers(user_id), **kwargs)
+        response.close()
+        return response.status_code
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies, wall, errors, db, requests):
+    latencies = sorted(latencies)
+    ms = lambda s: round(s * 1000, 3)
+    return {
+        'requests': requests,
+        'errors': errors,
+        'rps': round(requests / wall, 2) if wall else 0.0,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p90_ms': ms(percentile(latencies, 90)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+        'max_ms': ms(latencies[-1]) if latencies else 0.0,
+        'queries_per_request': round(db.queries / requests, 2) if requests else 0.0,
+        # Python time spent inside the stand-in (the real database does this work elsewhere)
+        'stub_cpu_ms_per_request': ms(db.cpu_seconds / requests) if requests else 0.0,
+    }
+
+
+def measure(db, send, requests, concurrency=1, warmup=0, before=None):
+    """
+    Runs send(worker, i) 'requests' times across 'concurrency' threads; send returns an HTTP
+    status (or None for non-HTTP work). before(worker, i), if given, runs untimed first.
+    """
+    for i in range(warmup):
+        if before:
+            before(0, i)
+        send(0, i)
+
+    db.reset_counters()
+    tickets = itertools.count()
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def worker(w):
+        for i in itertools.count():
+            if next(tickets) >= requests:
+                return
+            if before:
+                before(w, i)
+            start = time.perf_counter()
+            status = send(w, i)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if status is not None and status >= 400:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize(latencies, time.perf_counter() - start, errors[0], db, requests)
+
+
+# ---------------- SCENARIOS ----------------
+
+def read_endpoints():
+    """(name, path) for the GETs the dashboard, projects, calendar and bell icon make."""
+    now = datetime.now(timezone.utc)
+    start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(days=7)
+    end = start + timedelta(days=42)
+    return [
+        ('GET /api/stats', '/api/stats'),
+        ('GET /api/projects', '/api/projects'),
+        ('GET /api/calendar/events', f"/api/calendar/events?start={start.date()}&end={end.date()}"),
+        ('GET /api/notifications', '/api/notifications'),
+    ]
+
+
+def bench_reads(db, clients, user_ids, args):
+    results = {}
+    for name, path in read_endpoints():
+        send = lambda w, i, path=path: clients.request('GET', path, user_ids[(w * 7919 + i) % len(user_ids)])
+        results[name] = measure(db, send, args.requests, args.concurrency, args.warmup)
+    return results
+
+
+def bench_punch(db, clients, user_ids, args):
+    """Punch in, then out, per user; each worker owns a slice of users and reopens their day when it wraps."""
+    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    workers = max(1, min(args.concurrency, len(user_ids)))
+    slices = [user_ids[w::workers] for w in range(workers)]
+
+    def reopen_day(owned):
+        owned = set(owned)
+        with db.lock:
+            rows = db.table_rows('attendance')
+            rows[:] = [r for r in rows if not (r['date'] == today and r['user_id'] in owned)]
+            db.changed('attendance')
+
+    def before(w, i):
+        if i % (2 * len(slices[w])) == 0:
+            reopen_day(slices[w])
+
+    def send(w, i):
+        user_id = slices[w][(i // 2) % len(slices[w])]
+        return clients.request('POST', '/api/attendance/punch', user_id, json={'location': {'lat': 13.08, 'lng': 80.27}})
+
+    reopen_day(user_ids)
+    stats = measure(db, send, args.requests, workers, 0, before)
+    reopen_day(user_ids)
+    return stats
+
+
+def bench_scheduler(db, args):
+    import scheduler
+
+    def tick(w, i):
+        scheduler.check_task_deadlines()
+        scheduler.check_calendar_reminders()
+
+    # The first tick sends the pending reminders; later ticks are the steady state
+    return measure(db, tick, args.ticks, 1, warmup=1)
+
+
+def run_scale(app, db, scale, args):
+    dataset = generate(scale, seed=args.seed)
+    db.load(dataset)
+    clients = Clients(app, dataset['users'], args.auth)
+    user_ids = [u['id'] for u in dataset['users']]
+
+    endpoints = bench_reads(db, clients, user_ids, args)
+    endpoints['POST /api/attendance/punch'] = bench_punch(db, clients, user_ids, args)
+    endpoints['scheduler tick'] = bench_scheduler(db, args)
+    return {
+        'dataset': {table: len(rows) for table, rows in dataset.items()},
+        'endpoints': endpoints,
+    }
+
+
+# ---------------- REPORT ----------------
+
+def git_revision():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True, timeout=10).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                                    capture_output=True, text=True, timeout=30).stdout.strip())
+    except (OSError, subprocess.SubprocessError):
+        return {'commit': None, 'dirty': None}
+    return {'commit': commit or None, 'dirty': dirty}
+
+
+def environment():
+    return {
+        'host': socket.gethostname(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def print_results(scale, result):
+    print(f"\n[{scale}] " + ", ".join(f"{t}={n}" for t, n in result['dataset'].items()))
+    print(f"  {'endpoint':<30} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'queries':>8} {'errors':>7}")
+    for name, s in result['endpoints'].items():
+        print(f"  {name:<30} {s['rps']:>9.1f} {s['p50_ms']:>9.2f} {s['p99_ms']:>9.2f} "
+              f"{s['queries_per_request']:>8.1f} {s['errors']:>7}")
+
+
+def compare(base_path, new_path, threshold):
+    """Prints p50/p99/req/s changes; returns the number of regressions beyond 'threshold' %."""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"base: {base['git'].get('commit')}  new: {new['git'].get('commit')}")
+    if base.get('params') != new.get('params'):
+        print("warning: parameters differ between the two runs")
+
+    def change(old, cur):
+        return (cur - old) / old * 100 if old else 0.0
+
+    regressions = 0
+    for scale, result in new['results'].items():
+        old_result = base['results'].get(scale)
+        if not old_result:
+            continue
+        print(f"\n[{scale}]")
+        print(f"  {'endpoint':<30} {'p50':>17} {'p99':>17} {'req/s':>17}")
+        for name, s in result['endpoints'].items():
+            o = old_result['endpoints'].get(name)
+            if not o:
+                continue
+            deltas = (change(o['p50_ms'], s['p50_ms']), change(o['p99_ms'], s['p99_ms']), change(o['rps'], s['rps']))
+            worse = deltas[0] > threshold or deltas[1] > threshold or deltas[2] < -threshold
+            regressions += worse
+            cells = [f"{s['p50_ms']:.2f} ({deltas[0]:+.0f}%)", f"{s['p99_ms']:.2f} ({deltas[1]:+.0f}%)",
+                     f"{s['rps']:.1f} ({deltas[2]:+.0f}%)"]
+            print(f"  {name:<30} {cells[0]:>17} {cells[1]:>17} {cells[2]:>17}" + ("  REGRESSION" if worse else ""))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument("--scales", nargs="+", default=['small', 'medium'], choices=sorted(SCALES))
+    parser.add_argument("--latency-ms", type=float, default=15, help="simulated round trip per Supabase query")
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--ticks", type=int, default=10, help="measured scheduler ticks")
+    parser.add_argument("--auth", choices=('session', 'bearer'), default='session')
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", nargs=2, metavar=('BASE', 'NEW'), help="compare two reports and exit")
+    parser.add_argument("--threshold", type=float, default=10, help="regression threshold in %% for --compare")
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(*args.compare, args.threshold)
+        print(f"\n{regressions} regression(s) beyond {args.threshold:.0f}%")
+        sys.exit(1 if regressions else 0)
+
+    db = FakeDatabase(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000)
+    app = create_bench_app(db)
+
+    report = {
+        'benchmark': 'api',
+        'version': REPORT_VERSION,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git': git_revision(),
+        'environment': environment(),
+        'params': {k: getattr(args, k) for k in ('latency_ms', 'jitter_ms', 'requests', 'concurrency',
+                                                 'warmup', 'ticks', 'auth', 'seed')},
+        'results': {},
+    }
+    for scale in args.scales:
+        result = report['results'][scale] = run_scale(app, db, scale, args)
+        print_results(scale, result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
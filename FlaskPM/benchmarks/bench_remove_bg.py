@@ -0,0 +1,72 @@
+"""
+Benchmark: vectorized image_utils.remove_white_background() vs the original per-pixel loop.
+
+Usage (from FlaskPM/):
+    python benchmarks/bench_remove_bg.py
+    python benchmarks/bench_remove_bg.py --sizes 256 1024 2048 --repeat 3
+"""
+import os
+import sys
+import time
+import argparse
+import warnings
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_utils import remove_white_background
+
+
+def remove_white_bg_loop(img):
+    """The original remove_bg_script implementation (pixel by pixel in Python)."""
+    img = img.convert("RGBA")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)  # kept as-is for comparison
+        datas = img.getdata()
+
+    new_data = []
+    for item in datas:
+        if item[0] > 240 and item[1] > 240 and item[2] > 240:
+            new_data.append((255, 255, 255, 0))
+        else:
+            new_data.append(item)
+
+    img.putdata(new_data)
+    return img
+
+
+def make_logo(size):
+    """Synthetic logo: coloured shapes and anti-aliased text on a noisy white background."""
+    img = Image.effect_noise((size, size), 6).point(lambda v: 255 - abs(v - 128) // 8).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((size * 0.1, size * 0.1, size * 0.6, size * 0.6), fill=(16, 120, 200))
+    draw.rectangle((size * 0.45, size * 0.45, size * 0.9, size * 0.8), fill=(240, 90, 30))
+    draw.text((size * 0.1, size * 0.85), "DIGIANCHORZ", fill=(30, 30, 30))
+    return img
+
+
+def best_of(fn, img, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(img)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 512, 1024, 2048])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'size':>10} {'loop (s)':>10} {'vectorized (s)':>15} {'speedup':>9}  identical")
+    for size in args.sizes:
+        img = make_logo(size)
+        loop_t, loop_out = best_of(remove_white_bg_loop, img, args.repeat)
+        vec_t, vec_out = best_of(remove_white_background, img, args.repeat)
+        identical = loop_out.tobytes() == vec_out.tobytes()
+        print(f"{size:>4}x{size:<5} {loop_t:>10.4f} {vec_t:>15.4f} {loop_t / vec_t:>8.1f}x  {identical}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark: JSON serialization time and bytes on the wire for the app's large responses.
+
+Payloads are the real responses of /api/projects, /api/tasks, /api/calendar/events, /api/stats,
+/api/notifications and /api/team, fetched through the app on the Supabase stand-in (datasets.py)
+as an Admin (who sees everything, i.e. the largest bodies) or a team member.
+
+For each payload:
+  - serialize: building the jsonify() response with Flask's stdlib provider vs json_provider's
+    OrjsonProvider (median of --repeat runs)
+  - bytes and compression time for identity, gzip (COMPRESS_GZIP_LEVEL) and brotli
+    (COMPRESS_BROTLI_QUALITY, when the brotli package is installed), as compression.py sends them
+
+Usage (from FlaskPM/):
+    python benchmarks/bench_serialization.py
+    python benchmarks/bench_serialization.py --scales small medium large --role member --output ser.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('SESSION_BACKEND', 'memory')
+
+from flask.json.provider import DefaultJSONProvider
+from fake_supabase import FakeDatabase
+from datasets import SCALES, generate
+from bench_api import create_bench_app, git_revision, environment
+
+REPORT_VERSION = 1
+
+
+def payload_paths():
+    now = datetime.now(timezone.utc)
+    start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(days=7)
+    end = start + timedelta(days=42)
+    return [
+        ('/api/projects', '/api/projects'),
+        ('/api/tasks', '/api/tasks'),
+        ('/api/calendar/events', f"/api/calendar/events?start={start.date()}&end={end.date()}"),
+        ('/api/stats', '/api/stats'),
+        ('/api/notifications', '/api/notifications'),
+        ('/api/team', '/api/team'),
+    ]
+
+
+def fetch_payloads(app, user):
+    """{name: python object} as the endpoints return them (decoded from the identity body)."""
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user'] = {'id': user['id'], 'email': user['email'], 'user_metadata': {'full_name': user['full_name']}}
+    payloads = {}
+    for name, path in payload_paths():
+        res = client.get(path, headers={'Accept-Encoding': 'identity'})
+        if res.status_code != 200:
+            raise SystemExit(f"{path} returned {res.status_code}")
+        payloads[name] = json.loads(res.data)
+    return payloads
+
+
+def median_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return round(statistics.median(times) * 1000, 3)
+
+
+def measure_payload(app, obj, repeat):
+    import json_provider
+    import compression
+
+    providers = {'stdlib': DefaultJSONProvider(app)}
+    if json_provider.orjson is not None:
+        providers['orjson'] = json_provider.OrjsonProvider(app)
+
+    result = {'serialize_ms': {}}
+    body = None
+    with app.app_context():
+        for name, provider in providers.items():
+            result['serialize_ms'][name] = median_ms(lambda: provider.response(obj).get_data(), repeat)
+            body = provider.response(obj).get_data()
+
+    result['bytes'] = {'identity': len(body)}
+    result['compress_ms'] = {}
+    for encoding in compression.encodings():
+        result['bytes'][encoding] = len(compression.compress(body, encoding))
+        result['compress_ms'][encoding] = median_ms(lambda: compression.compress(body, encoding), repeat)
+    return result
+
+
+def run_scale(scale, role, repeat):
+    db = FakeDatabase(latency=0)
+    dataset = generate(scale)
+    db.load(dataset)
+    app = create_bench_app(db)
+    wanted = 'Admin' if role == 'admin' else 'Team Member'
+    user = next(u for u in dataset['users'] if u['role'] == wanted)
+    payloads = fetch_payloads(app, user)
+    return {name: measure_payload(app, obj, repeat) for name, obj in payloads.items()}
+
+
+def print_results(scale, results):
+    encodings = [e for e in ('gzip', 'br') if any(e in r['bytes'] for r in results.values())]
+    header = f"  {'payload':<22} {'bytes':>9} " + ''.join(f"{e + ' bytes':>12} {e + ' ms':>8} " for e in encodings)
+    print(f"\n[{scale}]\n{header} {'stdlib ms':>10} {'orjson ms':>10}")
+    for name, r in results.items():
+        row = f"  {name:<22} {r['bytes']['identity']:>9} "
+        for e in encodings:
+            ratio = r['bytes'][e] / r['bytes']['identity']
+            row += f"{r['bytes'][e]:>7} {ratio:>4.0%} {r['compress_ms'][e]:>8.2f} "
+        orjson_ms = r['serialize_ms'].get('orjson')
+        row += f" {r['serialize_ms']['stdlib']:>10.3f} " + (f"{orjson_ms:>10.3f}" if orjson_ms is not None else f"{'n/a':>10}")
+        print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument("--scales", nargs="+", default=['small', 'medium'], choices=sorted(SCALES))
+    parser.add_argument("--role", default='admin', choices=('admin', 'member'))
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    report = {
+        'benchmark': 'serialization',
+        'version': REPORT_VERSION,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git': git_revision(),
+        'environment': environment(),
+        'params': {k: v for k, v in vars(args).items() if k != 'output'},
+        'results': {},
+    }
+    for scale in args.scales:
+        report['results'][scale] = run_scale(scale, args.role, args.repeat)
+        print_results(scale, report['results'][scale])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Synthetic datasets for the offline benchmarks, shaped like the production tables
+(users, projects, project_members, tasks, comments, calendar_events, notifications, attendance).
+
+generate(scale) is deterministic for a given scale and seed; dates are relative to "now" so
+the scheduler's deadline and reminder windows always contain work.
+"""
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+
+# Row counts per scale
+SCALES = {
+    'small': {'users': 10, 'projects': 5, 'tasks': 200, 'events': 40, 'notifications': 500, 'attendance_days': 20},
+    'medium': {'users': 50, 'projects': 25, 'tasks': 2000, 'events': 300, 'notifications': 5000, 'attendance_days': 30},
+    'large': {'users': 200, 'projects': 100, 'tasks': 20000, 'events': 1500, 'notifications': 40000, 'attendance_days': 30},
+}
+
+ADMIN_RATIO = 10          # one admin per 10 users
+MEMBERS_PER_PROJECT = 6
+
+STATUSES = ('To Do', 'In Progress', 'Completed')
+PRIORITIES = ('Low', 'Medium', 'High')
+EVENT_PRIORITIES = ('Normal', 'Medium', 'High')
+WORDS = ('invoice', 'client', 'launch', 'review', 'design', 'budget', 'report', 'onboarding',
+         'website', 'campaign', 'audit', 'migration', 'payroll', 'vendor', 'contract', 'roadmap',
+         'survey', 'hiring', 'backup', 'dashboard', 'training', 'analytics', 'support', 'release')
+
+
+def _iso(dt):
+    return dt.isoformat()
+
+
+def _phrase(rng, n):
+    return ' '.join(rng.choice(WORDS) for _ in range(n)).capitalize()
+
+
+def generate(scale='small', seed=42, now=None):
+    """{table: [rows]} for one of SCALES (or a dict with the same keys)."""
+    size = SCALES[scale] if isinstance(scale, str) else scale
+    rng = random.Random(seed)
+    uid = lambda: str(uuid.UUID(int=rng.getrandbits(128)))
+    now = now or datetime.now(timezone.utc)
+    created = lambda days: _iso(now - timedelta(days=days, minutes=rng.randint(0, 1439)))
+
+    users = []
+    for i in range(size['users']):
+        users.append({
+            'id': uid(),
+            'email': f"user{i}@example.com",
+            'full_name': f"{rng.choice(('Asha', 'Ravi', 'Meena', 'Karthik', 'Divya', 'Arun', 'Priya', 'Vijay'))} {i}",
+            'role': 'Admin' if i % ADMIN_RATIO == 0 else 'Team Member',
+            'avatar_url': None,
+            'created_at': created(400),
+            'updated_at': created(90),
+        })
+    user_ids = [u['id'] for u in users]
+    admins = [u['id'] for u in users if u['role'] == 'Admin']
+
+    projects, members = [], []
+    for i in range(size['projects']):
+        pid = uid()
+        projects.append({
+            'id': pid,
+            'title': f"{_phrase(rng, 2)} {i}",
+            'description': _phrase(rng, 8),
+            'owner_id': rng.choice(admins),
+            'status': rng.choice(('Active', 'Active', 'Active', 'Completed')),
+            'created_at': created(rng.randint(30, 365)),
+            'updated_at': created(rng.randint(0, 30)),
+        })
+        for member in rng.sample(user_ids, min(MEMBERS_PER_PROJECT, len(user_ids))):
+            members.append({'id': uid(), 'project_id': pid, 'user_id': member, 'role': 'Member',
+                            'created_at': created(30), 'updated_at': created(30)})
+    team = {}
+    for m in members:
+        team.setdefault(m['project_id'], []).append(m['user_id'])
+
+    tasks = []
+    for i in range(size['tasks']):
+        project = rng.choice(projects)
+        status = rng.choice(STATUSES)
+        # Deadlines from two weeks ago to a month out; a few inside the 12h reminder window
+        hours = rng.choice((rng.uniform(1, 11), rng.uniform(-336, 720), rng.uniform(-336, 720), None))
+        deadline = now + timedelta(hours=hours) if hours is not None else None
+        tasks.append({
+            'id': i + 1,
+            'project_id': project['id'],
+            'title': f"{_phrase(rng, 3)} #{i}",
+            'description': _phrase(rng, 12),
+            'status': status,
+            'priority': rng.choice(PRIORITIES),
+            'assigned_to': rng.choice(team[project['id']]) if rng.random() > 0.1 else None,
+            'created_by': project['owner_id'],
+            'deadline': _iso(deadline) if deadline else None,
+            # Past deadlines were already emailed about (the benchmarks never reach SMTP)
+            'overdue_notified': bool(deadline and deadline < now),
+            'reminder_sent': bool(deadline and deadline < now + timedelta(hours=12) and rng.random() < 0.5),
+            'created_at': created(rng.randint(0, 60)),
+            'updated_at': created(rng.randint(0, 7)),
+        })
+
+    comments = []
+    for task in rng.sample(tasks, len(tasks) // 5):
+        for _ in range(rng.randint(1, 3)):
+            comments.append({'id': uid(), 'task_id': task['id'], 'user_id': rng.choice(user_ids),
+                             'content': _phrase(rng, 10), 'created_at': created(rng.randint(0, 30))})
+
+    events = []
+    for i in range(size['events']):
+        start = now + timedelta(hours=rng.uniform(-240, 480))
+        events.append({
+            'id': i + 1,
+            'user_id': rng.choice(user_ids),
+            'title': _phrase(rng, 3),
+            'description': _phrase(rng, 6),
+            'start_time': _iso(start),
+            'end_time': _iso(start + timedelta(minutes=rng.choice((30, 60, 90)))),
+            'priority': rng.choice(EVENT_PRIORITIES),
+            'reminders': rng.choice(([], ['same_day'], ['one_day_before'], ['same_day', 'one_day_before'])),
+            'created_at': created(rng.randint(1, 60)),
+            'updated_at': created(0),
+        })
+
+    notifications = []
+    for _ in range(size['notifications']):
+        notifications.append({
+            'id': uid(),
+            'user_id': rng.choice(user_ids),
+            'title': rng.choice(('New Task Created', 'Task Completed', 'Deadline Approaching', 'Reminder')),
+            'message': _phrase(rng, 10),
+            'link': f"/projects/{rng.choice(projects)['id']}",
+            'is_read': rng.random() < 0.7,
+            'created_at': created(rng.randint(0, 90)),
+        })
+
+    attendance = []
+    for day in range(1, size['attendance_days'] + 1):
+        date = now - timedelta(days=day)
+        for user_id in user_ids:
+            if rng.random() < 0.1:
+                continue
+            punch_in = date.replace(hour=9, minute=0) + timedelta(minutes=rng.randint(-20, 45))
+            attendance.append({
+                'id': uid(),
+                'user_id': user_id,
+                'date': date.strftime('%Y-%m-%d'),
+                'punch_in': _iso(punch_in),
+                'punch_out': _iso(punch_in + timedelta(hours=rng.uniform(7, 10))),
+                'status': 'Present',
+                'location': {'lat': 13.08 + rng.uniform(-0.05, 0.05), 'lng': 80.27 + rng.uniform(-0.05, 0.05)},
+                'created_at': _iso(punch_in),
+            })
+
+    return {
+        'users': users,
+        'projects': projects,
+        'project_members': members,
+        'tasks': tasks,
+        'comments': comments,
+        'calendar_events': events,
+        'notifications': notifications,
+        'attendance': attendance,
+    }
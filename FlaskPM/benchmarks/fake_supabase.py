@@ -0,0 +1,545 @@
+"""
+In-process stand-in for the supabase-py client, used by the offline benchmarks.
+
+Covers the subset of the client the app uses: table()/from_() with select/insert/update/
+upsert/delete, the eq/neq/gt/gte/lt/lte/in_/is_/ilike/or_ filters and .not_, order/limit/range,
+single/maybe_single, count="exact", embedded selects such as 'user:user_id(id, full_name)',
+rpc() against registered Python functions, and auth.get_user() for "fake-<user id>" tokens.
+
+Every query sleeps for the configured latency (plus jitter) outside the database lock, so
+concurrent requests overlap their round trips the way they do against hosted Supabase.
+Results are encoded to JSON by the stand-in and decoded in the caller, like the real client
+does, so the app pays its own parsing cost. Time spent evaluating and encoding queries is
+tracked separately (FakeDatabase.cpu_seconds) so a report can tell the app's cost from the
+stand-in's. eq() filters and embedded lookups use per-column hash indexes, which keeps
+the stand-in cheap at the larger dataset scales.
+"""
+import copy
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from functools import lru_cache
+from types import SimpleNamespace
+
+
+class FakeAPIError(Exception):
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _coerce(value, sample):
+    """Filter values arrive as strings (PostgREST syntax); compare them as the column's type."""
+    if isinstance(sample, bool):
+        return str(value).lower() == 'true' if isinstance(value, str) else bool(value)
+    if isinstance(sample, (int, float)) and isinstance(value, str):
+        try:
+            return type(sample)(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _cmp(op, left, right):
+    if left is None:
+        return False
+    right = _coerce(right, left)
+    if isinstance(left, (int, float)) != isinstance(right, (int, float)):
+        left, right = str(left), str(right)
+    if op == 'eq':
+        return left == right
+    if op == 'neq':
+        return left != right
+    if op == 'gt':
+        return left > right
+    if op == 'gte':
+        return left >= right
+    if op == 'lt':
+        return left < right
+    if op == 'lte':
+        return left <= right
+    raise FakeAPIError(f"Unsupported operator {op}")
+
+
+def _sort_key(value):
+    # Numbers sort numerically (as in Postgres), so keyset paging with gt() agrees with order()
+    if value is None:
+        return (1, 0, '')
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, 0, value)
+    return (0, 1, str(value))
+
+
+def _split_top(text, sep=','):
+    """Splits on separators outside parentheses."""
+    parts, depth, buf = [], 0, ''
+    for ch in text:
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        if ch == sep and depth == 0:
+            parts.append(buf)
+            buf = ''
+        else:
+            buf += ch
+    if buf:
+        parts.append(buf)
+    return [p.strip() for p in parts if p.strip()]
+
+
+@lru_cache(maxsize=256)
+def _parse_select(select):
+    """'id, user:user_id(id, full_name)' -> (('id', None, None), ('user', 'user_id', 'id, full_name'))"""
+    fields = []
+    for part in _split_top(select):
+        m = re.match(r'^(?:(\w+):)?(\w+)(?:!\w+)?\((.*)\)$', part)
+        if m:
+            fields.append((m.group(1) or m.group(2), m.group(2), m.group(3)))
+        else:
+            fields.append((part, None, None))
+    return tuple(fields)
+
+
+def _index_key(value):
+    """Hash key for an eq() value, or None when the comparison needs type coercion."""
+    if isinstance(value, bool) or value is None or str(value).lower() in ('true', 'false'):
+        return None
+    return str(value)
+
+
+class FakeDatabase:
+    # Embedded select target -> (table, local foreign key) when the target names a table;
+    # any other target is a foreign key column pointing at users (e.g. 'user:user_id(...)')
+    TABLE_FKS = {'projects': 'project_id', 'users': 'user_id', 'tasks': 'task_id'}
+
+    # parent table -> [(child table, fk)] for ON DELETE CASCADE
+    CASCADES = {'projects': [('tasks', 'project_id'), ('project_members', 'project_id')],
+                'tasks': [('comments', 'task_id'), ('task_attachments', 'task_id')]}
+
+    # Tables with bigint identity keys (the rest use uuids)
+    SERIAL_TABLES = {'tasks', 'calendar_events', 'deleted_records'}
+
+    def __init__(self, latency=0.0, jitter=0.0):
+        self.tables = {}
+        self.latency = latency
+        self.jitter = jitter
+        self.lock = threading.RLock()
+        self.rpcs = {}
+        self.queries = 0
+        self.cpu_seconds = 0.0
+        self._next_id = 1
+        self._versions = {}
+        self._indexes = {}
+
+    def table_rows(self, name):
+        return self.tables.setdefault(name, [])
+
+    def changed(self, name):
+        """Invalidates the table's indexes (call after modifying its rows directly)."""
+        self._versions[name] = self._versions.get(name, 0) + 1
+
+    def index(self, name, column):
+        """{str(value): [rows in table order]} for one column, rebuilt after writes."""
+        version = self._versions.get(name, 0)
+        cached = self._indexes.get((name, column))
+        if cached is None or cached[0] != version:
+            index = {}
+            for row in self.table_rows(name):
+                index.setdefault(str(row.get(column)), []).append(row)
+            cached = self._indexes[(name, column)] = (version, index)
+        return cached[1]
+
+    def seed(self, name, rows):
+        with self.lock:
+            rows = copy.deepcopy(rows)
+            self.table_rows(name).extend(rows)
+            self.changed(name)
+            numeric = [r['id'] for r in rows if isinstance(r.get('id'), int)]
+            if numeric:
+                self._next_id = max(self._next_id, max(numeric) + 1)
+
+    def load(self, dataset):
+        """Replaces all tables with {table: [rows]}."""
+        with self.lock:
+            self.tables = {}
+            self._next_id = 1
+            self._indexes = {}
+            for name, rows in dataset.items():
+                self.seed(name, rows)
+
+    def next_id(self):
+        with self.lock:
+            value = self._next_id
+            self._next_id += 1
+        return value
+
+    def register_rpc(self, name, fn):
+        """fn(db, **params) runs under the database lock (and calls db.changed() for tables it writes)."""
+        self.rpcs[name] = fn
+
+    def round_trip(self):
+        with self.lock:
+            self.queries += 1
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+    def reset_counters(self):
+        with self.lock:
+            self.queries = 0
+            self.cpu_seconds = 0.0
+
+    def after_delete(self, table, deleted):
+        for child, fk in self.CASCADES.get(table, []):
+            ids = {str(d.get('id')) for d in deleted}
+            rows = self.table_rows(child)
+            gone = [r for r in rows if str(r.get(fk)) in ids]
+            if gone:
+                rows[:] = [r for r in rows if str(r.get(fk)) not in ids]
+                self.changed(child)
+                self.after_delete(child, gone)
+
+    # --- embedded resources ---
+    def embed(self, row, target, cols):
+        if target in self.TABLE_FKS:
+            table, fk = target, self.TABLE_FKS[target]
+        else:
+            table, fk = 'users', target
+        ref = row.get(fk)
+        if ref is None:
+            return None
+        matches = self.index(table, 'id').get(str(ref))
+        return self.project(matches[0], cols) if matches else None
+
+    def project(self, row, select):
+        """The selected columns of a stored row (shares values; results are JSON-encoded after)."""
+        if select in (None, '', '*'):
+            return row
+        out = {}
+        for name, target, cols in _parse_select(select):
+            if target is not None:
+                out[name] = self.embed(row, target, cols)
+            elif name == '*':
+                out.update(row)
+            else:
+                out[name] = row.get(name)
+        return out
+
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.op = 'select'
+        self.columns = '*'
+        self.payload = None
+        self.filters = []
+        self.lookup = None      # (column, key) of the first plain eq() filter
+        self.orders = []
+        self.limit_n = None
+        self.offset = None
+        self.is_single = False
+        self.maybe = False
+        self.count_mode = None
+        self.on_conflict = 'id'
+        self._negate = False
+
+    # --- operations ---
+    def select(self, columns='*', count=None, **kwargs):
+        if self.op == 'select':
+            self.columns = columns
+        self.count_mode = count
+        return self
+
+    def insert(self, payload, **kwargs):
+        self.op, self.payload = 'insert', payload
+        return self
+
+    def upsert(self, payload, on_conflict='id', **kwargs):
+        self.op, self.payload, self.on_conflict = 'upsert', payload, on_conflict or 'id'
+        return self
+
+    def update(self, payload, **kwargs):
+        self.op, self.payload = 'update', payload
+        return self
+
+    def delete(self, **kwargs):
+        self.op = 'delete'
+        return self
+
+    # --- filters ---
+    @property
+    def not_(self):
+        self._negate = True
+        return self
+
+    def _add(self, fn):
+        negate, self._negate = self._negate, False
+        self.filters.append((lambda r: not fn(r)) if negate else fn)
+        return self
+
+    def eq(self, col, val):
+        if self.lookup is None and not self._negate and _index_key(val) is not None:
+            self.lookup = (col, _index_key(val))
+        return self._add(lambda r: _cmp('eq', r.get(col), val))
+
+    def neq(self, col, val):
+        return self._add(lambda r: _cmp('neq', r.get(col), val))
+
+    def gt(self, col, val):
+        return self._add(lambda r: _cmp('gt', r.get(col), val))
+
+    def gte(self, col, val):
+        return self._add(lambda r: _cmp('gte', r.get(col), val))
+
+    def lt(self, col, val):
+        return self._add(lambda r: _cmp('lt', r.get(col), val))
+
+    def lte(self, col, val):
+        return self._add(lambda r: _cmp('lte', r.get(col), val))
+
+    def in_(self, col, values):
+        wanted = {str(v) for v in values}
+        return self._add(lambda r: str(r.get(col)) in wanted)
+
+    def is_(self, col, val):
+        if val in ('null', None):
+            return self._add(lambda r: r.get(col) is None)
+        return self._add(lambda r: r.get(col) == (str(val).lower() == 'true'))
+
+    def ilike(self, col, pattern):
+        rx = re.compile('^' + re.escape(pattern).replace('%', '.*') + '$', re.I)
+        return self._add(lambda r: r.get(col) is not None and bool(rx.match(str(r.get(col)))))
+
+    def or_(self, expr, **kwargs):
+        preds = []
+        for cond in _split_top(expr):
+            col, op, val = cond.split('.', 2)
+            if op == 'in':
+                wanted = {v.strip() for v in val.strip('()').split(',') if v.strip()}
+                preds.append(lambda r, c=col, w=wanted: str(r.get(c)) in w)
+            elif op == 'is':
+                preds.append(lambda r, c=col: r.get(c) is None)
+            else:
+                preds.append(lambda r, c=col, o=op, v=val: _cmp(o, r.get(c), v))
+        return self._add(lambda r: any(p(r) for p in preds))
+
+    # --- modifiers ---
+    def order(self, col, desc=False, **kwargs):
+        self.orders.append((col, desc))
+        return self
+
+    def limit(self, n, **kwargs):
+        self.limit_n = n
+        return self
+
+    def range(self, start, end, **kwargs):
+        self.offset = start
+        self.limit_n = end - start + 1
+        return self
+
+    def single(self):
+        self.is_single = True
+        return self
+
+    def maybe_single(self):
+        self.is_single = self.maybe = True
+        return self
+
+    def _match(self, row):
+        return all(f(row) for f in self.filters)
+
+    def _candidates(self, rows):
+        if self.lookup is None:
+            return rows
+        return self.db.index(self.table, self.lookup[0]).get(self.lookup[1], ())
+
+    def execute(self):
+        db = self.db
+        db.round_trip()
+        # CPU time of this thread: waiting for the lock or the GIL doesn't count
+        start = time.thread_time()
+        try:
+            with db.lock:
+                data, total = getattr(self, f"_{self.op}")(db.table_rows(self.table))
+                if self.op != 'select':
+                    db.changed(self.table)
+                body = json.dumps(data, default=str)
+        finally:
+            elapsed = time.thread_time() - start
+            with db.lock:
+                db.cpu_seconds += elapsed
+
+        data = json.loads(body)
+        count = total if self.count_mode else None
+        if self.is_single:
+            if len(data) == 1:
+                return FakeResponse(data[0], count)
+            if self.maybe and not data:
+                return None
+            raise FakeAPIError("JSON object requested, multiple (or no) rows returned", 'PGRST116')
+        return FakeResponse(data, count)
+
+    def _select(self, rows):
+        result = [r for r in self._candidates(rows) if self._match(r)]
+        for col, desc in reversed(self.orders):
+            result.sort(key=lambda r: _sort_key(r.get(col)), reverse=desc)
+        total = len(result)
+        if self.offset:
+            result = result[self.offset:]
+        if self.limit_n is not None:
+            result = result[:self.limit_n]
+        return [self.db.project(r, self.columns) for r in result], total
+
+    def _insert(self, rows):
+        db = self.db
+        payload = self.payload if isinstance(self.payload, list) else [self.payload]
+        data = []
+        for item in payload:
+            item = {k: (_now_iso() if v == 'now()' else v) for k, v in item.items()}
+            existing = None
+            if self.op == 'upsert' and self.on_conflict in item:
+                key = str(item[self.on_conflict])
+                existing = next((r for r in rows if str(r.get(self.on_conflict)) == key), None)
+            if existing is not None:
+                existing.update(copy.deepcopy(item))
+                existing['updated_at'] = _now_iso()
+                data.append(existing)
+                continue
+            row = copy.deepcopy(item)
+            row.setdefault('id', db.next_id() if self.table in db.SERIAL_TABLES else str(uuid.uuid4()))
+            row.setdefault('created_at', _now_iso())
+            row.setdefault('updated_at', row['created_at'])
+            rows.append(row)
+            data.append(row)
+        return data, len(data)
+
+    _upsert = _insert
+
+    def _update(self, rows):
+        data = []
+        for r in self._candidates(rows):
+            if self._match(r):
+                r.update(copy.deepcopy(self.payload))
+                r['updated_at'] = _now_iso()
+                data.append(r)
+        return data, len(data)
+
+    def _delete(self, rows):
+        db = self.db
+        gone = [r for r in self._candidates(rows) if self._match(r)]
+        if gone:
+            removed = set(map(id, gone))
+            rows[:] = [r for r in rows if id(r) not in removed]
+            log = db.table_rows('deleted_records')
+            for d in gone:
+                log.append({'id': db.next_id(), 'table_name': self.table,
+                            'record_id': str(d.get('id')), 'deleted_at': _now_iso()})
+            db.changed('deleted_records')
+            db.after_delete(self.table, gone)
+        return gone, len(gone)
+
+
+class FakeRPC:
+    def __init__(self, db, name, params):
+        self.db, self.name, self.params = db, name, params or {}
+
+    def execute(self):
+        self.db.round_trip()
+        fn = self.db.rpcs.get(self.name)
+        if fn is None:
+            raise FakeAPIError(f"Could not find the function {self.name}", 'PGRST202')
+        with self.db.lock:
+            body = json.dumps(fn(self.db, **self.params), default=str)
+        return FakeResponse(json.loads(body))
+
+
+class FakeAuthAdmin:
+    def __init__(self, db):
+        self.db = db
+
+    def create_user(self, attrs):
+        self.db.round_trip()
+        return SimpleNamespace(user=SimpleNamespace(id=str(uuid.uuid4()), email=attrs.get('email')))
+
+    def delete_user(self, user_id):
+        self.db.round_trip()
+
+    def update_user_by_id(self, user_id, attrs):
+        self.db.round_trip()
+        return SimpleNamespace(user=SimpleNamespace(id=user_id))
+
+    def list_users(self, **kwargs):
+        self.db.round_trip()
+        return []
+
+
+class FakeAuth:
+    """Bearer tokens of the form 'fake-<user id>' resolve to that user; anything else is rejected."""
+
+    def __init__(self, db):
+        self.db = db
+        self.admin = FakeAuthAdmin(db)
+
+    def get_user(self, token=None):
+        self.db.round_trip()
+        if token and token.startswith('fake-'):
+            uid = token[5:]
+            with self.db.lock:
+                matches = self.db.index('users', 'id').get(uid)
+            row = matches[0] if matches else None
+            if row is not None:
+                return SimpleNamespace(user=SimpleNamespace(
+                    id=uid, email=row.get('email'), user_metadata={'full_name': row.get('full_name')}
+                ))
+        return SimpleNamespace(user=None)
+
+
+class FakeSupabaseClient:
+    def __init__(self, db=None, url='http://fake-supabase.local'):
+        self.db = db or FakeDatabase()
+        self.auth = FakeAuth(self.db)
+        self.supabase_url = url
+
+    def table(self, name):
+        return FakeQuery(self.db, name)
+
+    from_ = table
+
+    def rpc(self, name, params=None, **kwargs):
+        return FakeRPC(self.db, name, params)
+
+
+# Modules that bind the Supabase clients at import time
+CLIENT_MODULES = ('utils', 'routes.api_routes', 'routes.auth_routes', 'routes.view_routes',
+                  'scheduler', 'attachment_cleanup')
+
+
+def install(client):
+    """
+    Points the app at 'client' (wrap it with metrics.instrument() first to keep the query
+    metrics). Import the app modules before calling this; create_app() may run before or after.
+    """
+    import sys
+    import importlib
+    for name in CLIENT_MODULES:
+        module = sys.modules.get(name) or importlib.import_module(name)
+        if hasattr(module, 'supabase'):
+            module.supabase = client
+        if hasattr(module, 'get_supabase_admin'):
+            module.get_supabase_admin = lambda: client
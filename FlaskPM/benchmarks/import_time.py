@@ -0,0 +1,138 @@
+"""
+Import-time profile of the app: what every gunicorn worker boot and Render cold start pays
+before the first request is served.
+
+Runs `python -X importtime -c "import app"` in fresh interpreters and reports the median total
+and the slowest modules (cumulative time, i.e. including everything they import). As a check it
+exits with 1 when:
+  - a module that must load on first use (LAZY_MODULES) is imported at boot, or
+  - the median total exceeds --budget-ms.
+
+Usage (from FlaskPM/):
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 9 --top 30 --budget-ms 400 --output imports.json
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from bench_api import git_revision, environment
+
+REPORT_VERSION = 1
+
+# Heavy or network-capable dependencies: imported inside the functions that use them
+LAZY_MODULES = (
+    'supabase',              # utils._create_client
+    'requests',              # reverse geocode, avatar downloads
+    'PIL',                   # avatars / thumbnails rendering
+    'google.generativeai',   # assistant
+)
+
+
+def profile_once(target):
+    """{module: (self_us, cumulative_us)} for one fresh `import target`."""
+    env = dict(os.environ, LOG_LEVEL='WARNING', PYTHONDONTWRITEBYTECODE='1')
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {target}"],
+                          cwd=APP_DIR, env=env, capture_output=True, text=True, timeout=300)
+    if proc.returncode != 0:
+        raise SystemExit(f"`import {target}` failed:\n{proc.stderr[-2000:]}")
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # A module can show up once only; the indentation is its depth in the import tree
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    if target not in modules:
+        raise SystemExit(f"no import time reported for {target}")
+    return modules
+
+
+def eager_lazy_modules(names):
+    """The LAZY_MODULES entries that (or whose submodules) were imported."""
+    return [lazy for lazy in LAZY_MODULES if any(n == lazy or n.startswith(lazy + '.') for n in names)]
+
+
+def run(target, runs):
+    profiles = [profile_once(target) for _ in range(runs)]
+    totals = sorted(p[target][1] / 1000 for p in profiles)
+    names = set().union(*profiles)
+    modules = {}
+    for name in names:
+        cumulative = [p[name][1] / 1000 for p in profiles if name in p]
+        self_ms = [p[name][0] / 1000 for p in profiles if name in p]
+        modules[name] = {'cumulative_ms': round(statistics.median(cumulative), 2),
+                         'self_ms': round(statistics.median(self_ms), 2)}
+    return {
+        'target': target,
+        'runs': runs,
+        'total_ms': round(statistics.median(totals), 2),
+        'min_ms': round(totals[0], 2),
+        'max_ms': round(totals[-1], 2),
+        'module_count': round(statistics.median(len(p) for p in profiles)),
+        'eager_lazy_modules': eager_lazy_modules(names),
+        'modules': modules,
+    }
+
+
+def print_results(result, top):
+    print(f"import {result['target']}: {result['total_ms']:.0f} ms median over {result['runs']} runs "
+          f"(min {result['min_ms']:.0f}, max {result['max_ms']:.0f}), {result['module_count']} modules")
+    print(f"\n  {'module':<40} {'cumulative ms':>14} {'self ms':>9}")
+    ranked = sorted(result['modules'].items(), key=lambda item: -item[1]['cumulative_ms'])
+    for name, m in ranked[:top]:
+        print(f"  {name:<40} {m['cumulative_ms']:>14.1f} {m['self_ms']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument("--target", default='app', help="module to import (default: app, as gunicorn does)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=20, help="slowest modules to list")
+    parser.add_argument("--budget-ms", type=float, help="fail when the median total exceeds this")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    result = run(args.target, args.runs)
+    print_results(result, args.top)
+
+    failures = []
+    if result['eager_lazy_modules']:
+        failures.append("imported at boot, should load on first use: " + ", ".join(result['eager_lazy_modules']))
+    if args.budget_ms is not None and result['total_ms'] > args.budget_ms:
+        failures.append(f"median import time {result['total_ms']:.0f} ms > budget {args.budget_ms:.0f} ms")
+
+    if args.output:
+        report = {
+            'benchmark': 'imports',
+            'version': REPORT_VERSION,
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git': git_revision(),
+            'environment': environment(),
+            'params': {k: v for k, v in vars(args).items() if k != 'output'},
+            'results': result,
+            'failures': failures,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+    if failures:
+        print()
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("\nOK: no heavy modules imported at boot")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+WSGI entry point for load tests: the production app on the Supabase stand-in.
+
+    gunicorn --chdir benchmarks load_server:app
+
+Configured through the environment (load_test.py sets these):
+    BENCH_SCALE (small), BENCH_SEED (42), BENCH_LATENCY_MS (15), BENCH_JITTER_MS (5),
+    BENCH_STATS_DIR (optional; each worker writes its stand-in counters there every second)
+
+Harness routes, registered on this app only (never in the real one):
+    POST /__bench/login/<user_id>   starts a browser session for that user
+    POST /__bench/reopen-day        deletes today's attendance rows (next punch is a punch-in)
+
+Each gunicorn worker builds its own copy of the dataset, so with several workers reads are
+realistic but writes made through one worker are not seen by the others.
+"""
+import os
+import sys
+import json
+import time
+import threading
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from flask import session, jsonify
+from fake_supabase import FakeDatabase
+from datasets import generate
+from bench_api import create_bench_app
+
+SCALE = os.environ.get('BENCH_SCALE', 'small')
+SEED = int(os.environ.get('BENCH_SEED', 42))
+LATENCY_MS = float(os.environ.get('BENCH_LATENCY_MS', 15))
+JITTER_MS = float(os.environ.get('BENCH_JITTER_MS', 5))
+STATS_DIR = os.environ.get('BENCH_STATS_DIR')
+
+db = FakeDatabase(latency=LATENCY_MS / 1000, jitter=JITTER_MS / 1000)
+dataset = generate(SCALE, seed=SEED)
+db.load(dataset)
+users = {u['id']: u for u in dataset['users']}
+
+app = create_bench_app(db)
+
+
+@app.route('/__bench/login/<user_id>', methods=['POST'])
+def bench_login(user_id):
+    user = users.get(user_id)
+    if not user:
+        return jsonify({"error": "Unknown user"}), 404
+    session['user'] = {'id': user_id, 'email': user['email'], 'user_metadata': {'full_name': user['full_name']}}
+    return jsonify({"success": True})
+
+
+@app.route('/__bench/reopen-day', methods=['POST'])
+def bench_reopen_day():
+    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    with db.lock:
+        rows = db.table_rows('attendance')
+        rows[:] = [r for r in rows if r['date'] != today]
+        db.changed('attendance')
+    return jsonify({"success": True})
+
+
+def _write_stats():
+    path = os.path.join(STATS_DIR, f"{os.getpid()}.json")
+    while True:
+        with db.lock:
+            stats = {'pid': os.getpid(), 'queries': db.queries, 'stub_cpu_seconds': db.cpu_seconds}
+        with open(path + '.tmp', 'w') as f:
+            json.dump(stats, f)
+        os.replace(path + '.tmp', path)
+        time.sleep(1)
+
+
+if STATS_DIR:
+    # Started at import, i.e. in each worker (load_test.py doesn't use --preload)
+    threading.Thread(target=_write_stats, daemon=True, name='bench-stats').start()
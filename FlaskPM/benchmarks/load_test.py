@@ -0,0 +1,576 @@
+"""
+Load test: scripted user sessions against one gunicorn instance running the real app on the
+Supabase stand-in (load_server.py), stepping up the number of concurrent users until it saturates.
+
+Scenarios (each virtual user runs its script in a loop, with think time between actions):
+    punch_storm   9 AM arrivals: attendance status, punch in, dashboard stats, notifications
+    dashboard     dashboard left open and refreshed: stats, projects, notifications
+    kanban        Monday planning: load a project board, move cards, comment, add tasks
+    polling       idle tabs: the notification bell polls every 15 s with If-None-Match
+
+For every step the report has req/s, p50/p95/p99 and error rate overall and per route, plus the
+gunicorn processes' CPU and memory (read from /proc, so Linux only). A step is saturated when
+p95 exceeds --slo-p95-ms, errors exceed --max-error-rate, or throughput stops growing with the
+offered load while the median latency climbs (requests queueing for a worker); the scenario stops
+at the first saturated step.
+
+The load generator shares the machine with the server: compare 'generator_cpu_percent' with
+the worker figures before trusting a saturation point on a small machine.
+
+Usage (from FlaskPM/):
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --scenarios punch_storm --steps 10 20 40 80 160 --scale large
+    python benchmarks/load_test.py --workers 2 --threads 8 --think-scale 0.2 --output load.json
+    python benchmarks/load_test.py --config          # production gunicorn.conf.py settings
+"""
+import os
+import sys
+import json
+import time
+import glob
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import runpy
+import subprocess
+import http.client
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+GUNICORN_CONF = os.path.join(os.path.dirname(BENCH_DIR), 'gunicorn.conf.py')
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from datasets import SCALES, STATUSES, generate
+from bench_api import percentile, git_revision, environment
+
+REPORT_VERSION = 1
+REQUEST_TIMEOUT = 60
+PLATEAU_MIN_REQUESTS = 50   # fewer samples than this are too noisy to call a plateau
+LOCATION = {'lat': 13.0827, 'lng': 80.2707}
+
+
+# ---------------- VIRTUAL USERS ----------------
+
+class Recorder:
+    """Results of one step; requests that finish after the step window closes are ignored."""
+
+    def __init__(self):
+        self.samples = []     # (route, seconds, status); status 0 = connection error/timeout
+        self.open = True
+        self.lock = threading.Lock()
+
+    def add(self, route, seconds, status):
+        with self.lock:
+            if self.open:
+                self.samples.append((route, seconds, status))
+
+    def close(self):
+        with self.lock:
+            self.open = False
+
+
+class VirtualUser:
+    """One browser tab: a keep-alive connection, its session cookie and its HTTP cache (ETags)."""
+
+    def __init__(self, port, recorder, stop, rng, think_scale):
+        self.port = port
+        self.recorder = recorder
+        self.stop = stop
+        self.rng = rng
+        self.think_scale = think_scale
+        self.conn = None
+        self.cookie = None
+        self.etags = {}
+        self.user_id = None
+
+    def request(self, route, method, path, body=None, conditional=False):
+        headers = {}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        if conditional and path in self.etags:
+            headers['If-None-Match'] = self.etags[path]
+
+        start = time.perf_counter()
+        status, response = 0, None
+        # A kept-alive connection the server closed while the user was thinking is retried once
+        # on a new connection, as browsers do
+        for attempt in range(2):
+            reused = self.conn is not None
+            try:
+                if self.conn is None:
+                    self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=REQUEST_TIMEOUT)
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                response.read()
+                status = response.status
+                break
+            except (OSError, http.client.HTTPException):
+                self.close()
+                if not reused:
+                    break
+        elapsed = time.perf_counter() - start
+
+        if response is not None:
+            cookie = response.headers.get('Set-Cookie')
+            if cookie:
+                self.cookie = cookie.split(';', 1)[0]
+            if response.headers.get('ETag'):
+                self.etags[path] = response.headers['ETag']
+        if route:
+            self.recorder.add(route, elapsed, status)
+        return status
+
+    def get(self, route, path, conditional=True):
+        # Browsers revalidate "private, no-cache" responses with the stored ETag
+        return self.request(route, 'GET', path, conditional=conditional)
+
+    def post(self, route, path, body=None):
+        return self.request(route, 'POST', path, body if body is not None else {})
+
+    def patch(self, route, path, body):
+        return self.request(route, 'PATCH', path, body)
+
+    def login(self, user_id):
+        self.cookie = None
+        self.etags = {}
+        self.user_id = user_id
+        return self.request(None, 'POST', f"/__bench/login/{user_id}")
+
+    def think(self, low, high):
+        """Waits like a person would; returns False once the step is over."""
+        return not self.stop.wait(self.rng.uniform(low, high) * self.think_scale)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class Context:
+    """What the scripts need to know about the seeded dataset (the same one the server built)."""
+
+    def __init__(self, dataset):
+        self.users = [u['id'] for u in dataset['users']]
+        self.projects_by_user = {}
+        for m in dataset['project_members']:
+            self.projects_by_user.setdefault(m['user_id'], []).append(m['project_id'])
+        self.tasks_by_project = {}
+        for t in dataset['tasks']:
+            self.tasks_by_project.setdefault(t['project_id'], []).append(t['id'])
+        self.cursor = 0
+        self.lock = threading.Lock()
+
+    def next_arrival(self):
+        """(user id, whether everyone has been through once since the last reopen)."""
+        with self.lock:
+            user_id = self.users[self.cursor % len(self.users)]
+            self.cursor += 1
+            return user_id, self.cursor > 1 and self.cursor % len(self.users) == 1
+
+
+# ---------------- SCENARIOS ----------------
+# One iteration of a session; the runner loops it until the step ends.
+
+def punch_storm(vu, ctx):
+    """9 AM: each arrival checks today's status, punches in and lands on the dashboard."""
+    user_id, wrapped = ctx.next_arrival()
+    if wrapped:
+        vu.request(None, 'POST', '/__bench/reopen-day')
+    vu.login(user_id)
+    vu.get('GET /api/attendance/today', '/api/attendance/today', conditional=False)
+    if not vu.think(1, 4):  # granting location, reading the clock
+        return
+    vu.post('POST /api/attendance/punch', '/api/attendance/punch', {'location': LOCATION})
+    vu.get('GET /api/stats', '/api/stats')
+    vu.get('GET /api/notifications', '/api/notifications')
+    vu.think(0.5, 2)
+
+
+def dashboard(vu, ctx):
+    """The dashboard is open and gets refreshed every so often."""
+    if vu.user_id is None:
+        vu.login(vu.rng.choice(ctx.users))
+    vu.get('GET /api/stats', '/api/stats')
+    vu.get('GET /api/projects', '/api/projects')
+    vu.get('GET /api/notifications', '/api/notifications')
+    vu.think(5, 15)
+
+
+def kanban(vu, ctx):
+    """Monday planning: a member works through one of their project boards."""
+    if vu.user_id is None:
+        vu.login(vu.rng.choice([u for u in ctx.users if u in ctx.projects_by_user]))
+    rng = vu.rng
+    project_id = rng.choice(ctx.projects_by_user[vu.user_id])
+    task_ids = ctx.tasks_by_project.get(project_id) or [0]
+
+    vu.get('GET /api/projects/<id>/tasks', f"/api/projects/{project_id}/tasks")
+    if not vu.think(2, 6):
+        return
+    task_id = rng.choice(task_ids)
+    vu.patch('PATCH /api/tasks/<id>', f"/api/tasks/{task_id}", {'status': rng.choice(STATUSES)})
+    if rng.random() < 0.3:
+        vu.get('GET /api/tasks/<id>/comments', f"/api/tasks/{task_id}/comments")
+        if not vu.think(5, 15):
+            return
+        vu.post('POST /api/tasks/<id>/comments', f"/api/tasks/{task_id}/comments",
+                {'content': 'Picking this up this week'})
+    if rng.random() < 0.15:
+        vu.post('POST /api/tasks', '/api/tasks', {
+            'project_id': project_id, 'title': 'Planning follow-up', 'description': 'Added during planning',
+            'priority': rng.choice(('Low', 'Medium', 'High')), 'assigned_to': vu.user_id,
+        })
+    vu.think(3, 8)
+
+
+def polling(vu, ctx):
+    """An idle tab: base.html polls notifications every 15 s."""
+    if vu.user_id is None:
+        vu.login(vu.rng.choice(ctx.users))
+        # Tabs were opened at different times
+        if not vu.think(0, 15):
+            return
+    vu.get('GET /api/notifications', '/api/notifications')
+    vu.think(15, 15)
+
+
+SCENARIOS = {
+    'punch_storm': (punch_storm, [5, 10, 20, 40]),
+    'dashboard': (dashboard, [5, 10, 20, 40, 80]),
+    'kanban': (kanban, [5, 10, 20, 40, 80]),
+    'polling': (polling, [25, 50, 100, 200, 400]),
+}
+
+
+# ---------------- SERVER ----------------
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def server_env(args, stats_dir):
+    # No scheduler in the workers, and no preload: load_server builds its dataset and starts
+    # its stats thread per worker
+    return dict(os.environ, BENCH_SCALE=args.scale, BENCH_SEED=str(args.seed),
+                BENCH_LATENCY_MS=str(args.latency_ms), BENCH_JITTER_MS=str(args.jitter_ms),
+                BENCH_STATS_DIR=stats_dir, SCHEDULER_ENABLED='0', GUNICORN_PRELOAD='0')
+
+
+def resolve_server_settings(args):
+    """Fills unset --workers/--worker-class/--threads/--timeout from gunicorn.conf.py or the Procfile defaults."""
+    if args.config:
+        if args.worker_class:
+            os.environ['GUNICORN_WORKER_CLASS'] = args.worker_class
+        conf = runpy.run_path(GUNICORN_CONF)
+        defaults = {'workers': conf['workers'], 'worker_class': conf['worker_class'],
+                    'threads': conf['threads'], 'timeout': conf['timeout']}
+    else:
+        # The old Procfile: 'gunicorn app:app' is one sync worker
+        defaults = {'workers': 1, 'worker_class': 'sync', 'threads': 1, 'timeout': 30}
+    for name, value in defaults.items():
+        if getattr(args, name) is None:
+            setattr(args, name, value)
+
+
+def start_server(args, port, stats_dir):
+    cmd = [sys.executable, '-m', 'gunicorn', '--chdir', BENCH_DIR, '--bind', f"127.0.0.1:{port}",
+           '--workers', str(args.workers), '--worker-class', args.worker_class,
+           '--threads', str(args.threads), '--timeout', str(args.timeout), '--log-level', 'warning']
+    if args.config:
+        cmd[3:3] = ['-c', GUNICORN_CONF]
+    for extra in args.gunicorn_arg:
+        cmd.extend(extra.split())
+    cmd.append('load_server:app')
+    log = open(os.path.join(stats_dir, 'gunicorn.log'), 'w')
+    # Run from benchmarks/ so gunicorn doesn't pick up ../gunicorn.conf.py unless --config is given
+    proc = subprocess.Popen(cmd, env=server_env(args, stats_dir), cwd=BENCH_DIR,
+                            stdout=log, stderr=subprocess.STDOUT)
+
+    deadline = time.time() + 180
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"gunicorn exited with {proc.returncode}; see {log.name}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/api/ping')
+            if conn.getresponse().status == 200:
+                conn.close()
+                # Every worker has to build the dataset before the first step
+                while len(glob.glob(os.path.join(stats_dir, '*.json'))) < args.workers and time.time() < deadline:
+                    time.sleep(0.5)
+                return proc
+        except OSError:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise SystemExit(f"gunicorn did not become ready; see {log.name}")
+
+
+# ---------------- PROCESS STATS (/proc) ----------------
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def process_tree(root):
+    pids = [root]
+    for stat in glob.glob('/proc/[0-9]*/stat'):
+        try:
+            with open(stat) as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == root:
+            pids.append(int(stat.split('/')[2]))
+    return pids
+
+
+def cpu_seconds(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+
+def rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def stub_cpu_seconds(stats_dir):
+    total = 0.0
+    for path in glob.glob(os.path.join(stats_dir, '*.json')):
+        try:
+            with open(path) as f:
+                total += json.load(f)['stub_cpu_seconds']
+        except (OSError, ValueError, KeyError):
+            continue
+    return total
+
+
+class ResourceSampler(threading.Thread):
+    """Samples the gunicorn workers' CPU time and RSS twice a second during a step."""
+
+    def __init__(self, master_pid):
+        super().__init__(daemon=True)
+        self.master_pid = master_pid
+        self.stop = threading.Event()
+        self.workers = [p for p in process_tree(master_pid) if p != master_pid]
+        self.cpu_start = {p: cpu_seconds(p) for p in self.workers}
+        self.peak_rss = {p: rss_bytes(p) for p in self.workers}
+
+    def run(self):
+        while not self.stop.wait(0.5):
+            for pid in self.workers:
+                self.peak_rss[pid] = max(self.peak_rss.get(pid, 0), rss_bytes(pid))
+
+    def finish(self, wall):
+        self.stop.set()
+        self.join()
+        cpu = {p: cpu_seconds(p) - self.cpu_start[p] for p in self.workers}
+        return {
+            'workers': len(self.workers),
+            'worker_cpu_percent': round(sum(cpu.values()) / wall * 100, 1),
+            'max_worker_cpu_percent': round(max(cpu.values(), default=0) / wall * 100, 1),
+            'worker_rss_mb': round(sum(self.peak_rss.values()) / 2 ** 20, 1),
+            'max_worker_rss_mb': round(max(self.peak_rss.values(), default=0) / 2 ** 20, 1),
+        }
+
+
+# ---------------- RUNNER ----------------
+
+def summarize(samples, wall):
+    latencies = sorted(s for _, s, _ in samples)
+    errors = sum(1 for _, _, status in samples if status == 0 or status >= 400)
+    ms = lambda s: round(s * 1000, 2)
+    return {
+        'requests': len(samples),
+        'rps': round(len(samples) / wall, 2),
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+    }
+
+
+def run_step(script, ctx, vus, args, port, server, stats_dir, seed):
+    recorder = Recorder()
+    stop = threading.Event()
+    sampler = ResourceSampler(server.pid)
+    stub_start = stub_cpu_seconds(stats_dir)
+    generator_start = sum(os.times()[:2])
+
+    def session(i):
+        vu = VirtualUser(port, recorder, stop, random.Random(seed * 100003 + i), args.think_scale)
+        # Users arrive over the first couple of seconds rather than all at once
+        if stop.wait(vu.rng.uniform(0, min(2.0, args.step_seconds / 10))):
+            return
+        while not stop.is_set():
+            script(vu, ctx)
+        vu.close()
+
+    threads = [threading.Thread(target=session, args=(i,), daemon=True) for i in range(vus)]
+    sampler.start()
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(args.step_seconds)
+    recorder.close()
+    wall = time.perf_counter() - start
+    stop.set()
+    resources = sampler.finish(wall)
+    for t in threads:
+        t.join(REQUEST_TIMEOUT)
+
+    # Workers publish their stand-in counters once a second
+    time.sleep(1.1)
+    resources['stub_cpu_percent'] = round((stub_cpu_seconds(stats_dir) - stub_start) / wall * 100, 1)
+    resources['generator_cpu_percent'] = round((sum(os.times()[:2]) - generator_start) / wall * 100, 1)
+
+    routes = {}
+    for route, seconds, status in recorder.samples:
+        routes.setdefault(route, []).append((route, seconds, status))
+    return {
+        'vus': vus,
+        **summarize(recorder.samples, wall),
+        **resources,
+        'routes': {route: summarize(samples, wall) for route, samples in sorted(routes.items())},
+    }
+
+
+def saturation_reason(step, previous, args):
+    if step['requests'] == 0:
+        return "no requests completed"
+    if step['p95_ms'] > args.slo_p95_ms:
+        return f"p95 {step['p95_ms']:.0f} ms > {args.slo_p95_ms:.0f} ms"
+    if step['error_rate'] > args.max_error_rate:
+        return f"error rate {step['error_rate']:.1%} > {args.max_error_rate:.1%}"
+    if previous and previous['rps'] and step['requests'] >= PLATEAU_MIN_REQUESTS:
+        offered = step['vus'] / previous['vus']
+        achieved = step['rps'] / previous['rps']
+        # Less than half of the extra offered load turned into throughput and the median went
+        # up with it: requests are queueing for a worker
+        if offered > 1 and achieved - 1 < (offered - 1) / 2 and step['p50_ms'] > previous['p50_ms'] * 1.5:
+            return f"throughput plateau ({previous['rps']:.1f} -> {step['rps']:.1f} req/s, p50 {step['p50_ms']:.0f} ms)"
+    return None
+
+
+def run_scenario(name, ctx, args, port, server, stats_dir):
+    script, default_steps = SCENARIOS[name]
+    steps = args.steps or default_steps
+    print(f"\n[{name}] {script.__doc__}")
+    print(f"  {'VUs':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'err%':>6} "
+          f"{'cpu%':>6} {'stub%':>6} {'gen%':>6} {'rss MB':>7}")
+
+    results, saturated, previous = [], None, None
+    for vus in steps:
+        step = run_step(script, ctx, vus, args, port, server, stats_dir, args.seed + vus)
+        reason = saturation_reason(step, previous, args)
+        step['saturated'] = reason
+        results.append(step)
+        print(f"  {vus:>5} {step['rps']:>8.1f} {step['p50_ms']:>8.1f} {step['p95_ms']:>8.1f} {step['p99_ms']:>8.1f} "
+              f"{step['error_rate'] * 100:>6.1f} {step['worker_cpu_percent']:>6.0f} {step['stub_cpu_percent']:>6.0f} "
+              f"{step['generator_cpu_percent']:>6.0f} {step['worker_rss_mb']:>7.0f}" + (f"  SATURATED: {reason}" if reason else ""))
+        if reason:
+            saturated = step
+            break
+        previous = step
+
+    last_good = previous if saturated else (results[-1] if results else None)
+    shown = saturated or last_good
+    if shown:
+        print(f"  per route at {shown['vus']} VUs:")
+        for route, s in shown['routes'].items():
+            print(f"    {route:<34} {s['rps']:>7.1f} req/s  p50 {s['p50_ms']:>7.1f}  p95 {s['p95_ms']:>7.1f}  "
+                  f"p99 {s['p99_ms']:>7.1f}  err {s['error_rate']:.1%}")
+    return {
+        'steps': results,
+        'max_vus_within_slo': last_good['vus'] if last_good else 0,
+        'saturated_at_vus': saturated['vus'] if saturated else None,
+        'saturation_reason': saturated['saturated'] if saturated else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--steps", type=int, nargs="+", help="concurrent users per step (default per scenario)")
+    parser.add_argument("--step-seconds", type=float, default=30)
+    parser.add_argument("--think-scale", type=float, default=1.0, help="multiplies every think time")
+    parser.add_argument("--slo-p95-ms", type=float, default=1000)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--scale", default='medium', choices=sorted(SCALES))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency-ms", type=float, default=15, help="simulated round trip per Supabase query")
+    parser.add_argument("--jitter-ms", type=float, default=5)
+    # Unset values come from gunicorn.conf.py with --config, otherwise one sync worker (plain 'gunicorn app:app')
+    parser.add_argument("--config", action='store_true', help="start gunicorn with the production gunicorn.conf.py")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--worker-class")
+    parser.add_argument("--threads", type=int)
+    parser.add_argument("--timeout", type=int)
+    parser.add_argument("--gunicorn-arg", action='append', default=[], help="extra gunicorn arguments")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+    resolve_server_settings(args)
+
+    if not os.path.isdir('/proc'):
+        print("warning: /proc not available; CPU and memory figures will be zero")
+
+    ctx = Context(generate(args.scale, seed=args.seed))
+    most_vus = max(args.steps or SCENARIOS['punch_storm'][1])
+    if 'punch_storm' in args.scenarios and most_vus > len(ctx.users):
+        print(f"warning: {most_vus} VUs but only {len(ctx.users)} users in '{args.scale}'; concurrent sessions "
+              "for the same user will see 'Already punched out' errors (use a larger --scale)")
+    report = {
+        'benchmark': 'load',
+        'version': REPORT_VERSION,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git': git_revision(),
+        'environment': environment(),
+        'params': {k: v for k, v in vars(args).items() if k != 'output'},
+        'results': {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix='pm-load-') as stats_dir:
+        port = free_port()
+        server = start_server(args, port, stats_dir)
+        print(f"gunicorn pid {server.pid}: {args.workers} worker(s), {args.worker_class}, "
+              f"{args.threads} thread(s); dataset '{args.scale}', {args.latency_ms:.0f} ms per query")
+        try:
+            for name in args.scenarios:
+                report['results'][name] = run_scenario(name, ctx, args, port, server, stats_dir)
+        finally:
+            server.terminate()
+            try:
+                server.wait(15)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    print("\nSaturation summary:")
+    for name, result in report['results'].items():
+        limit = result['saturated_at_vus']
+        print(f"  {name:<12} within SLO up to {result['max_vus_within_slo']} VUs"
+              + (f"; saturated at {limit} ({result['saturation_reason']})" if limit else "; not saturated"))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Negotiated response compression (brotli when the client accepts it and the brotli package is
+installed, otherwise gzip) for text/JSON bodies of at least COMPRESS_MIN_BYTES.
+
+Skipped for: streamed responses (SSE chat, generators), files sent with send_file/direct
+passthrough, HEAD, non-200/203 statuses (304s have no body, 206 ranges are byte offsets),
+responses that already have a Content-Encoding, and anything not in COMPRESSIBLE_TYPES.
+
+A compressed body is a different representation, so a strong ETag becomes weak (W/"..."). 304s
+have no body to compress, so conditional_get issues weak ETags from the start: the 304 then
+carries the same validator as the 200, compressed or not.
+"""
+import os
+import gzip
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))   # smaller bodies fit in one packet anyway
+GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+# 4-5 is the usual sweet spot for dynamic responses (11 is for build-time static assets)
+BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+
+# text/event-stream is deliberately absent: the chat stream must reach the client token by token
+COMPRESSIBLE_TYPES = {
+    'application/json', 'application/javascript', 'application/manifest+json', 'application/xml',
+    'image/svg+xml', 'text/css', 'text/csv', 'text/html', 'text/javascript', 'text/plain', 'text/xml',
+}
+
+
+def encodings():
+    """Encodings this process can produce, preferred first."""
+    return ('br', 'gzip') if brotli else ('gzip',)
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def is_compressible(response):
+    return (response.mimetype in COMPRESSIBLE_TYPES
+            and not response.direct_passthrough
+            and not response.is_streamed)
+
+
+def negotiate():
+    """Best encoding the client accepts (honouring q-values; q=0 refuses), or None."""
+    accepted = request.accept_encodings
+    best, best_q = None, 0
+    for encoding in encodings():
+        q = accepted[encoding]
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress_response(response):
+    if request.method == 'HEAD' or response.status_code not in (200, 203):
+        return response
+    if 'Content-Encoding' in response.headers or not is_compressible(response):
+        return response
+
+    # Caches must key on Accept-Encoding even when this particular response stays uncompressed
+    response.vary.add('Accept-Encoding')
+
+    if response.content_length is not None and response.content_length < COMPRESS_MIN_BYTES:
+        return response
+    encoding = negotiate()
+    if not encoding:
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+
+    body = compress(data, encoding)
+    if len(body) >= len(data):
+        return response
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    """
+    Register before the other after_request hooks: Flask runs them in reverse order,
+    so compression sees the final body and headers.
+    """
+    app.after_request(compress_response)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 # Try to load local keys if available
 try:
@@ -18,15 +19,46 @@ class Config:
     SMTP_EMAIL = os.environ.get('SMTP_EMAIL') or (keys.SMTP_EMAIL if keys else None)
     SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD') or (keys.SMTP_PASSWORD if keys else None)
 
+    # Attachment Storage: 'supabase' (default) or 'local' (disk stand-in for dev/tests)
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'supabase')
+    LOCAL_STORAGE_DIR = os.environ.get('LOCAL_STORAGE_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'local_storage')
+    LOCAL_STORAGE_BASE_URL = os.environ.get('LOCAL_STORAGE_BASE_URL', '')
+    MAX_UPLOAD_MB = int(os.environ.get('MAX_UPLOAD_MB', 25))
+    MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+    # Flask rejects bigger request bodies up front with 413 (+1 MB for multipart overhead)
+    MAX_CONTENT_LENGTH = MAX_UPLOAD_BYTES + 1024 * 1024
+
+    # Upload progress polled at /api/uploads/<id>, shared by the workers on this host
+    UPLOAD_PROGRESS_PATH = os.environ.get('UPLOAD_PROGRESS_PATH') or os.path.join(tempfile.gettempdir(), 'pm_upload_progress.sqlite3')
+
+    # Resized avatar renders served by /api/avatars/<user_id> (shared by all workers)
+    AVATAR_CACHE_DIR = os.environ.get('AVATAR_CACHE_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'avatar_cache')
+
     # Session / Cookie Configuration for Cross-Origin (Mobile/Ngrok)
     SESSION_COOKIE_SAMESITE = 'None'
     SESSION_COOKIE_SECURE = True  # Required when SAMESITE is None
 
+    # Server-side sessions (session_store.py): 'sqlite' (shared by the workers on this host),
+    # 'memory' (single process only) or 'cookie' (signed cookie holding the compact user).
+    # 'sqlite' is the default only when SESSION_SQLITE_PATH points at persistent storage: a file
+    # on an ephemeral disk (Render) is wiped on every deploy and isn't shared between instances.
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND') or ('sqlite' if os.environ.get('SESSION_SQLITE_PATH') else 'cookie')
+    SESSION_SQLITE_PATH = os.environ.get('SESSION_SQLITE_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sessions.sqlite3')
+    # Server-side sessions slide: an active session's stored expiry is pushed back at most this often
+    SESSION_TOUCH_SECONDS = int(os.environ.get('SESSION_TOUCH_SECONDS', 3600))
+    SESSION_MEMORY_ENTRIES = int(os.environ.get('SESSION_MEMORY_ENTRIES', 10000))
+    # How long a worker trusts its in-memory copy before re-reading the shared file
+    SESSION_CACHE_SECONDS = float(os.environ.get('SESSION_CACHE_SECONDS', 2))
+
+    # jsonify()/get_json() backend (json_provider.py): 'auto' (orjson if installed), 'orjson' or 'default'
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'auto')
+
     @classmethod
     def validate(cls):
+        """Logs missing keys; called once by create_app() (not at import, which scripts and workers pay for)."""
+        from app_logging import get_logger
+        log = get_logger('config')
         if not cls.SUPABASE_SERVICE_KEY:
-            print("WARNING: SUPABASE_SERVICE_KEY not found!")
+            log.warning("SUPABASE_SERVICE_KEY not found!")
         else:
-            print(f"DEBUG: Service Key Loaded ({cls.SUPABASE_SERVICE_KEY[:5]}...)")
-
-Config.validate()
+            log.debug("Service Key Loaded (%s...)", cls.SUPABASE_SERVICE_KEY[:5])
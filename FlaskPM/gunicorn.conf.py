@@ -0,0 +1,130 @@
+"""
+Gunicorn settings (picked up automatically when gunicorn starts in this directory):
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Almost every request waits on Supabase, Nominatim, Gemini or SMTP, so workers are threaded
+(gthread, the default) or cooperative (gevent) rather than one-request-at-a-time sync workers.
+
+Environment:
+    GUNICORN_WORKER_CLASS   gthread (default) | gevent | sync
+    WEB_CONCURRENCY         worker processes (default: CPUs + 1, or 2 * CPUs + 1 for sync)
+    GUNICORN_MAX_WORKERS    cap for the default above (4)
+    GUNICORN_THREADS        threads per gthread worker (8)
+    GUNICORN_CONNECTIONS    greenlets per gevent worker (200)
+    GUNICORN_TIMEOUT        worker heartbeat timeout in seconds (60)
+    GUNICORN_KEEPALIVE      idle keep-alive seconds (5)
+    GUNICORN_PRELOAD        import the app once in the master (default on, off for gevent)
+    GUNICORN_MAX_REQUESTS   recycle a worker after this many requests (0 = never)
+    SCHEDULER_ENABLED       run the background scheduler in one of the workers (1)
+    METRICS_DIR             where workers share their metrics for /metrics (a fresh directory
+                            in /dev/shm or the temp dir per server start)
+"""
+import os
+import sys
+import tempfile
+import importlib
+
+def _env_int(name, default):
+    return int(os.environ.get(name) or default)
+
+def _env_flag(name, default):
+    return os.environ.get(name, '1' if default else '0').lower() in ('1', 'true', 'yes')
+
+def _cpu_count():
+    try:
+        # Respects container CPU pinning, unlike os.cpu_count()
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+CPUS = _cpu_count()
+
+# ---------------- WORKERS ----------------
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_class == 'gevent':
+    try:
+        import gevent  # noqa: F401  (optional: pip install gevent)
+    except ImportError:
+        print("WARNING: gevent is not installed, falling back to gthread workers", file=sys.stderr)
+        worker_class = 'gthread'
+
+if worker_class == 'sync':
+    _default_workers = 2 * CPUS + 1
+else:
+    # Each worker already overlaps many requests; more processes only add memory
+    # (every worker holds its own search index, caches and Supabase connections)
+    _default_workers = CPUS + 1
+workers = _env_int('WEB_CONCURRENCY', min(_default_workers, _env_int('GUNICORN_MAX_WORKERS', 4)))
+
+threads = _env_int('GUNICORN_THREADS', 8) if worker_class == 'gthread' else 1
+worker_connections = _env_int('GUNICORN_CONNECTIONS', 200)
+
+# ---------------- TIMEOUTS ----------------
+
+# Longest legitimate request is the AI assistant (30s Gemini timeout), so 60s only catches hung workers
+timeout = _env_int('GUNICORN_TIMEOUT', 60)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+# Browsers poll /api/notifications every 15s; keep connections long enough to reuse across a page's requests
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 0)
+max_requests_jitter = max_requests // 10
+
+# ---------------- SERVER ----------------
+
+bind = os.environ.get('GUNICORN_BIND') or f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+
+# gevent must monkey-patch before the app imports ssl/httpx, which happens in the worker
+preload_app = _env_flag('GUNICORN_PRELOAD', worker_class != 'gevent')
+
+# The heartbeat file is touched constantly; keep it off slow container disks
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+# Each worker writes its metrics here and /metrics merges them (metrics.py). A directory per
+# server start, so a previous run's counters aren't added in. Set before the app is imported.
+_metrics_root = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+os.environ.setdefault('METRICS_DIR', os.path.join(_metrics_root, f"pm-metrics-{os.getpid()}"))
+os.makedirs(os.environ['METRICS_DIR'], exist_ok=True)
+
+# The app writes its own JSON access log (app_logging.py)
+accesslog = None
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+
+# ---------------- HOOKS ----------------
+
+# The app imports these on first use (see benchmarks/import_time.py). With preload_app the master
+# imports them once before forking, so workers don't each pay for it on their first request.
+WARM_MODULES = ('supabase', 'requests', 'PIL.Image')
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        for name in WARM_MODULES:
+            importlib.import_module(name)
+
+def post_fork(server, worker):
+    """
+    With preload_app the modules below were imported in the master. Give this worker its own
+    Supabase clients (HTTP connection pools must not be shared across fork) and log writer.
+    Modules that aren't imported yet are left alone so gevent can patch before they load.
+    """
+    utils = sys.modules.get('utils')
+    if utils:
+        utils.reset_clients()
+    app_logging = sys.modules.get('app_logging')
+    if app_logging:
+        app_logging.setup()
+
+def post_worker_init(worker):
+    """Runs after the app is loaded (and after gevent's monkey-patching) in every worker."""
+    if _env_flag('SCHEDULER_ENABLED', True):
+        from scheduler import start_scheduler_singleton
+        start_scheduler_singleton()
+
+def child_exit(server, worker):
+    """Keeps an exited worker's counters in /metrics but drops its gauges."""
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -0,0 +1,56 @@
+from functools import wraps
+from flask import request, make_response
+
+# Default for anything that doesn't declare its own policy (auth flows, mutations, CSV exports...)
+NO_STORE = "no-cache, no-store, must-revalidate"
+
+# Per-user JSON reads: the browser/WebView may keep a copy but must revalidate every time.
+# Combined with an ETag this turns an unchanged poll into a 304 with no body.
+PRIVATE_REVALIDATE = "private, no-cache"
+
+# Shared, slow-changing assets (avatars): cacheable by browsers and CDNs for a day,
+# and for a year when the URL carries a version parameter.
+PUBLIC_DAY = "public, max-age=86400, stale-while-revalidate=604800"
+PUBLIC_IMMUTABLE = "public, max-age=31536000, immutable"
+# Versioned URL answered with other bytes (the new version isn't rendered everywhere yet):
+# usable, but revalidated on the next use instead of being pinned under that URL.
+PUBLIC_REVALIDATE = "public, no-cache"
+
+
+def cache_policy(value):
+    """Set an explicit Cache-Control header for a route (overrides the app-wide no-store default)."""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            response = make_response(f(*args, **kwargs))
+            response.headers["Cache-Control"] = value
+            return response
+        return wrapper
+    return decorator
+
+
+def conditional_get(f):
+    """
+    ETag + If-None-Match support for read endpoints.
+    - ETag is a hash of the JSON payload, so it changes exactly when the data does. It is weak
+      (W/"..."): compression re-encodes the body, and the 304 must echo the validator the 200
+      carried whether or not that 200 was compressed.
+    - Matching If-None-Match -> 304 Not Modified (no body).
+    Only successful GETs are tagged; errors keep the default no-store policy.
+    """
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        response = make_response(f(*args, **kwargs))
+
+        if request.method not in ("GET", "HEAD") or response.status_code != 200:
+            return response
+        if response.direct_passthrough or response.is_streamed:
+            return response
+
+        response.add_etag(weak=True)
+        response.headers["Cache-Control"] = PRIVATE_REVALIDATE
+        # Payloads are per-user (role scoped), never share cached copies across credentials
+        response.vary.add("Authorization")
+        response.vary.add("Cookie")
+        return response.make_conditional(request)
+    return wrapper
@@ -0,0 +1,65 @@
+"""
+Image helpers shared by scripts and request handlers.
+
+All per-pixel work is done with Pillow band operations (ImageChops / point() lookup tables),
+which run in C over whole bands instead of looping over pixels in Python.
+"""
+from PIL import Image, ImageChops, ImageFilter
+
+# A pixel counts as background when all of R, G and B are above 255 - tolerance.
+# The default (15 -> "> 240") matches the original remove_bg_script behaviour.
+DEFAULT_TOLERANCE = 15
+
+
+def _alpha_lut(threshold, feather):
+    """
+    Lookup table: min(R, G, B) -> alpha multiplier (0..255).
+    Fully opaque up to threshold - feather, fully transparent above threshold,
+    linear ramp in between (soft edges instead of a jagged cut-out).
+    """
+    lut = []
+    for v in range(256):
+        if v > threshold:
+            lut.append(0)
+        elif feather <= 0 or v <= threshold - feather:
+            lut.append(255)
+        else:
+            lut.append(round(255 * (threshold + 1 - v) / (feather + 1)))
+    return lut
+
+
+def remove_white_background(img, tolerance=DEFAULT_TOLERANCE, feather=0, blur=0):
+    """
+    Makes near-white pixels transparent.
+      tolerance: how far from pure white (per channel) still counts as background
+      feather:   width (in intensity levels) of the partial-transparency ramp at the edge
+      blur:      optional Gaussian radius applied to the alpha mask to smooth edges further
+    Returns a new RGBA image; fully keyed pixels become (255, 255, 255, 0).
+    """
+    threshold = 255 - max(0, min(255, int(tolerance)))
+    img = img.convert("RGBA")
+    r, g, b, a = img.split()
+
+    # "Whiteness" of each pixel = its darkest channel
+    lightness = ImageChops.darker(ImageChops.darker(r, g), b)
+
+    mask = lightness.point(_alpha_lut(threshold, int(feather)))
+    if blur:
+        mask = mask.filter(ImageFilter.GaussianBlur(blur))
+    alpha = ImageChops.multiply(a, mask)
+
+    # Same colour as the original script for the keyed pixels
+    keyed = lightness.point(lambda v: 255 if v > threshold else 0)
+    white = Image.new("RGB", img.size, (255, 255, 255))
+    rgb = Image.composite(white, Image.merge("RGB", (r, g, b)), keyed)
+
+    out = rgb.convert("RGBA")
+    out.putalpha(alpha)
+    return out
+
+
+def remove_white_background_file(input_path, output_path, tolerance=DEFAULT_TOLERANCE, feather=0, blur=0):
+    with Image.open(input_path) as img:
+        out = remove_white_background(img, tolerance, feather, blur)
+    out.save(output_path, "PNG")
+    return output_path
@@ -0,0 +1,70 @@
+"""
+Fast JSON for jsonify() / request.get_json(), chosen by Config.JSON_PROVIDER:
+  - 'auto' (default): orjson when it is installed, otherwise Flask's standard provider
+  - 'orjson': require orjson
+  - 'default': Flask's standard provider (stdlib json)
+
+OrjsonProvider keeps the standard provider's output: sorted keys, compact separators, trailing
+newline, and Flask's handling of dates, decimals, UUIDs and dataclasses. ETags therefore only
+change where orjson writes non-ASCII text as UTF-8 instead of \\u escapes. Anything orjson refuses
+(integers over 64 bits, NaN input) falls back to the stdlib.
+"""
+from flask.json.provider import DefaultJSONProvider
+from config import Config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    # Sorted keys like the default provider; datetimes go through Flask's default() (HTTP dates)
+    options = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # indent / custom separators etc.: only the stdlib supports those
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(obj, default=self.default, option=self.options).decode()
+        except (orjson.JSONEncodeError, TypeError):
+            return super().dumps(obj)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            # Let the stdlib decide (it accepts NaN/Infinity; otherwise it raises the usual error)
+            return super().loads(s)
+
+    def response(self, *args, **kwargs):
+        if self.compact is False or (self.compact is None and self._app.debug):
+            # Pretty-printed debug output
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            body = orjson.dumps(obj, default=self.default, option=self.options | orjson.OPT_APPEND_NEWLINE)
+        except (orjson.JSONEncodeError, TypeError):
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def get_provider_class(name=None):
+    name = name or Config.JSON_PROVIDER
+    if name == 'default' or (name == 'auto' and orjson is None):
+        return DefaultJSONProvider
+    if name in ('auto', 'orjson'):
+        if orjson is None:
+            raise RuntimeError("JSON_PROVIDER=orjson but orjson is not installed")
+        return OrjsonProvider
+    raise ValueError(f"Unknown JSON_PROVIDER: {name}")
+
+
+def init_app(app, provider_class=None):
+    """Installs the JSON provider (pass any flask.json.provider.JSONProvider subclass to override)."""
+    provider_class = provider_class or get_provider_class()
+    app.json_provider_class = provider_class
+    app.json = provider_class(app)
@@ -0,0 +1,429 @@
+"""
+Request and database instrumentation, exported at /metrics in Prometheus text format.
+
+- HTTP: per-endpoint latency histogram (endpoint = URL rule, e.g. /api/tasks/<task_id>), request
+  counts by status code, in-flight gauge and queries-per-request histogram.
+- Database: utils wraps the Supabase clients with instrument(); every .execute() is counted and
+  timed per table and operation (select/insert/update/upsert/delete/rpc).
+- Dependencies: circuit breaker state and call counters from resilience.py.
+
+No external services or libraries. Each gunicorn worker keeps its own metrics; with METRICS_DIR
+set (gunicorn.conf.py sets it) every worker also writes them to METRICS_DIR/<pid>.json every
+METRICS_FLUSH_SECONDS, and /metrics, whichever worker answers, merges the files of all workers:
+counters and histograms are summed (including workers that have exited), the in-flight gauge
+covers live workers, and per-process state (circuit breakers) carries a worker="<pid>" label.
+
+/metrics requires "Authorization: Bearer <METRICS_TOKEN>"; without METRICS_TOKEN it is only
+served in debug and testing mode.
+"""
+import os
+import json
+import time
+import bisect
+import threading
+import contextvars
+from flask import request, g, Response, current_app
+from app_logging import get_logger
+
+log = get_logger('metrics')
+
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+QUERIES_PER_REQUEST_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+# ---------------- METRIC TYPES ----------------
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.label_names = name, help_text, tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.values)
+
+    @staticmethod
+    def merge(snapshots):
+        merged = {}
+        for values in snapshots:
+            for labels, value in values.items():
+                merged[labels] = merged.get(labels, 0) + value
+        return merged
+
+    def samples(self, values=None):
+        values = self.snapshot() if values is None else values
+        return [f"{self.name}{_labels(self.label_names, k)} {v}" for k, v in values.items()]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        with self.lock:
+            self.values[labels] = value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}   # labels -> [bucket counts..., +Inf count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            row = self.values.get(labels)
+            if row is None:
+                row = self.values[labels] = [0] * (len(self.buckets) + 2)
+            row[i] += 1
+            row[-1] += value
+
+    def snapshot(self):
+        with self.lock:
+            return {k: list(v) for k, v in self.values.items()}
+
+    @staticmethod
+    def merge(snapshots):
+        merged = {}
+        for values in snapshots:
+            for labels, row in values.items():
+                total = merged.get(labels)
+                merged[labels] = list(row) if total is None else [a + b for a, b in zip(total, row)]
+        return merged
+
+    def samples(self, values=None):
+        values = self.snapshot() if values is None else values
+        lines = []
+        for labels, row in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), row[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {row[-1]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+REGISTRY = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+http_requests = register(Counter('pm_http_requests_total', 'HTTP requests by endpoint and status', ('method', 'endpoint', 'status')))
+http_latency = register(Histogram('pm_http_request_duration_seconds', 'Time until the view returned a response', ('method', 'endpoint')))
+http_in_flight = register(Gauge('pm_http_requests_in_flight', 'Requests currently being handled'))
+request_queries = register(Histogram('pm_http_request_db_queries', 'Supabase queries made per request', ('endpoint',), QUERIES_PER_REQUEST_BUCKETS))
+db_queries = register(Counter('pm_db_queries_total', 'Supabase queries by table and operation', ('table', 'op')))
+db_errors = register(Counter('pm_db_query_errors_total', 'Failed Supabase queries by table and operation', ('table', 'op')))
+db_latency = register(Histogram('pm_db_query_duration_seconds', 'Supabase query latency', ('table', 'op'), QUERY_BUCKETS))
+
+
+# ---------------- SUPABASE INSTRUMENTATION ----------------
+
+# Per-request query tally. The object is shared (not copied) with run_concurrently() threads,
+# so parallel queries count towards the request that started them.
+current_queries = contextvars.ContextVar('pm_request_queries', default=None)
+
+BUILDER_OPS = ('select', 'insert', 'update', 'upsert', 'delete')
+
+# Set by query_budget (development/tests): builder chains are kept so queries can be compared
+# by shape, and every executed query is passed to the listeners.
+TRACE_QUERIES = False
+query_listeners = []
+
+
+class QueryTally:
+    __slots__ = ('count', 'seconds', 'lock')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.count += 1
+            self.seconds += seconds
+
+
+def record_query(table, op, seconds, failed=False, steps=()):
+    db_queries.inc(table, op)
+    db_latency.observe(seconds, table, op)
+    if failed:
+        db_errors.inc(table, op)
+    tally = current_queries.get()
+    if tally is not None:
+        tally.add(seconds)
+    for listener in query_listeners:
+        listener(table, op, seconds, steps)
+
+
+class _Query:
+    """Wraps a postgrest builder chain; times .execute() and tracks the operation."""
+    __slots__ = ('_builder', '_table', '_op', '_steps')
+
+    def __init__(self, builder, table, op, steps=()):
+        self._builder, self._table, self._op, self._steps = builder, table, op, steps
+
+    def execute(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = self._builder.execute(*args, **kwargs)
+        except Exception:
+            record_query(self._table, self._op, time.perf_counter() - start, True, self._steps)
+            raise
+        record_query(self._table, self._op, time.perf_counter() - start, False, self._steps)
+        return result
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            # Properties such as .not_ return the next builder in the chain
+            if hasattr(attr, 'execute'):
+                steps = self._steps + ((name, ()),) if TRACE_QUERIES else ()
+                return _Query(attr, self._table, self._op, steps)
+            return attr
+        op = name if name in BUILDER_OPS and self._op == 'select' else self._op
+
+        def chained(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if not hasattr(result, 'execute'):
+                return result
+            steps = self._steps + ((name, args),) if TRACE_QUERIES else ()
+            return _Query(result, self._table, op, steps)
+        return chained
+
+
+class InstrumentedClient:
+    """Supabase client proxy: table()/rpc() are instrumented, everything else passes through."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name):
+        return _Query(self._client.table(name), name, 'select')
+
+    from_ = table
+
+    def rpc(self, fn, *args, **kwargs):
+        steps = (('rpc', args),) if TRACE_QUERIES else ()
+        return _Query(self._client.rpc(fn, *args, **kwargs), f"rpc:{fn}", 'rpc', steps)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def instrument(client):
+    if client is None or isinstance(client, InstrumentedClient):
+        return client
+    return InstrumentedClient(client)
+
+
+# ---------------- FLASK MIDDLEWARE ----------------
+
+def _endpoint():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+DEPENDENCY_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+DEPENDENCY_OUTCOMES = ('successes', 'failures', 'timeouts', 'rejected_open', 'rejected_full')
+
+
+def _dependency_snapshot():
+    try:
+        import resilience
+    except ImportError:
+        return {}
+    return resilience.snapshot()
+
+
+def _dependency_samples(workers):
+    """workers: [(pid, live, dependency snapshot)]. Breaker state is per process, calls add up."""
+    lines = [
+        '# HELP pm_dependency_state Circuit breaker state (0 closed, 1 half-open, 2 open)',
+        '# TYPE pm_dependency_state gauge',
+    ]
+    lines += [f'pm_dependency_state{{dependency="{n}",worker="{pid}"}} {DEPENDENCY_STATES.get(s["state"], 0)}'
+              for pid, live, snapshot in workers if live for n, s in snapshot.items()]
+    lines += ['# HELP pm_dependency_in_flight Calls currently running against the dependency',
+              '# TYPE pm_dependency_in_flight gauge']
+    lines += [f'pm_dependency_in_flight{{dependency="{n}",worker="{pid}"}} {s["in_flight"]}'
+              for pid, live, snapshot in workers if live for n, s in snapshot.items()]
+    lines += ['# HELP pm_dependency_calls_total Dependency calls by outcome',
+              '# TYPE pm_dependency_calls_total counter']
+    calls = {}
+    for _, _, snapshot in workers:
+        for name, snap in snapshot.items():
+            for outcome in DEPENDENCY_OUTCOMES:
+                calls[(name, outcome)] = calls.get((name, outcome), 0) + snap[outcome]
+    lines += [f'pm_dependency_calls_total{{dependency="{n}",outcome="{o}"}} {v}' for (n, o), v in calls.items()]
+    return lines
+
+
+# ---------------- MULTI-PROCESS ----------------
+
+def _worker_path(pid, dead=False):
+    return os.path.join(METRICS_DIR, f"{pid}{'.dead' if dead else ''}.json")
+
+
+def _encode(values):
+    return [[list(labels), value] for labels, value in values.items()]
+
+
+def _decode(items):
+    return {tuple(labels): value for labels, value in items}
+
+
+def write_snapshot():
+    """Writes this worker's metrics to METRICS_DIR/<pid>.json (atomically)."""
+    pid = os.getpid()
+    data = {
+        'pid': pid,
+        'metrics': {m.name: _encode(m.snapshot()) for m in REGISTRY},
+        'dependencies': _dependency_snapshot(),
+    }
+    path = _worker_path(pid)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def mark_process_dead(pid):
+    """Called by the gunicorn master when a worker exits: its counters stay, its gauges go."""
+    if METRICS_DIR and os.path.exists(_worker_path(pid)):
+        os.replace(_worker_path(pid), _worker_path(pid, dead=True))
+
+
+def _read_snapshots():
+    """[(live, snapshot)] for every worker file in METRICS_DIR."""
+    snapshots = []
+    for name in os.listdir(METRICS_DIR):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, name)) as f:
+                snapshots.append((not name.endswith('.dead.json'), json.load(f)))
+        except (OSError, ValueError) as e:
+            # Mid-rename or truncated: skip it for this scrape
+            log.warning("Skipping metrics file %s: %s", name, e)
+    return snapshots
+
+
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+def _ensure_flusher():
+    """Starts this worker's snapshot writer (once per process: threads don't survive fork)."""
+    global _flusher_pid
+    if not METRICS_DIR or _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+
+    def run():
+        while METRICS_DIR:
+            time.sleep(METRICS_FLUSH_SECONDS)
+            try:
+                write_snapshot()
+            except Exception as e:
+                log.warning("Metrics snapshot failed: %s", e)
+
+    threading.Thread(target=run, daemon=True, name='metrics-flush').start()
+
+
+def render():
+    if not METRICS_DIR:
+        workers = [(os.getpid(), True, _dependency_snapshot())]
+        per_metric = {m.name: m.snapshot() for m in REGISTRY}
+    else:
+        # Fresh numbers for the worker answering; the others are at most METRICS_FLUSH_SECONDS old
+        write_snapshot()
+        snapshots = _read_snapshots()
+        workers = [(s['pid'], live, s.get('dependencies', {})) for live, s in snapshots]
+        per_metric = {}
+        for metric in REGISTRY:
+            values = [_decode(s['metrics'].get(metric.name, [])) for live, s in snapshots
+                      if live or metric.kind != 'gauge']
+            per_metric[metric.name] = metric.merge(values)
+
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples(per_metric[metric.name]))
+    lines.extend(_dependency_samples(workers))
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    token = os.environ.get('METRICS_TOKEN')
+
+    @app.before_request
+    def start_timer():
+        _ensure_flusher()
+        g.metrics_start = time.perf_counter()
+        g.metrics_queries = QueryTally()
+        g.metrics_queries_reset = current_queries.set(g.metrics_queries)
+        http_in_flight.inc()
+
+    @app.after_request
+    def record_request(response):
+        start = g.get('metrics_start')
+        if start is not None:
+            endpoint = _endpoint()
+            http_latency.observe(time.perf_counter() - start, request.method, endpoint)
+            http_requests.inc(request.method, endpoint, str(response.status_code))
+            request_queries.observe(g.metrics_queries.count, endpoint)
+        return response
+
+    @app.teardown_request
+    def finish_request(exc):
+        if g.get('metrics_start') is not None:
+            http_in_flight.dec()
+            current_queries.reset(g.metrics_queries_reset)
+            g.metrics_start = None
+
+    @app.route('/metrics')
+    def metrics():
+        if not token and not (current_app.debug or current_app.testing):
+            return Response("Set METRICS_TOKEN to enable /metrics\n", status=403, mimetype='text/plain')
+        if token and request.headers.get('Authorization') != f"Bearer {token}":
+            return Response("Unauthorized\n", status=401, mimetype='text/plain')
+        return Response(render(), content_type=CONTENT_TYPE)
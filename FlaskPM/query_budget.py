@@ -0,0 +1,257 @@
+"""
+N+1 detector and per-request query budgets (development and tests).
+
+While enabled, every Supabase query made during a request or a scheduler tick is recorded by
+shape: table, operation and the columns it selects/filters on, without the values. Then:
+  - a shape that runs N_PLUS_ONE_THRESHOLD+ times with different values in one request/tick
+    is reported as a likely N+1 (a query in a loop that could be one .in_() query),
+  - a route declaring @query_budget(n) whose view makes more than n queries is reported,
+  - a summary of the worst offenders is logged when the process exits.
+
+Enabled by QUERY_DEBUG=1 (report only) or QUERY_DEBUG=strict (budget overruns and N+1s raise
+QueryBudgetExceeded), and automatically in debug mode (report) and testing mode (strict), so a
+test that exercises a route fails when the route goes over its budget.
+Disabled, the hooks cost one attribute check per request.
+"""
+import os
+import atexit
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+from flask import request, g
+import metrics
+from app_logging import get_logger
+
+log = get_logger('query_budget')
+
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('QUERY_DEBUG_N_PLUS_ONE', 3))
+REPORT_LIMIT = 10
+
+QUERY_DEBUG = os.environ.get('QUERY_DEBUG', '').lower()
+
+# Builder methods whose first argument is a column name (kept in the shape); the rest of their
+# arguments are values. Other methods (insert payloads, limits...) contribute only their name.
+COLUMN_METHODS = {
+    'eq', 'neq', 'gt', 'gte', 'lt', 'lte', 'like', 'ilike', 'is_', 'in_', 'contains',
+    'contained_by', 'match', 'filter', 'order', 'text_search', 'overlaps', 'range_gt', 'range_lt',
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(limit):
+    """
+    Declares the most Supabase queries one request to this route may make. Only queries made
+    while the view runs count: app-wide hooks (the session user check in app.py) vary with how
+    the caller authenticated, not with what the route does.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            unit = current_trace.get()
+            if unit is None:
+                return f(*args, **kwargs)
+            start = len(unit.queries)
+            try:
+                return f(*args, **kwargs)
+            finally:
+                unit.budgeted = len(unit.queries) - start
+        wrapper.query_budget = limit
+        return wrapper
+    return decorator
+
+
+def describe(table, op, steps):
+    """(shape, values) for one executed query."""
+    shape = [table, op]
+    values = []
+    for name, args in steps:
+        if name == 'select':
+            shape.append(f"select({', '.join(map(str, args)) or '*'})")
+        elif name in COLUMN_METHODS and args:
+            shape.append(f"{name}({args[0]})")
+            values.extend(repr(a) for a in args[1:])
+        elif name == 'rpc':
+            values.extend(repr(a) for a in args)
+        elif name == op:
+            continue
+        else:
+            shape.append(name)
+            if name in ('limit', 'range', 'offset'):
+                values.extend(repr(a) for a in args)
+    return ' '.join(shape), tuple(values)
+
+
+class QueryTrace:
+    """Queries made by one unit of work (request or scheduler tick)."""
+    def __init__(self, name, budget=None):
+        self.name = name
+        self.budget = budget
+        self.queries = []
+        # Queries counted against the budget (set by @query_budget; None counts them all)
+        self.budgeted = None
+        self.lock = threading.Lock()
+
+    def add(self, table, op, seconds, steps):
+        shape, values = describe(table, op, steps)
+        with self.lock:
+            self.queries.append((shape, values, seconds))
+
+    def repeated_shapes(self):
+        """[(shape, runs, distinct_values)] for shapes run N_PLUS_ONE_THRESHOLD+ times."""
+        groups = {}
+        with self.lock:
+            for shape, values, _ in self.queries:
+                groups.setdefault(shape, []).append(values)
+        return [
+            (shape, len(runs), len(set(runs)))
+            for shape, runs in groups.items() if len(runs) >= N_PLUS_ONE_THRESHOLD
+        ]
+
+    def budget_count(self):
+        return len(self.queries) if self.budgeted is None else self.budgeted
+
+    def over_budget(self):
+        return self.budget is not None and self.budget_count() > self.budget
+
+    def problems(self):
+        found = []
+        if self.over_budget():
+            found.append(f"{self.budget_count()} queries (budget {self.budget})")
+        for shape, runs, distinct in self.repeated_shapes():
+            kind = "N+1" if distinct > 1 else "duplicate"
+            found.append(f"{kind}: '{shape}' ran {runs}x ({distinct} distinct values)")
+        return found
+
+
+current_trace = contextvars.ContextVar('pm_query_trace', default=None)
+
+
+def _listener(table, op, seconds, steps):
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(table, op, seconds, steps)
+
+
+# ---------------- REPORT ----------------
+_report = {}   # unit name -> stats
+_report_lock = threading.Lock()
+
+
+def _record(trace, problems):
+    with _report_lock:
+        stats = _report.setdefault(trace.name, {'runs': 0, 'queries': 0, 'max_queries': 0, 'over_budget': 0, 'repeats': {}})
+        stats['runs'] += 1
+        stats['queries'] += len(trace.queries)
+        stats['max_queries'] = max(stats['max_queries'], len(trace.queries))
+        if trace.over_budget():
+            stats['over_budget'] += 1
+        for shape, runs, distinct in trace.repeated_shapes():
+            key = ("N+1" if distinct > 1 else "duplicate", shape)
+            stats['repeats'][key] = max(stats['repeats'].get(key, 0), runs)
+
+
+def report(limit=REPORT_LIMIT):
+    """Worst offenders so far: most repeated shapes first, then most queries per run."""
+    with _report_lock:
+        items = sorted(
+            _report.items(),
+            key=lambda kv: (max(kv[1]['repeats'].values(), default=0), kv[1]['max_queries']),
+            reverse=True
+        )[:limit]
+    lines = ["Query report (worst offenders):"]
+    for name, s in items:
+        lines.append(f"  {name}: {s['runs']} run(s), max {s['max_queries']} queries, "
+                     f"avg {s['queries'] / s['runs']:.1f}, over budget {s['over_budget']}x")
+        for (kind, shape), runs in sorted(s['repeats'].items(), key=lambda kv: -kv[1]):
+            lines.append(f"      {kind} x{runs}: {shape}")
+    return "\n".join(lines)
+
+
+def _log_report():
+    if _report:
+        log.info(report())
+
+
+_started = False
+
+
+def enable():
+    global _started
+    if _started:
+        return
+    _started = True
+    metrics.TRACE_QUERIES = True
+    metrics.query_listeners.append(_listener)
+    atexit.register(_log_report)
+
+
+def finish(trace, strict):
+    problems = trace.problems()
+    _record(trace, problems)
+    if problems:
+        message = f"[query budget] {trace.name}: " + "; ".join(problems)
+        if strict:
+            raise QueryBudgetExceeded(message)
+        log.warning(message)
+
+
+# ---------------- HOOKS ----------------
+
+@contextmanager
+def trace(name, budget=None):
+    """Traces one scheduler tick / background job (only when QUERY_DEBUG is set)."""
+    if not QUERY_DEBUG:
+        yield None
+        return
+    enable()
+    unit = QueryTrace(name, budget)
+    token = current_trace.set(unit)
+    try:
+        yield unit
+    finally:
+        current_trace.reset(token)
+        finish(unit, QUERY_DEBUG == 'strict')
+
+
+def _mode(app):
+    if QUERY_DEBUG:
+        return QUERY_DEBUG
+    if app.testing:
+        return 'strict'
+    if app.debug:
+        return '1'
+    return None
+
+
+def init_app(app):
+    @app.before_request
+    def start_query_trace():
+        if not _mode(app):
+            return
+        enable()
+        view = app.view_functions.get(request.endpoint)
+        g.query_trace = QueryTrace(f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+                                   getattr(view, 'query_budget', None))
+        g.query_trace_token = current_trace.set(g.query_trace)
+
+    @app.after_request
+    def check_query_budget(response):
+        unit = g.get('query_trace')
+        if unit is None:
+            return response
+        g.query_trace = None
+        current_trace.reset(g.query_trace_token)
+        response.headers['X-Query-Count'] = str(len(unit.queries))
+        finish(unit, _mode(app) == 'strict')
+        return response
+
+    @app.teardown_request
+    def end_query_trace(exc):
+        # after_request doesn't run when the view raised
+        if g.get('query_trace') is not None:
+            g.query_trace = None
+            current_trace.reset(g.query_trace_token)
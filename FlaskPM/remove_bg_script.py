@@ -1,29 +1,99 @@
-from PIL import Image
+"""
+Makes the white background of images transparent.
+
+Usage:
+    python remove_bg_script.py static/images/logo_v4.png
+    python remove_bg_script.py static/images --output-dir static/images/transparent --tolerance 20 --feather 8
+    python remove_bg_script.py uploads/ --recursive --workers 4
+
+Directories are processed in parallel across CPU cores. Output files are PNGs named
+<name><suffix>.png (next to the input unless --output-dir is given).
+"""
 import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from image_utils import remove_white_background_file, DEFAULT_TOLERANCE
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.webp', '.bmp', '.gif', '.tif', '.tiff'}
 
-def remove_white_bg(input_path, output_path):
+
+def remove_white_bg(input_path, output_path, tolerance=DEFAULT_TOLERANCE, feather=0, blur=0):
     print(f"Processing {input_path}...")
     try:
-        img = Image.open(input_path)
-        img = img.convert("RGBA")
-        datas = img.getdata()
-
-        new_data = []
-        for item in datas:
-            # Check if pixel is close to white (allow slight noise)
-            if item[0] > 240 and item[1] > 240 and item[2] > 240:
-                new_data.append((255, 255, 255, 0))
-            else:
-                new_data.append(item)
-
-        img.putdata(new_data)
-        img.save(output_path, "PNG")
+        remove_white_background_file(input_path, output_path, tolerance, feather, blur)
         print(f"Saved to {output_path}")
+        return True
     except Exception as e:
         print(f"Error: {e}")
+        return False
+
+
+def collect_inputs(paths, recursive=False, suffix="_transparent"):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            if recursive:
+                walker = ((d, names) for d, _, names in os.walk(path))
+            else:
+                walker = [(path, os.listdir(path))]
+            for directory, names in walker:
+                for name in sorted(names):
+                    stem, ext = os.path.splitext(name)
+                    # Skip our own output so re-runs don't process it again
+                    if ext.lower() in IMAGE_EXTENSIONS and not stem.endswith(suffix):
+                        files.append(os.path.join(directory, name))
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            print(f"Skipping {path}: not found")
+    return files
+
+
+def output_path_for(input_path, output_dir=None, suffix="_transparent"):
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    directory = output_dir or os.path.dirname(input_path)
+    return os.path.join(directory, f"{stem}{suffix}.png")
+
+
+def _process(job):
+    return remove_white_bg(*job)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Make near-white image backgrounds transparent.")
+    parser.add_argument("inputs", nargs="+", help="Image files and/or directories")
+    parser.add_argument("--output-dir", help="Where to write results (default: next to each input)")
+    parser.add_argument("--suffix", default="_transparent", help="Appended to output file names")
+    parser.add_argument("--tolerance", type=int, default=DEFAULT_TOLERANCE,
+                        help=f"Distance from pure white still treated as background (default {DEFAULT_TOLERANCE})")
+    parser.add_argument("--feather", type=int, default=0, help="Width of the soft edge ramp in intensity levels")
+    parser.add_argument("--blur", type=float, default=0, help="Gaussian blur radius for the alpha mask")
+    parser.add_argument("--recursive", action="store_true", help="Descend into sub-directories")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parallel processes")
+    args = parser.parse_args(argv)
+
+    files = collect_inputs(args.inputs, args.recursive, args.suffix)
+    if not files:
+        print("No images found.")
+        return 1
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    jobs = [
+        (f, output_path_for(f, args.output_dir, args.suffix), args.tolerance, args.feather, args.blur)
+        for f in files
+    ]
+    workers = max(1, min(args.workers, len(jobs)))
+    if workers == 1:
+        results = [_process(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_process, jobs))
+
+    failed = results.count(False)
+    print(f"Done: {len(results) - failed} processed, {failed} failed.")
+    return 1 if failed else 0
+
 
 if __name__ == "__main__":
-    base_dir = r"d:\Antigravity\FlaskPM\static\images"
-    input_file = os.path.join(base_dir, "logo_v4.png")
-    output_file = os.path.join(base_dir, "logo_v4_transparent.png")
-    remove_white_bg(input_file, output_file)
+    raise SystemExit(main())
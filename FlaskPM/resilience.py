@@ -0,0 +1,321 @@
+"""
+Circuit breakers, bulkheads and timeouts for calls to external services.
+
+Every outbound dependency called from a request thread (Nominatim, Gemini, SMTP, Supabase Auth)
+goes through a Dependency:
+  - bulkhead: at most max_concurrent calls in flight; extra callers are rejected immediately
+    instead of queueing behind a slow service,
+  - timeout: the caller stops waiting after 'timeout' seconds (the call keeps its bulkhead slot
+    until it really finishes, so a hung service can't pile up threads),
+  - circuit breaker: after failure_threshold consecutive failures/timeouts the circuit opens and
+    calls fail fast for reset_timeout seconds, then a single trial call decides whether it closes.
+Rejected calls raise DependencyUnavailable (or return the caller's fallback).
+
+Fault injection (development/tests): FAULT_INJECTION="nominatim=latency:8,smtp=error" or
+inject_fault(name, ...) makes a dependency slow or failing without touching the real service.
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from app_logging import get_logger
+
+log = get_logger('resilience')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class DependencyUnavailable(Exception):
+    """Raised instead of calling a dependency whose circuit is open or whose bulkhead is full."""
+    def __init__(self, name, reason):
+        super().__init__(f"{name} unavailable ({reason})")
+        self.name = name
+        self.reason = reason
+
+
+class DependencyTimeout(Exception):
+    pass
+
+
+class InjectedFault(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may go ahead (in half-open state only one trial call at a time)."""
+        with self.lock:
+            if self.state == OPEN and time.time() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    log.warning("Circuit '%s' opened after %d failure(s)", self.name, self.failures)
+                self.state = OPEN
+                self.opened_at = time.time()
+
+    def retry_after(self):
+        with self.lock:
+            if self.state != OPEN:
+                return 0
+            return max(0, int(self.reset_timeout - (time.time() - self.opened_at)) + 1)
+
+
+def client_error(exc):
+    """4xx-style errors (bad token, validation) mean the service is up and answering."""
+    status = getattr(exc, 'status', None) or getattr(exc, 'status_code', None) or getattr(exc, 'code', None)
+    return isinstance(status, int) and 400 <= status < 500
+
+
+class Dependency:
+    def __init__(self, name, timeout, max_concurrent, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.timeout = timeout
+        self.max_concurrent = max_concurrent
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.in_flight = 0
+        self.fault = None
+        self.stats = {'calls': 0, 'successes': 0, 'failures': 0, 'timeouts': 0,
+                      'rejected_open': 0, 'rejected_full': 0, 'fallbacks': 0}
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _count(self, key, delta=1):
+        with self._lock:
+            self.stats[key] += delta
+
+    def _executor(self):
+        # Sized to the bulkhead, so submissions never queue
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix=f'dep-{self.name}')
+        return self._pool
+
+    def _apply_fault(self):
+        fault = self.fault
+        if not fault:
+            return
+        if fault.get('latency'):
+            time.sleep(fault['latency'])
+        if fault.get('error'):
+            raise InjectedFault(f"Injected fault for {self.name}")
+
+    def _admit(self):
+        if not self.breaker.allow():
+            self._count('rejected_open')
+            raise DependencyUnavailable(self.name, 'circuit open')
+        if not self.slots.acquire(blocking=False):
+            # Give back a half-open trial that never ran
+            with self.breaker.lock:
+                self.breaker.trial_running = False
+            self._count('rejected_full')
+            raise DependencyUnavailable(self.name, 'too many concurrent calls')
+        with self._lock:
+            self.stats['calls'] += 1
+            self.in_flight += 1
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self.slots.release()
+
+    def _run(self, fn, args, kwargs):
+        try:
+            self._apply_fault()
+            return fn(*args, **kwargs)
+        finally:
+            self._release()
+
+    def call(self, fn, *args, fallback=None, **kwargs):
+        """
+        Runs fn(*args, **kwargs) under this dependency's breaker, bulkhead and timeout.
+        With 'fallback' (a zero-argument callable), it is returned instead of raising
+        DependencyUnavailable / DependencyTimeout / the call's own exception.
+        """
+        timeout = self.timeout
+        try:
+            self._admit()
+        except DependencyUnavailable:
+            if fallback is None:
+                raise
+            self._count('fallbacks')
+            return fallback()
+
+        future = self._executor().submit(self._run, fn, args, kwargs)
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeout:
+            self._count('timeouts')
+            self.breaker.record_failure()
+            log.warning("%s: call timed out after %ss", self.name, timeout)
+            if fallback is None:
+                raise DependencyTimeout(f"{self.name} timed out after {timeout}s")
+            self._count('fallbacks')
+            return fallback()
+        except Exception as e:
+            if client_error(e):
+                # Not the dependency's fault: no fallback, doesn't trip the breaker
+                self.breaker.record_success()
+                raise
+            self._count('failures')
+            self.breaker.record_failure()
+            if fallback is None:
+                raise
+            self._count('fallbacks')
+            return fallback()
+
+        self._count('successes')
+        self.breaker.record_success()
+        return result
+
+    def available(self):
+        """False while the circuit is open (cheap pre-check; doesn't take a half-open trial)."""
+        breaker = self.breaker
+        return breaker.state != OPEN or time.time() - breaker.opened_at >= breaker.reset_timeout
+
+    def guard(self):
+        """
+        For long-lived calls the caller drives itself (streams): admission + bookkeeping only.
+            with dep.guard() as g: ...; g.failed() on error
+        """
+        return _Guard(self)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            in_flight = self.in_flight
+        return {
+            'state': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'retry_after': self.breaker.retry_after(),
+            'in_flight': in_flight,
+            'max_concurrent': self.max_concurrent,
+            'timeout': self.timeout,
+            'fault': self.fault,
+            **stats,
+        }
+
+
+class _Guard:
+    def __init__(self, dep):
+        self.dep = dep
+        self.ok = True
+
+    def failed(self):
+        self.ok = False
+
+    def __enter__(self):
+        self.dep._admit()
+        try:
+            self.dep._apply_fault()
+        except InjectedFault:
+            self.__exit__(InjectedFault, None, None)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.dep._release()
+        if exc_type is None and self.ok:
+            self.dep._count('successes')
+            self.dep.breaker.record_success()
+        else:
+            self.dep._count('failures')
+            self.dep.breaker.record_failure()
+        return False
+
+
+# ---------------- REGISTRY ----------------
+
+def _env(name, key, default, cast=float):
+    return cast(os.environ.get(f"{name.upper()}_{key}", default))
+
+
+def _dependency(name, timeout, max_concurrent, failure_threshold=5, reset_timeout=30):
+    return Dependency(
+        name,
+        timeout=_env(name, 'TIMEOUT', timeout),
+        max_concurrent=_env(name, 'MAX_CONCURRENT', max_concurrent, int),
+        failure_threshold=_env(name, 'FAILURE_THRESHOLD', failure_threshold, int),
+        reset_timeout=_env(name, 'RESET_TIMEOUT', reset_timeout),
+    )
+
+
+# Overridable per dependency, e.g. NOMINATIM_TIMEOUT=3 GEMINI_MAX_CONCURRENT=8
+nominatim = _dependency('nominatim', timeout=4, max_concurrent=4, failure_threshold=3, reset_timeout=60)
+gemini = _dependency('gemini', timeout=30, max_concurrent=8)
+smtp = _dependency('smtp', timeout=15, max_concurrent=2, failure_threshold=3, reset_timeout=120)
+supabase_auth = _dependency('supabase_auth', timeout=5, max_concurrent=16, reset_timeout=15)
+
+DEPENDENCIES = {d.name: d for d in (nominatim, gemini, smtp, supabase_auth)}
+
+
+def snapshot():
+    return {name: dep.snapshot() for name, dep in DEPENDENCIES.items()}
+
+
+# ---------------- FAULT INJECTION ----------------
+
+def inject_fault(name, error=False, latency=0):
+    """Makes a dependency fail and/or stall (seconds) on every call until clear_faults()."""
+    DEPENDENCIES[name].fault = {'error': bool(error), 'latency': float(latency)} if (error or latency) else None
+
+
+def clear_faults():
+    for dep in DEPENDENCIES.values():
+        dep.fault = None
+
+
+def reset():
+    """Closes every circuit and zeroes the counters (tests)."""
+    for dep in DEPENDENCIES.values():
+        dep.breaker.record_success()
+        with dep._lock:
+            dep.stats = {k: 0 for k in dep.stats}
+
+
+def load_faults(spec):
+    """'nominatim=latency:8,smtp=error' -> injected faults."""
+    for item in filter(None, (s.strip() for s in (spec or '').split(','))):
+        name, _, fault = item.partition('=')
+        kind, _, value = fault.partition(':')
+        if name not in DEPENDENCIES:
+            log.warning("FAULT_INJECTION: unknown dependency '%s'", name)
+            continue
+        if kind == 'latency':
+            inject_fault(name, latency=float(value or 10))
+        else:
+            inject_fault(name, error=True)
+        log.warning("FAULT_INJECTION: %s -> %s", name, fault)
+
+
+load_faults(os.environ.get('FAULT_INJECTION'))
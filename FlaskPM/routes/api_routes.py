@@ -1,23 +1,73 @@
-from flask import Blueprint, request, jsonify, session, Response, g
-from utils import supabase, get_supabase_admin
+from flask import Blueprint, request, jsonify, session, Response, g, current_app, send_from_directory
+from werkzeug.test import EnvironBuilder
+from concurrent.futures import ThreadPoolExecutor
+from utils import supabase, get_supabase_admin, run_concurrently
+import os
 import uuid
 import csv
 import io
-import warnings
-# Suppress Google's FutureWarning
-warnings.filterwarnings("ignore", category=FutureWarning)
-
-import google.generativeai as genai
+import json
+import time
+import base64
+import threading
+from collections import OrderedDict
 from config import Config
-
-# Configure Gemini
-if Config.GEMINI_API_KEY:
-    genai.configure(api_key=Config.GEMINI_API_KEY)
+from http_cache import conditional_get, PUBLIC_DAY, PUBLIC_IMMUTABLE, PUBLIC_REVALIDATE
+from storage import get_storage, stream_size, hash_stream, content_key, BoundedReader, UploadTooLarge, set_progress, get_progress
+from thumbnails import preview_kind, schedule_previews
+from attachment_cleanup import request_purge, reconcile_bucket, remove_blobs, RECONCILE_GRACE_HOURS
+import avatars
+import assistant
+import resilience
+from query_budget import query_budget
+from search_index import index as search_index
+from app_logging import get_logger
+
+log = get_logger('api')
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+# WSGI environ key carrying the authenticated user into /api/batch sub-requests
+BATCH_USER_ENVIRON_KEY = 'pm.batch_user_id'
+
+# Recently verified Bearer tokens. Only consulted while Supabase Auth is failing (errors,
+# timeouts, circuit open), so signed-in clients keep working through a short auth outage.
+AUTH_FALLBACK_TTL = 15 * 60
+AUTH_FALLBACK_ENTRIES = 2048
+_verified_tokens = OrderedDict()
+_verified_tokens_lock = threading.Lock()
+
+def token_expiry(token):
+    # exp claim of an already verified JWT (no signature check needed here)
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload)).get('exp') or 0)
+    except Exception:
+        return 0
+
+def remember_verified_token(token, user):
+    expires = min(time.time() + AUTH_FALLBACK_TTL, token_expiry(token) or float('inf'))
+    with _verified_tokens_lock:
+        _verified_tokens[token] = (user, expires)
+        _verified_tokens.move_to_end(token)
+        while len(_verified_tokens) > AUTH_FALLBACK_ENTRIES:
+            _verified_tokens.popitem(last=False)
+
+def recall_verified_token(token):
+    with _verified_tokens_lock:
+        entry = _verified_tokens.get(token)
+    if entry and entry[1] > time.time():
+        return entry[0]
+    return None
+
 # Helper: Verify Auth Token (Used for Bearer Auth)
 def get_current_user_id():
+    # 0. Sub-request of /api/batch (already authenticated once by the batch handler)
+    batch_user_id = request.environ.get(BATCH_USER_ENVIRON_KEY)
+    if batch_user_id:
+        return batch_user_id
+
     # 1. Try Session (Cookie)
     user_id = session.get('user', {}).get('id')
     if user_id: 
@@ -28,31 +78,52 @@ def get_current_user_id():
     if auth_header and auth_header.startswith('Bearer '):
         try:
             token = auth_header.split(' ')[1]
-            res = supabase.auth.get_user(token)
+            res = resilience.supabase_auth.call(supabase.auth.get_user, token)
             if res.user:
                 g.current_user = res.user
+                remember_verified_token(token, res.user)
                 return res.user.id
             else:
-                print("Auth Error: Token verification failed (no user returned)")
+                log.info("Auth Error: Token verification failed (no user returned)")
         except Exception as e:
-            print(f"Auth Exception: {str(e)}")
+            # Outage (not a rejected token): accept tokens Supabase verified recently
+            user = None if resilience.client_error(e) else recall_verified_token(token)
+            if user:
+                g.current_user = user
+                return user.id
+            log.info("Auth Exception: %s", e)
     
     return None
 
+# Helper: Fetch the user's role from DB (Admin client bypasses RLS)
+def get_user_role(user_id, default='Team Member'):
+    try:
+        admin = get_supabase_admin()
+        u_res = admin.table('users').select('role').eq('id', user_id).execute()
+        if u_res.data:
+            return u_res.data[0].get('role', default)
+    except Exception as e:
+        log.warning("Role fetch error: %s", e)
+    return default
+
 # --- TEAM ---
 @api_bp.route('/team', methods=['GET'])
+@conditional_get
 def get_team():
     user_id = get_current_user_id()
     if not user_id: return jsonify([]), 401
     
     try:
-        admin = get_supabase_admin()
-        # Fetch all known users
-        res = admin.table('users').select('*').execute()
-        return jsonify(res.data)
+        return jsonify(load_team())
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+def load_team():
+    admin = get_supabase_admin()
+    # Fetch all known users
+    res = admin.table('users').select('*').execute()
+    return res.data
+
 @api_bp.route('/team/<user_id>', methods=['DELETE'])
 def delete_team_member(user_id):
     current_user_id = get_current_user_id()
@@ -107,14 +178,19 @@ def delete_team_member(user_id):
 # --- PROJECTS ---
 
 @api_bp.route('/projects', methods=['GET'])
+@query_budget(4)
+@conditional_get
 def get_projects():
     user_id = get_current_user_id()
     if not user_id: 
         return jsonify({"error": "Unauthorized"}), 401
     
-    # Get user role from DB for accuracy
+    # Get user role from DB for accuracy (the user's memberships load alongside it)
     admin = get_supabase_admin()
-    u_res = admin.table('users').select('role').eq('id', user_id).execute()
+    u_res, member_pids = run_concurrently(
+        lambda: admin.table('users').select('role').eq('id', user_id).execute(),
+        lambda: load_member_project_ids(user_id)
+    )
     
     # STRICT: If user not in DB, they shouldn't even reach here, but let's be double safe.
     if not u_res.data:
@@ -124,88 +200,117 @@ def get_projects():
     role = u_res.data[0].get('role', 'Team Member')
     
     try:
-        if role == 'Admin':
-            # Admin sees ALL projects
-            res = admin.table('projects').select('*').order('created_at', desc=True).execute()
-        else:
-            # Non-Admins: See owned projects OR projects they are members of
-            # 1. Get Project IDs where user is member
-            memberships = admin.table('project_members').select('project_id').eq('user_id', user_id).execute()
-            member_pids = [str(m['project_id']) for m in memberships.data]
-            
-            # 2. Query projects where owner_id = user OR id in member_pids
-            query = admin.table('projects').select('*').order('created_at', desc=True)
-            
-            # Construct 'or' filter string
-            or_filter = f"owner_id.eq.{user_id}"
-            if member_pids:
-                ids_str = "(" + ",".join(member_pids) + ")"
-                or_filter += f",id.in.{ids_str}"
-            
-            res = admin.table('projects').select('*').or_(or_filter).order('created_at', desc=True).execute()
-        
-        projects = res.data
-        
-        # Fetch Members for these projects to display avatars/count on cards
-        if projects:
-            p_ids = [p['id'] for p in projects]
-            try:
-                # Fetch members with user details
-                m_res = supabase.table('project_members').select('project_id, user:user_id(id, full_name, avatar_url)').in_('project_id', p_ids).execute()
-                
-                # Group members by project_id
-                members_map = {}
-                for relation in m_res.data:
-                    pid = str(relation['project_id'])
-                    if pid not in members_map: members_map[pid] = []
-                    
-                    if relation.get('user'):
-                        members_map[pid].append(relation['user'])
-                
-                # Attach to projects
-                for p in projects:
-                    p['members'] = members_map.get(str(p['id']), [])
-                    
-            except Exception as me:
-                print(f"Member Fetch Error: {me}")
-                # Don't fail the whole request, just return empty members
-                for p in projects: p['members'] = []
-
-        return jsonify(projects)
+        return jsonify(load_projects(user_id, role, member_pids))
     except Exception as e:
         print(f"Project Fetch Error: {e}")
         return jsonify([]), 400
 
-@api_bp.route('/projects/<project_id>', methods=['GET'])
-def get_project(project_id):
+def load_member_project_ids(user_id):
     admin = get_supabase_admin()
+    memberships = admin.table('project_members').select('project_id').eq('user_id', user_id).execute()
+    return [str(m['project_id']) for m in memberships.data]
+
+def load_members_map(project_ids=None):
+    """{project_id: [user, ...]} for the given projects (every project when None). None on failure."""
     try:
-        # Fetch Project Basic info
-        res = admin.table("projects").select("*").eq("id", project_id).single().execute()
-        project = res.data
-        
-        # Fetch Project Members
-        try:
-            # Join project_members with users table via user_id
-            m_res = supabase.table("project_members").select("role, user:user_id(id, full_name, avatar_url, email)").eq("project_id", project_id).execute()
-            
-            # Flatten/Format members list
-            members = []
-            for item in m_res.data:
-                if item.get('user'):
-                    u = item['user']
-                    u['role'] = item.get('role', 'Member')
-                    members.append(u)
-            
-            project['members'] = members
-        except Exception as e:
-            print(f"Error fetching members: {e}")
-            project['members'] = []
+        # Fetch members with user details
+        query = supabase.table('project_members').select('project_id, user:user_id(id, full_name, avatar_url)')
+        if project_ids is not None:
+            query = query.in_('project_id', project_ids)
+        m_res = query.execute()
+    except Exception as me:
+        log.error("Member Fetch Error: %s", me)
+        return None
+
+    # Group members by project_id
+    members_map = {}
+    for relation in m_res.data:
+        pid = str(relation['project_id'])
+        if pid not in members_map: members_map[pid] = []
+        
+        if relation.get('user'):
+            members_map[pid].append(relation['user'])
+    return members_map
+
+def load_projects(user_id, role, member_pids=None):
+    """
+    Projects visible to the user, each with 'members' (for avatars/count on cards).
+    The projects and members queries run side by side; pass member_pids if already loaded.
+    """
+    admin = get_supabase_admin()
+    if role == 'Admin':
+        # Admin sees ALL projects, so every membership row is needed too
+        res, members_map = run_concurrently(
+            lambda: admin.table('projects').select('*').order('created_at', desc=True).execute(),
+            load_members_map
+        )
+    else:
+        # Non-Admins: See owned projects OR projects they are members of
+        # 1. Get Project IDs where user is member
+        if member_pids is None:
+            member_pids = load_member_project_ids(user_id)
+        
+        # 2. Query projects where owner_id = user OR id in member_pids
+        # Construct 'or' filter string
+        or_filter = f"owner_id.eq.{user_id}"
+        if member_pids:
+            ids_str = "(" + ",".join(member_pids) + ")"
+            or_filter += f",id.in.{ids_str}"
+        
+        res, members_map = run_concurrently(
+            lambda: admin.table('projects').select('*').or_(or_filter).order('created_at', desc=True).execute(),
+            lambda: load_members_map(member_pids) if member_pids else {}
+        )
 
-        return jsonify(project)
+        # Owned projects the user isn't a member of weren't covered by the members query
+        known = set(member_pids)
+        owned_only = [p['id'] for p in res.data if str(p['id']) not in known]
+        if owned_only and members_map is not None:
+            extra = load_members_map(owned_only)
+            members_map = None if extra is None else {**members_map, **extra}
+    
+    projects = res.data
+    
+    # Attach to projects (Don't fail the whole request on a members error, just return empty members)
+    for p in projects:
+        p['members'] = (members_map or {}).get(str(p['id']), [])
+
+    return projects
+
+@api_bp.route('/projects/<project_id>', methods=['GET'])
+@conditional_get
+def get_project(project_id):
+    try:
+        return jsonify(load_project(project_id))
     except Exception as e:
         return jsonify({"error": "Project not found"}), 404
 
+def load_project(project_id):
+    admin = get_supabase_admin()
+    # Fetch Project Basic info (raises if not found)
+    res = admin.table("projects").select("*").eq("id", project_id).single().execute()
+    project = res.data
+    
+    # Fetch Project Members
+    try:
+        # Join project_members with users table via user_id
+        m_res = supabase.table("project_members").select("role, user:user_id(id, full_name, avatar_url, email)").eq("project_id", project_id).execute()
+        
+        # Flatten/Format members list
+        members = []
+        for item in m_res.data:
+            if item.get('user'):
+                u = item['user']
+                u['role'] = item.get('role', 'Member')
+                members.append(u)
+        
+        project['members'] = members
+    except Exception as e:
+        print(f"Error fetching members: {e}")
+        project['members'] = []
+
+    return project
+
 @api_bp.route('/projects/<project_id>', methods=['PATCH'])
 def update_project(project_id):
     user_id = get_current_user_id()
@@ -230,6 +335,7 @@ def update_project(project_id):
             return jsonify({"error": "Update failed or project not found"}), 404
             
         project = res.data[0]
+        search_index.upsert_projects([project])
         
         # Notify Project Members if Completed
         if updates.get('status') == 'Completed':
@@ -273,6 +379,10 @@ def delete_project(project_id):
         # Check if deletion happened (res.data shouldn't be empty if it existed)
         if not res.data:
             return jsonify({"error": "Project not found or already deleted"}), 404
+        search_index.remove_projects([project_id])
+
+        # Cascaded attachment rows queued their storage objects; free them in the background
+        request_purge()
 
         return jsonify({"message": "Project deleted successfully", "deleted_project": res.data[0]})
     except Exception as e:
@@ -306,6 +416,7 @@ def add_project_member(project_id):
             "user_id": new_member_id,
             "role": "Member"
         }).execute()
+        search_index.add_members(project_id, [new_member_id])
         
         # Notify New Member
         try:
@@ -373,6 +484,8 @@ def create_project():
             m_res = admin.table("project_members").insert(payload).execute()
             if not m_res.data:
                 print("Warning: Failed to insert project members")
+        search_index.upsert_projects([project])
+        search_index.add_members(project['id'], [m['user_id'] for m in payload])
 
         # Get Creator Name
         user_data = session.get('user', {})
@@ -393,11 +506,21 @@ def create_project():
         return jsonify({"error": f"Database Error: {str(e)}"}), 400
 
 # Helper: Targeted Notification
-def broadcast_notification(title, message, user_id=None, link=None, recipient_ids=None):
+def load_admin_ids():
+    """IDs of all Admins ([] on failure; notifications still go to the other recipients)."""
+    try:
+        admins_res = supabase.table("users").select("id").eq("role", "Admin").execute()
+        return [a['id'] for a in admins_res.data]
+    except Exception as ae:
+        log.warning("Admin fetch error in notify: %s", ae)
+        return []
+
+def broadcast_notification(title, message, user_id=None, link=None, recipient_ids=None, admin_ids=None):
     """
     Sends a notification.
     - user_id: Single recipient (legacy support)
     - recipient_ids: List of user IDs to receive the notification
+    - admin_ids: Admin IDs if the caller already loaded them (see load_admin_ids)
     """
     try:
         notifications = []
@@ -410,12 +533,7 @@ def broadcast_notification(title, message, user_id=None, link=None, recipient_id
             target_ids.update(recipient_ids)
             
         # --- NEW LOGIC: Always include all Admins in every notification ---
-        try:
-            admins_res = supabase.table("users").select("id").eq("role", "Admin").execute()
-            admin_ids = [a['id'] for a in admins_res.data]
-            target_ids.update(admin_ids)
-        except Exception as ae:
-            print(f"Admin fetch error in notify: {ae}")
+        target_ids.update(load_admin_ids() if admin_ids is None else admin_ids)
         
         for uid in target_ids:
             notifications.append({
@@ -434,6 +552,7 @@ def broadcast_notification(title, message, user_id=None, link=None, recipient_id
 # ---------------- TASKS ----------------
 
 @api_bp.route("/projects/<project_id>/tasks", methods=["GET"])
+@conditional_get
 def get_tasks(project_id):
     user_id = get_current_user_id()
     if not user_id: return jsonify([]), 410
@@ -443,16 +562,19 @@ def get_tasks(project_id):
     role = u_res.data[0].get('role', 'Team Member') if u_res.data else 'Team Member'
     
     try:
-        query = admin.table("tasks").select("*, assignee:assigned_to(full_name, avatar_url)").eq("project_id", project_id)
-        
-        if role != 'Admin':
-            query = query.eq('assigned_to', user_id)
-            
-        res = query.execute()
-        return jsonify(res.data)
+        return jsonify(load_project_tasks(project_id, user_id, role))
     except Exception as e:
         return jsonify([])
 
+def load_project_tasks(project_id, user_id, role):
+    admin = get_supabase_admin()
+    query = admin.table("tasks").select("*, assignee:assigned_to(full_name, avatar_url)").eq("project_id", project_id)
+    
+    if role != 'Admin':
+        query = query.eq('assigned_to', user_id)
+        
+    return query.execute().data
+
 @api_bp.route("/user/tasks", methods=["GET"])
 def get_user_tasks():
     user_id = get_current_user_id()
@@ -465,6 +587,8 @@ def get_user_tasks():
         return jsonify({"error": str(e)}), 400
 
 @api_bp.route('/tasks', methods=['GET'])
+@query_budget(2)
+@conditional_get
 def get_all_tasks():
     user_id = get_current_user_id()
     if not user_id: return jsonify([]), 401
@@ -474,18 +598,22 @@ def get_all_tasks():
     role = u_res.data[0].get('role', 'Team Member') if u_res.data else 'Team Member'
     
     try:
-        query = admin.table('tasks').select('*, project:projects(title), assignee:assigned_to(full_name, avatar_url)').order('created_at', desc=True).limit(50)
-        
-        if role != 'Admin':
-             query = query.eq('assigned_to', user_id)
-             
-        res = query.execute()
-        return jsonify(res.data)
+        return jsonify(load_all_tasks(user_id, role))
     except Exception as e:
         print(f"Error fetching all tasks: {e}")
         return jsonify({"error": str(e)}), 400
 
+def load_all_tasks(user_id, role):
+    admin = get_supabase_admin()
+    query = admin.table('tasks').select('*, project:projects(title), assignee:assigned_to(full_name, avatar_url)').order('created_at', desc=True).limit(50)
+    
+    if role != 'Admin':
+         query = query.eq('assigned_to', user_id)
+         
+    return query.execute().data
+
 @api_bp.route('/tasks', methods=['POST'])
+@query_budget(5)
 def create_task():
     user_id = get_current_user_id()
     if not user_id: return jsonify({"error": "Unauthorized"}), 401
@@ -502,32 +630,43 @@ def create_task():
             'created_by': user_id,
             'assigned_to': data.get('assigned_to') or None 
         }
-        res = supabase.table('tasks').insert(new_task).execute()
-        task = res.data[0]
-        
-        # Get Creator Name
-        user_data = session.get('user', {})
-        creator_name = user_data.get('user_metadata', {}).get('full_name', user_data.get('email', 'Someone'))
-        
+
         # Get Assignee Name
-        assignee_name = "Unassigned"
-        if task.get('assigned_to'):
+        def get_assignee_name():
+            if not new_task['assigned_to']:
+                return "Unassigned"
             try:
-                a_res = supabase.table('users').select('full_name').eq('id', task.get('assigned_to')).single().execute()
+                a_res = supabase.table('users').select('full_name').eq('id', new_task['assigned_to']).single().execute()
                 if a_res.data:
-                    assignee_name = a_res.data.get('full_name', 'Unknown')
+                    return a_res.data.get('full_name', 'Unknown')
             except:
                 pass
+            return "Unassigned"
 
         # Helper to get project members
-        project_members = []
-        if task.get('project_id'):
+        def get_project_members():
+            if not new_task['project_id']:
+                return []
             try:
                 # Notify Project Members + Assignee
-                pm_res = supabase.table('project_members').select('user_id').eq('project_id', task['project_id']).execute()
-                project_members = [m['user_id'] for m in pm_res.data]
+                pm_res = supabase.table('project_members').select('user_id').eq('project_id', new_task['project_id']).execute()
+                return [m['user_id'] for m in pm_res.data]
             except:
-                pass
+                return []
+
+        # The lookups only need the request data, so they run alongside the insert
+        res, assignee_name, project_members, admin_ids = run_concurrently(
+            lambda: supabase.table('tasks').insert(new_task).execute(),
+            get_assignee_name,
+            get_project_members,
+            load_admin_ids
+        )
+        task = res.data[0]
+        search_index.upsert_tasks([task])
+        
+        # Get Creator Name
+        user_data = session.get('user', {})
+        creator_name = user_data.get('user_metadata', {}).get('full_name', user_data.get('email', 'Someone'))
 
         # Add Assignee if not in list (though likely is)
         if task.get('assigned_to') and task.get('assigned_to') not in project_members:
@@ -539,7 +678,8 @@ def create_task():
                 title="New Task Created", 
                 message=f"{creator_name} created a task [{task['title']}] and assigned to {assignee_name}.",
                 link=f"/projects/{task['project_id']}" if task.get('project_id') else None,
-                recipient_ids=project_members
+                recipient_ids=project_members,
+                admin_ids=admin_ids
             )
         
         return jsonify(task), 201
@@ -548,6 +688,7 @@ def create_task():
         return jsonify({"error": str(e)}), 400
 
 @api_bp.route('/tasks/<task_id>', methods=['PATCH'])
+@query_budget(3)
 def update_task(task_id):
     data = request.json
     try:
@@ -555,6 +696,7 @@ def update_task(task_id):
         # For notification, we check if status is in payload
         res = supabase.table('tasks').update(data).eq('id', task_id).execute()
         task = res.data[0]
+        search_index.upsert_tasks([task])
         
         # Check if status changed to critical states
         new_status = data.get('status')
@@ -588,13 +730,162 @@ def delete_task(task_id):
     if not user_id: return jsonify({"error": "Unauthorized"}), 401
     try:
         supabase.table('tasks').delete().eq('id', task_id).execute()
+        search_index.remove_tasks([task_id])
+        request_purge()
         return jsonify({"success": True})
     except Exception as e:
         print(f"Error deleting task: {e}")
         return jsonify({"error": str(e)}), 400
 
+# ---------------- BULK TASKS ----------------
+BULK_MAX_TASKS = 200
+BULK_UPDATE_FIELDS = ('status', 'priority', 'assigned_to', 'deadline', 'project_id')
+
+def get_bulk_task_ids(data):
+    ids = data.get('ids') if isinstance(data, dict) else None
+    if not isinstance(ids, list) or not ids:
+        return None, "'ids' must be a non-empty list"
+    if len(ids) > BULK_MAX_TASKS:
+        return None, f"Too many tasks (max {BULK_MAX_TASKS})"
+    return list(dict.fromkeys(ids)), None
+
+def describe_tasks(tasks, limit=3):
+    names = ", ".join(f"[{t.get('title')}]" for t in tasks[:limit])
+    if len(tasks) > limit:
+        names += f" and {len(tasks) - limit} more"
+    return names
+
+def notify_task_recipients(tasks, title, make_message, extra_recipients=None):
+    """
+    Coalesced notifications for bulk changes: ONE notification per recipient, listing only
+    the tasks that involve them (assignee/creator). Admins get one covering every task.
+    Single admin lookup + single insert, regardless of how many tasks changed.
+    """
+    per_user = {}
+    for t in tasks:
+        for uid in (t.get('assigned_to'), t.get('created_by')):
+            if uid:
+                per_user.setdefault(uid, []).append(t)
+    for uid in (extra_recipients or []):
+        per_user.setdefault(uid, list(tasks))
+
+    for admin_id in load_admin_ids():
+        per_user[admin_id] = list(tasks)
+
+    notifications = []
+    for uid, user_tasks in per_user.items():
+        project_ids = {t.get('project_id') for t in user_tasks}
+        pid = next(iter(project_ids)) if len(project_ids) == 1 else None
+        notifications.append({
+            "user_id": uid,
+            "title": title,
+            "message": make_message(user_tasks),
+            "link": f"/projects/{pid}" if pid else "/tasks"
+        })
+
+    if notifications:
+        try:
+            supabase.table("notifications").insert(notifications).execute()
+        except Exception as e:
+            log.error("Bulk Notification Error: %s", e)
+
+@api_bp.route('/tasks/bulk', methods=['PATCH'])
+def bulk_update_tasks():
+    """
+    Apply the same changes to many tasks in ONE statement (Kanban moves, multi-select).
+    Body: {"ids": [1, 2, 3], "updates": {"status": "Completed"}}
+    """
+    user_id = get_current_user_id()
+    if not user_id: return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.json or {}
+    ids, err = get_bulk_task_ids(data)
+    if err: return jsonify({"error": err}), 400
+
+    updates = {k: v for k, v in (data.get('updates') or {}).items() if k in BULK_UPDATE_FIELDS}
+    if not updates:
+        return jsonify({"error": f"No valid updates provided (allowed: {', '.join(BULK_UPDATE_FIELDS)})"}), 400
+
+    try:
+        res = supabase.table('tasks').update(updates).in_('id', ids).execute()
+        tasks = res.data
+        search_index.upsert_tasks(tasks)
+
+        # Same trigger as update_task: only critical status moves notify
+        new_status = updates.get('status')
+        if tasks and new_status in ['In Progress', 'Completed']:
+            user_data = session.get('user', {})
+            actor_name = user_data.get('user_metadata', {}).get('full_name', user_data.get('email', 'Someone'))
+            notify_task_recipients(
+                tasks,
+                title=f"Tasks {new_status}",
+                make_message=lambda ts: f"{actor_name} moved {len(ts)} task(s) to {new_status}: {describe_tasks(ts)}."
+            )
+
+        return jsonify({"updated": len(tasks), "tasks": tasks})
+    except Exception as e:
+        log.error("Bulk Update Error: %s", e)
+        return jsonify({"error": str(e)}), 400
+
+@api_bp.route('/tasks/bulk/reassign', methods=['POST'])
+def bulk_reassign_tasks():
+    """
+    Reassign many tasks at once.
+    Body: {"ids": [1, 2, 3], "assigned_to": "<user_id>" | null}
+    """
+    user_id = get_current_user_id()
+    if not user_id: return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.json or {}
+    ids, err = get_bulk_task_ids(data)
+    if err: return jsonify({"error": err}), 400
+    if 'assigned_to' not in data:
+        return jsonify({"error": "'assigned_to' is required"}), 400
+    assignee = data.get('assigned_to') or None
+
+    try:
+        res = supabase.table('tasks').update({'assigned_to': assignee}).in_('id', ids).execute()
+        tasks = res.data
+        search_index.upsert_tasks(tasks)
+
+        if tasks:
+            user_data = session.get('user', {})
+            actor_name = user_data.get('user_metadata', {}).get('full_name', user_data.get('email', 'Someone'))
+            notify_task_recipients(
+                tasks,
+                title="Tasks Reassigned",
+                make_message=lambda ts: f"{actor_name} reassigned {len(ts)} task(s): {describe_tasks(ts)}."
+            )
+
+        return jsonify({"updated": len(tasks), "tasks": tasks})
+    except Exception as e:
+        log.error("Bulk Reassign Error: %s", e)
+        return jsonify({"error": str(e)}), 400
+
+@api_bp.route('/tasks/bulk/delete', methods=['POST'])
+def bulk_delete_tasks():
+    """
+    Delete many tasks in one statement.
+    Body: {"ids": [1, 2, 3]}
+    """
+    user_id = get_current_user_id()
+    if not user_id: return jsonify({"error": "Unauthorized"}), 401
+
+    ids, err = get_bulk_task_ids(request.json or {})
+    if err: return jsonify({"error": err}), 400
+
+    try:
+        res = supabase.table('tasks').delete().in_('id', ids).execute()
+        search_index.remove_tasks([t['id'] for t in res.data])
+        request_purge()
+        return jsonify({"success": True, "deleted": [t['id'] for t in res.data]})
+    except Exception as e:
+        log.error("Bulk Delete Error: %s", e)
+        return jsonify({"error": str(e)}), 400
+
 # ---------------- COMMENTS ----------------
 @api_bp.route('/tasks/<task_id>/comments', methods=['GET'])
+@conditional_get
 def get_task_comments(task_id):
     user_id = get_current_user_id()
     if not user_id: return jsonify([]), 401
@@ -605,6 +896,7 @@ def get_task_comments(task_id):
         return jsonify({"error": str(e)}), 400
 
 @api_bp.route('/tasks/<task_id>/comments', methods=['POST'])
+@query_budget(4)
 def add_task_comment(task_id):
     user_id = get_current_user_id()
     if not user_id: return jsonify({"error": "Unauthorized"}), 401
@@ -621,6 +913,7 @@ def add_task_comment(task_id):
             'content': content
         }).execute()
         comment = res.data[0]
+        search_index.upsert_comments([comment])
         
         # Notify Task Participants (Assignee + Creator)
         # 1. Fetch Task Details
@@ -649,6 +942,7 @@ def add_task_comment(task_id):
 
 # ---------------- ATTACHMENTS ----------------
 @api_bp.route('/tasks/<task_id>/attachments', methods=['GET'])
+@conditional_get
 def get_task_attachments(task_id):
     user_id = get_current_user_id()
     if not user_id: return jsonify([]), 401
@@ -674,51 +968,208 @@ def upload_task_attachment(task_id):
     if file.filename == '':
         return jsonify({"error": "No selected file"}), 400
         
+    # Clients may pass their own id to poll GET /api/uploads/<id> while the upload runs
+    upload_id = request.headers.get('X-Upload-Id') or str(uuid.uuid4())
+
     try:
         # Use Admin Client (Service Role) to bypass RLS policies for BOTH Storage and DB
         admin_client = get_supabase_admin()
+        storage = get_storage()
         
-        if not admin_client:
+        if not admin_client or not storage:
             print("CRITICAL: Admin client not available. Check SUPABASE_SERVICE_KEY.")
             return jsonify({"error": "Server Configuration Error: Missing Admin Privileges"}), 500
 
-        # 1. Upload to Supabase Storage
         file_ext = file.filename.split('.')[-1]
-        unique_filename = f"{task_id}/{uuid.uuid4()}.{file_ext}"
-        file_content = file.read()
-        
-        # Upload using Admin Client
-        storage_res = admin_client.storage.from_('task-attachments').upload(
-            path=unique_filename,
-            file=file_content,
-            file_options={"content-type": file.content_type}
-        )
+        max_bytes = Config.MAX_UPLOAD_BYTES
+        size = stream_size(file.stream)
+        if size is not None and size > max_bytes:
+            raise UploadTooLarge(max_bytes)
+
+        # 1. Hash the spooled upload (local read, size cap enforced) -> content-addressed key
+        content_hash, size = hash_stream(file.stream, max_bytes)
+        storage_path = content_key(content_hash)
+
+        blob = None
+        try:
+            b_res = admin_client.table('attachment_blobs').select('storage_path').eq('content_hash', content_hash).execute()
+            blob = b_res.data[0] if b_res.data else None
+        except Exception as be:
+            # setup_attachment_dedup.sql not applied yet -> one object per upload, like before
+            log.warning("Blob lookup failed, dedup disabled: %s", be)
+            content_hash = None
+            storage_path = f"{task_id}/{uuid.uuid4()}.{file_ext}"
+
+        def upload_to_storage():
+            # Stream to Storage in chunks (constant memory, size cap enforced while reading)
+            set_progress(upload_id, received=0, total=size, status="uploading")
+            reader = BoundedReader(file.stream, max_bytes, on_progress=lambda n: set_progress(upload_id, received=n))
+            storage.upload_stream(storage_path, reader, size, file.content_type, upsert=bool(content_hash))
+
+        # 2. Upload only new content; duplicates just take another reference
+        if blob:
+            storage_path = blob['storage_path']
+            set_progress(upload_id, received=size, total=size, status="deduplicated")
+        else:
+            upload_to_storage()
+
+        if content_hash:
+            acquired, waited = acquire_attachment_blob(admin_client, {
+                'p_content_hash': content_hash,
+                'p_storage_path': storage_path,
+                'p_file_size': size,
+                'p_content_type': file.content_type
+            })
+            # First reference after the previous object was released (and possibly removed,
+            # perhaps after our own upload) -> store it again
+            if (blob or waited) and acquired and acquired.get('ref_count') == 1:
+                file.stream.seek(0)
+                upload_to_storage()
         
-        # 2. Get Public URL
-        public_url = admin_client.storage.from_('task-attachments').get_public_url(unique_filename)
+        # 3. Get Public URL
+        public_url = storage.public_url(storage_path)
         
-        # 3. Insert into DB Table
-        db_res = admin_client.table('task_attachments').insert({
+        # 4. Insert into DB Table
+        row = {
             'task_id': int(task_id), 
             'user_id': user_id,
             'file_name': file.filename,
             'file_url': public_url,
-            'file_type': file_ext
-        }).execute()
-        
-        return jsonify(db_res.data[0]), 201
-        
+            'file_type': file_ext,
+            'storage_path': storage_path
+        }
+        if content_hash:
+            row['content_hash'] = content_hash
+            row['file_size'] = size
+
+        # Same content already rendered for another attachment -> reuse its thumbnails
+        previews = None
+        if blob and preview_kind(file_ext):
+            try:
+                p_res = admin_client.table('task_attachments').select('thumbnail_url, preview_url')\
+                    .eq('content_hash', content_hash).eq('preview_status', 'ready').limit(1).execute()
+                previews = p_res.data[0] if p_res.data else None
+            except Exception as pe:
+                # setup_attachment_previews.sql not applied yet -> no previews
+                log.warning("Preview lookup failed, previews disabled: %s", pe)
+        if previews:
+            row.update(previews)
+            row['preview_status'] = 'ready'
+        elif preview_kind(file_ext):
+            row['preview_status'] = 'pending'
+
+        try:
+            db_res = insert_attachment_row(admin_client, row)
+        except Exception:
+            if content_hash:
+                release_attachment_blob(admin_client, content_hash)
+            raise
+        
+        set_progress(upload_id, status="done")
+        attachment = db_res.data[0]
+
+        # 5. Thumbnails / PDF preview are rendered in the background (thumbnails.py)
+        if attachment.get('preview_status') == 'pending':
+            status = schedule_previews(attachment, file.stream, storage, admin_client, content_hash)
+            if status != 'pending':
+                admin_client.table('task_attachments').update({'preview_status': status}).eq('id', attachment['id']).execute()
+                attachment['preview_status'] = status
+        attachment['deduplicated'] = bool(blob)
+        return jsonify(attachment), 201, {"X-Upload-Id": upload_id}
+        
+    except UploadTooLarge as e:
+        set_progress(upload_id, status="failed")
+        return jsonify({"error": str(e)}), 413
     except Exception as e:
+        set_progress(upload_id, status="failed")
         print(f"Upload Error: {e}")
         return jsonify({"error": f"Upload failed: {str(e)}"}), 400
 
+# Columns added by optional setup scripts (setup_attachment_previews.sql,
+# setup_attachment_cleanup.sql); left out of the insert when the table doesn't have them yet
+OPTIONAL_ATTACHMENT_COLUMNS = ('preview_status', 'thumbnail_url', 'preview_url', 'storage_path')
+
+def insert_attachment_row(admin_client, row):
+    """Inserts a task_attachments row, retrying without optional columns the schema lacks."""
+    row = dict(row)
+    while True:
+        try:
+            return admin_client.table('task_attachments').insert(row).execute()
+        except Exception as e:
+            # PostgREST: "Could not find the 'preview_status' column of 'task_attachments'" (PGRST204),
+            # Postgres: 'column "preview_status" of relation ... does not exist' (42703)
+            message = str(e)
+            missing = [c for c in OPTIONAL_ATTACHMENT_COLUMNS
+                       if c in row and (f"'{c}'" in message or f'"{c}"' in message)]
+            if not missing:
+                raise
+            log.warning("task_attachments lacks %s, inserting without it", ", ".join(missing))
+            for column in missing:
+                row.pop(column)
+
+# An upload of content whose object is being removed waits for the removal to finish
+BLOB_BUSY_RETRIES = 20
+BLOB_BUSY_WAIT_SECONDS = 0.5
+
+def acquire_attachment_blob(admin_client, params):
+    """
+    Takes a reference on a blob. Returns (blob, waited): 'waited' means the object was being
+    removed when we asked, so whatever was uploaded before is gone and must be stored again.
+    """
+    waited = False
+    for _ in range(BLOB_BUSY_RETRIES + 1):
+        blob = admin_client.rpc('acquire_attachment_blob', params).execute().data
+        if not blob or blob.get('state') != 'removing':
+            return blob, waited
+        waited = True
+        time.sleep(BLOB_BUSY_WAIT_SECONDS)
+    raise RuntimeError("Attachment storage is busy, please retry")
+
+def release_attachment_blob(admin_client, content_hash):
+    """
+    Drops one reference. When it was the last one the object is removed under a claim
+    (attachment_cleanup.remove_blobs), which concurrent uploads of the same content wait for.
+    """
+    try:
+        res = admin_client.rpc('release_attachment_blob', {'p_content_hash': content_hash}).execute()
+        blob = res.data
+        if blob and blob.get('ref_count', 1) <= 0:
+            remove_blobs(admin_client, [content_hash])
+    except Exception as e:
+        log.warning("Blob release failed for %s: %s", content_hash, e)
+
+@api_bp.route('/uploads/<upload_id>', methods=['GET'])
+def get_upload_progress(upload_id):
+    """
+    Server -> Storage progress of an upload (any worker can answer). The client -> server part
+    is the browser's own upload progress: the body is fully received before this starts counting.
+    """
+    user_id = get_current_user_id()
+    if not user_id: return jsonify({"error": "Unauthorized"}), 401
+
+    progress = get_progress(upload_id)
+    if not progress:
+        return jsonify({"error": "Unknown upload"}), 404
+    return jsonify(progress)
+
+@api_bp.route('/local-storage/<bucket>/<path:key>', methods=['GET'])
+def serve_local_storage(bucket, key):
+    # Only used with STORAGE_BACKEND=local (stand-in for Supabase public bucket URLs)
+    if Config.STORAGE_BACKEND != 'local':
+        return jsonify({"error": "Not found"}), 404
+    return send_from_directory(os.path.join(Config.LOCAL_STORAGE_DIR, bucket), key)
+
+@api_bp.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({"error": f"File exceeds the maximum upload size of {Config.MAX_UPLOAD_MB} MB"}), 413
+
 @api_bp.route('/attachments/<attachment_id>', methods=['DELETE'])
 def delete_attachment(attachment_id):
     user_id = get_current_user_id()
     if not user_id: return jsonify({"error": "Unauthorized"}), 401
     
     try:
-        # 1. Fetch Attachment to verify ownership and get file path
+        # 1. Fetch Attachment to verify ownership
         # Using Admin client just in case read is also protected/finicky, though public read should be fine.
         # But we need 'user_id' from it.
         admin_client = get_supabase_admin()
@@ -744,26 +1195,10 @@ def delete_attachment(attachment_id):
         if not (is_owner or is_admin):
             return jsonify({"error": "Unauthorized: You can only delete your own attachments"}), 403
 
-        # 3. Delete from Storage
-        # Construct path from URL or if we saved it? 
-        # We saved "unique_filename" as the path in the upload step but didn't store it explicitly in DB column 'path' maybe?
-        # The 'file_url' is "https://.../storage/v1/object/public/task-attachments/task_id/uuid.ext"
-        # The storage path is "task_id/uuid.ext".
-        
-        # Attempt to extract path from URL
-        file_url = attachment.get('file_url', '')
-        # Simple hack: split by 'task-attachments/'
-        if 'task-attachments/' in file_url:
-            storage_path = file_url.split('task-attachments/')[-1]
-            try:
-                # Remove from storage
-                # Note: 'remove' takes a list of paths
-                admin_client.storage.from_('task-attachments').remove([storage_path])
-            except Exception as se:
-                print(f"Storage Delete Warning: {se}")
-        
-        # 4. Delete from DB
+        # 3. Delete from DB. The delete trigger (setup_attachment_cleanup.sql) releases the blob
+        # reference and queues the freed storage keys, which are removed in the background.
         admin_client.table('task_attachments').delete().eq('id', attachment_id).execute()
+        request_purge()
         
         return jsonify({"success": True, "message": "Attachment deleted"})
 
@@ -771,6 +1206,8 @@ def delete_attachment(attachment_id):
         print(f"Delete Attachment Error: {e}")
         return jsonify({"error": str(e)}), 400
 @api_bp.route("/notifications", methods=["GET"])
+@query_budget(2)
+@conditional_get
 def get_notifications():
     user_id = get_current_user_id()
     if not user_id:
@@ -825,6 +1262,8 @@ def mark_all_read():
 
 # ---------------- STATS ----------------
 @api_bp.route("/stats", methods=["GET"])
+@query_budget(4)
+@conditional_get
 def get_stats():
     user_id = get_current_user_id()
     if not user_id:
@@ -839,126 +1278,169 @@ def get_stats():
         if r_res.data:
             role = r_res.data[0].get('role', 'Team Member')
     except Exception as e:
-        print(f"DEBUG: Role fetch error: {e}")
+        log.warning("Role fetch error: %s", e)
         role = 'Team Member'
 
-    
-    print(f"DEBUG: User {user_id} Role: {role}")
+    log.debug("Stats role resolved", extra={'user_id': user_id, 'role': role})
     
     try:
-        # Use verifier (Admin Client) to bypass RLS for dashboard counts
-        p_res = verifier.table("projects").select("id, title").execute()
-        projects_map = {p["id"]: p["title"] for p in p_res.data}
-        
-        # Filter stats based on role
-        query = verifier.table("tasks").select("id, project_id, status, created_at, assigned_to")
-        if role != 'Admin':
-             query = query.eq('assigned_to', user_id)
-             
-        tasks_res = query.execute()
-        tasks = tasks_res.data
-        print(f"DEBUG: Fetched {len(tasks)} tasks")
+        return jsonify(load_stats(user_id, role))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+def load_stats(user_id, role):
+    verifier = get_supabase_admin()
+    # Use verifier (Admin Client) to bypass RLS for dashboard counts
+    p_res = verifier.table("projects").select("id, title").execute()
+    projects_map = {p["id"]: p["title"] for p in p_res.data}
+    
+    # Filter stats based on role
+    query = verifier.table("tasks").select("id, project_id, status, created_at, assigned_to")
+    if role != 'Admin':
+         query = query.eq('assigned_to', user_id)
+         
+    tasks_res = query.execute()
+    tasks = tasks_res.data
+    log.debug("Stats tasks fetched", extra={'tasks': len(tasks)})
+    
+    # 1. Counts
+    total_projects = len(p_res.data)
+    total_tasks = len(tasks)
+    
+    # 2. Status
+    status_counts = {"To Do": 0, "In Progress": 0, "Completed": 0}
+    for t in tasks:
+        s = t.get("status", "To Do")
+        status_counts[s] = status_counts.get(s, 0) + 1
+        
+    # 3. Projects
+    proj_counts = {}
+    for t in tasks:
+        pid = t.get("project_id")
+        pname = projects_map.get(pid, "Unknown Project")
+        proj_counts[pname] = proj_counts.get(pname, 0) + 1
+    sorted_proj = sorted(proj_counts.items(), key=lambda x: x[1], reverse=True)[:5]
+    
+    # 4. Trend
+    from datetime import datetime, timedelta
+    today = datetime.now()
+    dates = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(6, -1, -1)]
+    activity_trend = {d: 0 for d in dates}
+    for t in tasks:
+        if t.get("created_at"):
+            c_date = t.get("created_at").split("T")[0]
+            if c_date in activity_trend:
+                activity_trend[c_date] += 1
+                
+    response_payload = {
+        "total_projects": total_projects,
+        "total_tasks": total_tasks,
+        "task_stats": status_counts,
+        "charts": {
+            "status": {"labels": list(status_counts.keys()), "data": list(status_counts.values())},
+            "projects": {"labels": [x[0] for x in sorted_proj], "data": [x[1] for x in sorted_proj]},
+            "trend": {"labels": dates, "data": [activity_trend[d] for d in dates]}
+        }
+    }
+    
+    # --- ADMIN INSIGHTS ---
+    if role == 'Admin':
+        # 1. Individual Performance (Tasks Completed vs Total by User)
+        # Need map of user_id -> name
+        users_res = verifier.table("users").select("id, full_name, email").execute()
+        users_map = {u['id']: u.get('full_name') or u.get('email') or 'Unknown' for u in users_res.data}
         
-        # 1. Counts
-        total_projects = len(p_res.data)
-        total_tasks = len(tasks)
+        member_stats = {} # {uid: {name, completed, total}}
         
-        # 2. Status
-        status_counts = {"To Do": 0, "In Progress": 0, "Completed": 0}
         for t in tasks:
-            s = t.get("status", "To Do")
-            status_counts[s] = status_counts.get(s, 0) + 1
-            
-        # 3. Projects
-        proj_counts = {}
-        for t in tasks:
-            pid = t.get("project_id")
-            pname = projects_map.get(pid, "Unknown Project")
-            proj_counts[pname] = proj_counts.get(pname, 0) + 1
-        sorted_proj = sorted(proj_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-        
-        # 4. Trend
-        from datetime import datetime, timedelta
-        today = datetime.now()
-        dates = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(6, -1, -1)]
-        activity_trend = {d: 0 for d in dates}
+            uid = t.get('assigned_to')
+            if uid:
+                if uid not in member_stats:
+                    member_stats[uid] = {'name': users_map.get(uid, 'Unknown'), 'completed': 0, 'total': 0, 'pending': 0}
+                
+                member_stats[uid]['total'] += 1
+                if t.get('status') == 'Completed':
+                    member_stats[uid]['completed'] += 1
+                else:
+                    member_stats[uid]['pending'] += 1
+        
+        # Convert to list
+        response_payload['member_stats'] = list(member_stats.values())
+        
+        # 2. Team Performance by Project (Progress % per project)
+        # We already have tasks and projects_map
+        project_stats = {} # {pid: {title, total, completed}}
+        
         for t in tasks:
-            if t.get("created_at"):
-                c_date = t.get("created_at").split("T")[0]
-                if c_date in activity_trend:
-                    activity_trend[c_date] += 1
-                    
-        response_payload = {
-            "total_projects": total_projects,
-            "total_tasks": total_tasks,
-            "task_stats": status_counts,
-            "charts": {
-                "status": {"labels": list(status_counts.keys()), "data": list(status_counts.values())},
-                "projects": {"labels": [x[0] for x in sorted_proj], "data": [x[1] for x in sorted_proj]},
-                "trend": {"labels": dates, "data": [activity_trend[d] for d in dates]}
-            }
-        }
+            pid = t.get('project_id')
+            if pid:
+                if pid not in project_stats:
+                     pname = projects_map.get(pid, 'Unknown Project')
+                     project_stats[pid] = {'title': pname, 'total': 0, 'completed': 0}
+                
+                project_stats[pid]['total'] += 1
+                if t.get('status') == 'Completed':
+                    project_stats[pid]['completed'] += 1
+        
+        # Calculate %
+        final_proj_perf = []
+        for pid, pdata in project_stats.items():
+            pct = round((pdata['completed'] / pdata['total']) * 100) if pdata['total'] > 0 else 0
+            final_proj_perf.append({
+                'title': pdata['title'],
+                'progress': pct,
+                'total': pdata['total'],
+                'completed': pdata['completed']
+            })
         
-        # --- ADMIN INSIGHTS ---
+        # Sort by progress desc
+        final_proj_perf.sort(key=lambda x: x['progress'], reverse=True)
+        response_payload['project_performance'] = final_proj_perf
+
+    return response_payload
+
+# --- CALENDAR ---
+def load_calendar_tasks(user_id, role, start_date=None, end_date=None):
+    query = supabase.table('tasks').select('*')
+    
+    # If NOT Admin, restrict tasks
+    if role != 'Admin':
+         query = query.or_(f"assigned_to.eq.{user_id},created_by.eq.{user_id}")
+         
+    if start_date and end_date:
+        query = query.gte('deadline', start_date).lte('deadline', end_date)
+    else:
+         query = query.not_.is_('deadline', 'null').limit(200)
+
+    return query.execute().data
+
+def load_calendar_entries(user_id, role, admin_ids, start_date=None, end_date=None):
+    """Rows of the calendar_events table visible to the user ([] if it can't be read)."""
+    try:
+        admin_client = get_supabase_admin() or supabase
+        
+        # Logic: Admins see all. Members see OWN + ADMIN events.
         if role == 'Admin':
-            # 1. Individual Performance (Tasks Completed vs Total by User)
-            # Need map of user_id -> name
-            users_res = verifier.table("users").select("id, full_name, email").execute()
-            users_map = {u['id']: u.get('full_name') or u.get('email') or 'Unknown' for u in users_res.data}
-            
-            member_stats = {} # {uid: {name, completed, total}}
-            
-            for t in tasks:
-                uid = t.get('assigned_to')
-                if uid:
-                    if uid not in member_stats:
-                        member_stats[uid] = {'name': users_map.get(uid, 'Unknown'), 'completed': 0, 'total': 0, 'pending': 0}
-                    
-                    member_stats[uid]['total'] += 1
-                    if t.get('status') == 'Completed':
-                        member_stats[uid]['completed'] += 1
-                    else:
-                        member_stats[uid]['pending'] += 1
-            
-            # Convert to list
-            response_payload['member_stats'] = list(member_stats.values())
-            
-            # 2. Team Performance by Project (Progress % per project)
-            # We already have tasks and projects_map
-            project_stats = {} # {pid: {title, total, completed}}
-            
-            for t in tasks:
-                pid = t.get('project_id')
-                if pid:
-                    if pid not in project_stats:
-                         pname = projects_map.get(pid, 'Unknown Project')
-                         project_stats[pid] = {'title': pname, 'total': 0, 'completed': 0}
-                    
-                    project_stats[pid]['total'] += 1
-                    if t.get('status') == 'Completed':
-                        project_stats[pid]['completed'] += 1
+            c_query = admin_client.table('calendar_events').select('*')
+        else:
+            # Supabase 'or' syntax: "user_id.eq.ME,user_id.in.(ADMIN_ID_1,ADMIN_ID_2...)"
+            filter_str = f"user_id.eq.{user_id}"
+            if admin_ids:
+                 filter_str += f",user_id.in.({','.join(admin_ids)})"
             
-            # Calculate %
-            final_proj_perf = []
-            for pid, pdata in project_stats.items():
-                pct = round((pdata['completed'] / pdata['total']) * 100) if pdata['total'] > 0 else 0
-                final_proj_perf.append({
-                    'title': pdata['title'],
-                    'progress': pct,
-                    'total': pdata['total'],
-                    'completed': pdata['completed']
-                })
+            c_query = admin_client.table('calendar_events').select('*').or_(filter_str)
             
-            # Sort by progress desc
-            final_proj_perf.sort(key=lambda x: x['progress'], reverse=True)
-            response_payload['project_performance'] = final_proj_perf
-
-        return jsonify(response_payload)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 400
+        if start_date and end_date:
+            c_query = c_query.gte('start_time', start_date).lte('start_time', end_date)
+        
+        return c_query.execute().data
+    except Exception:
+        # Table might not exist yet
+        return []
 
-# --- CALENDAR ---
 @api_bp.route('/calendar/events', methods=['GET'])
+@query_budget(3)
+@conditional_get
 def get_calendar_events():
     user_id = get_current_user_id()
     if not user_id: return jsonify([]), 401
@@ -969,26 +1451,20 @@ def get_calendar_events():
     events = []
     
     try:
-        # Check User Role (Safe Check)
+        # One read of the users directory gives the role, the Admin IDs and creator names
         admin = get_supabase_admin()
-        u_res = admin.table('users').select('role').eq('id', user_id).execute()
-        role = u_res.data[0].get('role', 'Team Member') if u_res.data else 'Team Member'
-
-        # 1. Fetch TASKS
-        query = supabase.table('tasks').select('*')
-        
-        # If NOT Admin, restrict tasks
-        if role != 'Admin':
-             query = query.or_(f"assigned_to.eq.{user_id},created_by.eq.{user_id}")
-             
-        if start_date and end_date:
-            query = query.gte('deadline', start_date).lte('deadline', end_date)
-        else:
-             query = query.not_.is_('deadline', 'null').limit(200)
-
-        t_res = query.execute()
-        tasks = t_res.data
+        u_res = admin.table('users').select('id, full_name, email, role').execute()
+        user_map = {u['id']: u.get('full_name') or u.get('email') for u in u_res.data}
+        admin_ids = [u['id'] for u in u_res.data if u.get('role') == 'Admin']
+        role = 'Admin' if user_id in admin_ids else 'Team Member'
+
+        # Tasks and calendar events don't depend on each other: fetch both at once
+        tasks, cal_events = run_concurrently(
+            lambda: load_calendar_tasks(user_id, role, start_date, end_date),
+            lambda: load_calendar_entries(user_id, role, admin_ids, start_date, end_date)
+        )
         
+        # 1. TASKS
         for t in tasks:
             # Color Logic for Tasks
             color = '#10b981' # Default Emerald
@@ -1020,96 +1496,37 @@ def get_calendar_events():
                     'url': f"/projects/{t['project_id']}" if t.get('project_id') else None
                 })
                 
-        # 2. Fetch CALENDAR EVENTS (New Table)
-        try:
-            admin_client = get_supabase_admin() or supabase
-            admin_client = get_supabase_admin() or supabase
-            
-            # Logic: Admins see all. Members see OWN + ADMIN events.
-            if role == 'Admin':
-                c_query = admin_client.table('calendar_events').select('*')
-            else:
-                # 1. Get Admin IDs
-                a_res = admin_client.table('users').select('id').eq('role', 'Admin').execute()
-                admin_ids = [a['id'] for a in a_res.data]
-                
-                # 2. Build Query: user_id=Me OR user_id=Admin
-                # Supabase 'or' syntax: "user_id.eq.ME,user_id.in.(ADMIN_ID_1,ADMIN_ID_2...)"
-                # Construct filter string
-                ids_filter = f"({','.join(admin_ids)})" if admin_ids else "()"
-                or_cond = f"user_id.eq.{user_id}"
-                if admin_ids:
-                    # Note: exact syntax for 'in' within 'or' can be tricky in Python client. 
-                    # Safer fallback: fetch all and filter in python if volumes are low, 
-                    # OR use separate queries. Let's use separate queries merge for safety.
-                    pass 
-
-                # Strategy: Fetch Own + Fetch Admin Events
-                # To be safe with Supabase-py syntax quirks, we'll fetch global admin events and own user events
-                # Actually, simpler: query.or_(f"user_id.eq.{user_id},user_id.in.{tuple(admin_ids)}") might be brittle
-                
-                # Let's try raw 'or' string: user_id.eq.UID,user_id.in.(ID1,ID2) 
-                # Syntax: .or_(f"user_id.eq.{user_id},user_id.in.({','.join(admin_ids)})")
-                
-                filter_str = f"user_id.eq.{user_id}"
-                if admin_ids:
-                     # Clean IDs for query
-                     c_ids = ",".join(admin_ids)
-                     filter_str += f",user_id.in.({c_ids})"
-                
-                c_query = admin_client.table('calendar_events').select('*').or_(filter_str)
-                
-            if start_date and end_date:
-                c_query = c_query.gte('start_time', start_date).lte('start_time', end_date)
+        # 2. CALENDAR EVENTS (New Table)
+        for e in cal_events:
+            # Color Logic for Events
+            # Normal: Blue (#3b82f6), Medium: Purple (#8b5cf6), High: Rose (#f43f5e)
+            p = e.get('priority', 'Normal')
+            bg_color = '#3b82f6' # Blue-500
+            if p == 'Medium': bg_color = '#8b5cf6' # Violet-500
+            if p == 'High': bg_color = '#f43f5e' # Rose-500
             
-            c_res = c_query.execute()
-            cal_events = c_res.data
+            creator = user_map.get(e['user_id'], 'Unknown')
+            if e['user_id'] == user_id: creator = 'You'
             
-            # Fetch Creator Names Map
-            uids = set(e['user_id'] for e in cal_events)
-            user_map = {}
-            if uids:
-                try:
-                    u_res = admin_client.table('users').select('id, full_name, email').in_('id', list(uids)).execute()
-                    for u in u_res.data:
-                        user_map[u['id']] = u.get('full_name') or u.get('email')
-                except Exception as ue:
-                    print(f"User Fetch Error: {ue}")
-
-            for e in cal_events:
-                # Color Logic for Events
-                # Normal: Blue (#3b82f6), Medium: Purple (#8b5cf6), High: Rose (#f43f5e)
-                p = e.get('priority', 'Normal')
-                bg_color = '#3b82f6' # Blue-500
-                if p == 'Medium': bg_color = '#8b5cf6' # Violet-500
-                if p == 'High': bg_color = '#f43f5e' # Rose-500
-                
-                creator = user_map.get(e['user_id'], 'Unknown')
-                if e['user_id'] == user_id: creator = 'You'
-                
-                can_edit = (e['user_id'] == user_id) or (role == 'Admin')
-
-                events.append({
-                    'id': f"event-{e['id']}",
-                    'title': e['title'],
-                    'start': e['start_time'],
-                    'end': e['end_time'],
-                    'backgroundColor': bg_color,
-                    'borderColor': bg_color,
-                    'extendedProps': {
-                        'type': 'event',
-                        'priority': p,
-                        'description': e.get('description'),
-                        'reminders': e.get('reminders'),
-                        'original_id': e['id'],
-                        'creator_name': creator,
-                        'can_edit': can_edit
-                    }
-                })
-
-        except Exception as db_e:
-            # Table might not exist yet
-            pass
+            can_edit = (e['user_id'] == user_id) or (role == 'Admin')
+
+            events.append({
+                'id': f"event-{e['id']}",
+                'title': e['title'],
+                'start': e['start_time'],
+                'end': e['end_time'],
+                'backgroundColor': bg_color,
+                'borderColor': bg_color,
+                'extendedProps': {
+                    'type': 'event',
+                    'priority': p,
+                    'description': e.get('description'),
+                    'reminders': e.get('reminders'),
+                    'original_id': e['id'],
+                    'creator_name': creator,
+                    'can_edit': can_edit
+                }
+            })
 
         return jsonify(events)
     except Exception as e:
@@ -1276,6 +1693,349 @@ def delete_calendar_event(event_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+# --- SYNC ---
+# DB table -> key in the /api/sync payload (requires setup_sync.sql)
+SYNC_TABLES = {
+    'tasks': 'tasks',
+    'projects': 'projects',
+    'users': 'members',
+    'project_members': 'project_members',
+    'comments': 'comments',
+    'calendar_events': 'events',
+}
+# Re-read a few seconds before the token so rows committed slightly out of order are not missed.
+# Clients upsert by id, so the overlap is harmless.
+SYNC_OVERLAP_SECONDS = 5
+# Tombstones older than this may be pruned; older tokens get a full snapshot instead.
+SYNC_TOMBSTONE_RETENTION_DAYS = 30
+
+def parse_sync_token(token):
+    from datetime import datetime, timezone
+    try:
+        ts = datetime.fromisoformat(token.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts
+
+def load_sync_tombstones(admin, since_iso, user_id, is_admin):
+    """
+    deleted_records since 'since_iso' that concern this user: real deletes and full-resync
+    markers (user_id NULL) for everyone, scope exits (user_id set) for that member only.
+    Admins see every row, so scope exits never apply to them.
+    """
+    query = admin.table('deleted_records').select('table_name, record_id, user_id').gt('deleted_at', since_iso)
+    if is_admin:
+        query = query.is_('user_id', 'null')
+    else:
+        query = query.or_(f"user_id.is.null,user_id.eq.{user_id}")
+    try:
+        return query.execute().data
+    except Exception as e:
+        # deleted_records.user_id missing (setup_sync.sql not re-run): plain deletes only
+        log.warning("Sync tombstones without user_id column: %s", e)
+        return admin.table('deleted_records').select('table_name, record_id').gt('deleted_at', since_iso).execute().data
+
+def merge_sync_rows(rows, extra):
+    """rows + the rows of 'extra' whose id isn't already there."""
+    seen = {str(row.get('id')) for row in rows}
+    return rows + [row for row in extra if str(row.get('id')) not in seen]
+
+@api_bp.route('/sync', methods=['GET'])
+def sync_changes():
+    """
+    Delta sync for the mobile app.
+    - GET /api/sync            -> full snapshot + token
+    - GET /api/sync?since=TOK  -> rows created/updated since TOK + tombstones for deletes
+    Scoping matches /api/tasks, /api/projects, /api/team and /api/calendar/events.
+    Rows that leave the user's scope (reassigned task, removed membership) come back as
+    tombstones too; a role change anywhere answers with a full snapshot ("full": true).
+    Rows that enter it are sent whole even if they didn't change: a new membership or
+    ownership brings the project and all its memberships, a newly assigned task its comments.
+    """
+    user_id = get_current_user_id()
+    if not user_id: return jsonify({"error": "Unauthorized"}), 401
+
+    from datetime import datetime, timedelta, timezone
+    now = datetime.now(timezone.utc)
+
+    since_param = request.args.get('since')
+    since = parse_sync_token(since_param) if since_param else None
+    if since_param and since is None:
+        return jsonify({"error": "Invalid sync token"}), 400
+
+    full = since is None or since < now - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS)
+    since_iso = None if full else (since - timedelta(seconds=SYNC_OVERLAP_SECONDS)).isoformat()
+
+    def changed(query):
+        if since_iso:
+            query = query.gt('updated_at', since_iso)
+        return query.execute().data
+
+    admin = get_supabase_admin()
+    is_admin = get_user_role(user_id) == 'Admin'
+    changes = {key: [] for key in SYNC_TABLES.values()}
+
+    try:
+        # 0. Tombstones first: a role change ('*') turns this into a full snapshot
+        tombstones = load_sync_tombstones(admin, since_iso, user_id, is_admin) if since_iso else []
+        if any(d['table_name'] == '*' for d in tombstones):
+            full, since_iso, tombstones = True, None, []
+
+        # 1. Tasks (Non-Admins: assigned tasks only)
+        t_query = admin.table('tasks').select('*, project:projects(title), assignee:assigned_to(full_name, avatar_url)')
+        if not is_admin:
+            t_query = t_query.eq('assigned_to', user_id)
+        changes['tasks'] = changed(t_query)
+
+        # 2. Projects + Memberships (Non-Admins: owned OR member of)
+        if is_admin:
+            changes['projects'] = changed(admin.table('projects').select('*'))
+            changes['project_members'] = changed(admin.table('project_members').select('*'))
+        else:
+            memberships = admin.table('project_members').select('project_id').eq('user_id', user_id).execute()
+            member_pids = [str(m['project_id']) for m in memberships.data]
+            or_filter = f"owner_id.eq.{user_id}"
+            if member_pids:
+                or_filter += f",id.in.({','.join(member_pids)})"
+
+            visible = admin.table('projects').select('id').or_(or_filter).execute()
+            visible_pids = [p['id'] for p in visible.data]
+            if visible_pids:
+                changes['projects'] = changed(admin.table('projects').select('*').in_('id', visible_pids))
+                changes['project_members'] = changed(admin.table('project_members').select('*').in_('project_id', visible_pids))
+
+            # 2b. Scope entries: the project row and the other memberships kept their old
+            # updated_at, so a delta alone would leave them out
+            if since_iso:
+                entered = {str(m['project_id']) for m in changes['project_members'] if str(m.get('user_id')) == user_id}
+                entered |= {str(p['id']) for p in changes['projects'] if str(p.get('owner_id')) == user_id}
+                if entered:
+                    entered = list(entered)
+                    projects_res, members_res = run_concurrently(
+                        lambda: admin.table('projects').select('*').in_('id', entered).execute().data,
+                        lambda: admin.table('project_members').select('*').in_('project_id', entered).execute().data,
+                    )
+                    changes['projects'] = merge_sync_rows(changes['projects'], projects_res)
+                    changes['project_members'] = merge_sync_rows(changes['project_members'], members_res)
+
+        # 3. Members (Team list is visible to everyone)
+        changes['members'] = changed(admin.table('users').select('*'))
+
+        # 4. Comments (Non-Admins: only on their visible tasks)
+        if is_admin:
+            changes['comments'] = changed(admin.table('comments').select('*, user:user_id(full_name, avatar_url)'))
+        else:
+            own_tasks = admin.table('tasks').select('id').eq('assigned_to', user_id).execute()
+            task_ids = [t['id'] for t in own_tasks.data]
+            if task_ids:
+                changes['comments'] = changed(admin.table('comments').select('*, user:user_id(full_name, avatar_url)').in_('task_id', task_ids))
+            # A task in the delta may have just been assigned to this user: send its whole thread
+            delta_task_ids = [t['id'] for t in changes['tasks']]
+            if since_iso and delta_task_ids:
+                thread = admin.table('comments').select('*, user:user_id(full_name, avatar_url)').in_('task_id', delta_task_ids).execute().data
+                changes['comments'] = merge_sync_rows(changes['comments'], thread)
+
+        # 5. Calendar Events (Admins: all, Members: own + admin events)
+        try:
+            e_query = admin.table('calendar_events').select('*')
+            if not is_admin:
+                a_res = admin.table('users').select('id').eq('role', 'Admin').execute()
+                admin_ids = [a['id'] for a in a_res.data]
+                filter_str = f"user_id.eq.{user_id}"
+                if admin_ids:
+                    filter_str += f",user_id.in.({','.join(admin_ids)})"
+                e_query = e_query.or_(filter_str)
+            changes['events'] = changed(e_query)
+        except Exception as ee:
+            # Table might not exist yet
+            log.warning("Sync Events Error: %s", ee)
+
+        # 6. Tombstones (ids only). A row that left the scope and came back within the
+        # window is in 'changes' again, so its tombstone is dropped.
+        deleted = {key: [] for key in SYNC_TABLES.values()}
+        present = {key: {str(row.get('id')) for row in rows} for key, rows in changes.items()}
+        for d in tombstones:
+            key = SYNC_TABLES.get(d['table_name'])
+            if key and d['record_id'] not in present[key] and d['record_id'] not in deleted[key]:
+                deleted[key].append(d['record_id'])
+
+        return jsonify({
+            "token": now.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),  # URL-safe (no '+')
+            "full": full,
+            "changes": changes,
+            "deleted": deleted
+        })
+    except Exception as e:
+        log.error("Sync Error: %s", e)
+        return jsonify({"error": str(e)}), 400
+
+# --- BOOTSTRAP ---
+# One request per page: authenticate + resolve role once, then run the page's queries concurrently.
+
+@api_bp.route('/bootstrap/tasks', methods=['GET'])
+@conditional_get
+def bootstrap_tasks():
+    """Tasks page: /api/tasks + /api/projects + /api/team in one response."""
+    user_id = get_current_user_id()
+    if not user_id: return jsonify({"error": "Unauthorized"}), 401
+    role = get_user_role(user_id)
+
+    try:
+        tasks, projects, team = run_concurrently(
+            lambda: load_all_tasks(user_id, role),
+            lambda: load_projects(user_id, role),
+            load_team
+        )
+        return jsonify({"role": role, "tasks": tasks, "projects": projects, "team": team})
+    except Exception as e:
+        log.error("Bootstrap Tasks Error: %s", e)
+        return jsonify({"error": str(e)}), 400
+
+@api_bp.route('/bootstrap/project/<project_id>', methods=['GET'])
+@conditional_get
+def bootstrap_project(project_id):
+    """Project details page: /api/projects/<id> + /api/projects/<id>/tasks + /api/team."""
+    user_id = get_current_user_id()
+    if not user_id: return jsonify({"error": "Unauthorized"}), 401
+    role = get_user_role(user_id)
+
+    def project_or_none():
+        try:
+            return load_project(project_id)
+        except Exception:
+            return None
+
+    try:
+        project, tasks, team = run_concurrently(
+            project_or_none,
+            lambda: load_project_tasks(project_id, user_id, role),
+            load_team
+        )
+        if project is None:
+            return jsonify({"error": "Project not found"}), 404
+        return jsonify({"role": role, "project": project, "tasks": tasks, "team": team})
+    except Exception as e:
+        log.error("Bootstrap Project Error: %s", e)
+        return jsonify({"error": str(e)}), 400
+
+@api_bp.route('/bootstrap/reports', methods=['GET'])
+@conditional_get
+def bootstrap_reports():
+    """Reports page: /api/stats + /api/team + /api/admin/attendance-history (Admins only)."""
+    user_id = get_current_user_id()
+    if not user_id: return jsonify({"error": "Unauthorized"}), 401
+    role = get_user_role(user_id)
+    target_user_id = request.args.get('user_id')
+
+    calls = [lambda: load_stats(user_id, role), load_team]
+    if role == 'Admin':
+        calls.append(lambda: load_admin_attendance_history(target_user_id))
+
+    try:
+        results = run_concurrently(*calls)
+        return jsonify({
+            "role": role,
+            "stats": results[0],
+            "team": results[1],
+            "attendance": results[2] if role == 'Admin' else None
+        })
+    except Exception as e:
+        log.error("Bootstrap Reports Error: %s", e)
+        return jsonify({"error": str(e)}), 400
+
+# --- BATCH ---
+BATCH_MAX_REQUESTS = 25
+# Separate from utils.query_pool: batched views may themselves fan out onto that pool
+batch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='batch')
+
+def dispatch_batch_item(app, item, user_id, headers, base_url):
+    """Runs one /api/batch sub-request in-process against the api blueprint."""
+    method = str(item.get('method', 'GET')).upper()
+    path = item.get('path') or ''
+    result = {"id": item.get('id'), "status": 400, "body": None}
+
+    if not path.startswith('/api/'):
+        result['body'] = {"error": "Path must start with /api/"}
+        return result
+
+    builder = EnvironBuilder(path=path, method=method, json=item.get('body'), headers=headers, base_url=base_url)
+    environ = builder.get_environ()
+    environ[BATCH_USER_ENVIRON_KEY] = user_id
+
+    # Skips before/after_request hooks (logging, session check, CORS) - they already ran for the batch itself
+    with app.request_context(environ):
+        if request.routing_exception is not None:
+            result['status'] = getattr(request.routing_exception, 'code', 404)
+            result['body'] = {"error": request.routing_exception.description}
+            return result
+        if not request.endpoint.startswith('api.') or request.endpoint == 'api.batch_requests':
+            result['body'] = {"error": "Endpoint not allowed in batch"}
+            return result
+        try:
+            rv = app.view_functions[request.endpoint](**request.view_args)
+            response = app.make_response(rv)
+        except Exception as e:
+            log.warning("Batch Item Error (%s %s): %s", method, path, e)
+            result['status'] = 500
+            result['body'] = {"error": str(e)}
+            return result
+
+    result['status'] = response.status_code
+    if response.is_json:
+        result['body'] = response.get_json()
+    elif not response.is_streamed:
+        result['body'] = response.get_data(as_text=True)
+    return result
+
+@api_bp.route('/batch', methods=['POST'])
+def batch_requests():
+    """
+    Multiplex several API calls into one round trip.
+    Body: {"requests": [{"id": "1", "method": "POST", "path": "/api/notifications/5/read", "body": {...}}, ...]}
+    - Auth is resolved once and shared by every sub-request.
+    - Consecutive GETs run concurrently; writes run one at a time, in order.
+    Returns: {"responses": [{"id", "status", "body"}, ...]} in request order.
+    """
+    user_id = get_current_user_id()
+    if not user_id: return jsonify({"error": "Unauthorized"}), 401
+
+    items = (request.json or {}).get('requests')
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "'requests' must be a non-empty list"}), 400
+    if len(items) > BATCH_MAX_REQUESTS:
+        return jsonify({"error": f"Too many requests in batch (max {BATCH_MAX_REQUESTS})"}), 400
+    if not all(isinstance(i, dict) for i in items):
+        return jsonify({"error": "Each request must be an object"}), 400
+
+    app = current_app._get_current_object()
+    headers = {k: v for k, v in request.headers.items() if k in ('Authorization', 'Cookie', 'Origin')}
+    base_url = request.host_url
+
+    def run(item):
+        return dispatch_batch_item(app, item, user_id, headers, base_url)
+
+    responses = [None] * len(items)
+    pending_reads = []
+
+    def flush_reads():
+        futures = [(idx, batch_pool.submit(run, items[idx])) for idx in pending_reads]
+        for idx, f in futures:
+            responses[idx] = f.result()
+        pending_reads.clear()
+
+    for idx, item in enumerate(items):
+        if str(item.get('method', 'GET')).upper() == 'GET':
+            pending_reads.append(idx)
+        else:
+            # Writes act as barriers so later reads observe them
+            flush_reads()
+            responses[idx] = run(item)
+    flush_reads()
+
+    return jsonify({"responses": responses})
+
 # --- EXPORT ---
 
 @api_bp.route('/export/csv', methods=['GET'])
@@ -1363,47 +2123,75 @@ def chat_ai():
     if not msg:
         return jsonify({"response": "Please enter a message."})
 
-    if not Config.GEMINI_API_KEY:
+    if not assistant.is_configured():
         return jsonify({"response": "AI is not configured."})
 
-    # ---- Context ----
     try:
-        p = supabase.table("projects").select("id", count="exact").execute()
-        t = supabase.table("tasks").select("id", count="exact").execute()
-        context = f"Projects: {p.count}, Tasks: {t.count}"
+        # Context snapshot, model handle and repeated answers are cached in assistant.py;
+        # relevant tasks/projects come from the in-process search index (no DB round trips)
+        text, cached = assistant.answer(msg, user_id=get_current_user_id())
+        return jsonify({"response": text, "cached": cached})
+
+    except assistant.AssistantBusy as e:
+        return jsonify({"response": str(e)}), 503, {"Retry-After": "5"}
+    except assistant.AssistantUnavailable as e:
+        return jsonify({"response": str(e)}), 503, {"Retry-After": str(e.retry_after or 30)}
     except Exception as e:
-        print("Context error:", e)
-        context = "Workspace data unavailable"
-
-    try:
-        # ✅ Use a valid model name
-        model = genai.GenerativeModel("gemini-1.5-flash")
-
-        prompt = f'''
-You are the AI assistant for Antigravity PM.
-
-Context:
-{context}
-
-User:
-{msg}
-
-Rules:
-- Be friendly and concise (max 60 words)
-- Stay related to projects/tasks
-- Guide user to UI for actions
-'''
+        log.error("Gemini error: %r", e)
+        return jsonify({"response": "I'm having trouble thinking right now. Please try again later."}), 500
 
-        response = model.generate_content(prompt)
+@api_bp.route("/chat/stream", methods=["GET", "POST"])
+def chat_ai_stream():
+    """
+    Streaming variant of /api/chat (Server-Sent Events).
+    POST {"message": "..."} (fetch + ReadableStream) or GET ?message=... (EventSource).
+    Events: 'token' {"text"} ..., then 'done' {"cached"} or 'error' {"error"}.
+    """
+    user_id = get_current_user_id()
+    if not user_id: return jsonify({"error": "Unauthorized"}), 401
 
-        if not response or not getattr(response, "text", None):
-            raise Exception("Empty response from Gemini")
+    if request.method == 'POST':
+        msg = ((request.json or {}).get("message") or "").strip()
+    else:
+        msg = (request.args.get("message") or "").strip()
+    if not msg:
+        return jsonify({"error": "Please enter a message."}), 400
+    if not assistant.is_configured():
+        return jsonify({"error": "AI is not configured."}), 503
+    if not resilience.gemini.available():
+        e = assistant.AssistantUnavailable(resilience.gemini.breaker.retry_after())
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after or 30)}
+
+    # One of the assistant's slots, held until the model thread is done with this request
+    # (which can be after the response closed, see assistant.Slot)
+    try:
+        slot = assistant.acquire_slot()
+    except assistant.AssistantBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
 
-        return jsonify({"response": response.text})
+    events = assistant.stream_answer(msg, user_id=user_id, slot=slot)
 
-    except Exception as e:
-        print("Gemini error:", repr(e))
-        return jsonify({"response": "I'm having trouble thinking right now. Please try again later."}), 500
+    def generate():
+        try:
+            for kind, payload in events:
+                if kind == 'ping':
+                    yield ": ping\n\n"
+                elif kind == 'token':
+                    yield f"event: token\ndata: {json.dumps({'text': payload})}\n\n"
+                elif kind == 'error':
+                    yield f"event: error\ndata: {json.dumps({'error': payload})}\n\n"
+                else:
+                    yield f"event: {kind}\ndata: {json.dumps(payload)}\n\n"
+        finally:
+            # Runs on completion and when the server closes the response after a disconnect
+            events.close()
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # don't let proxies buffer the stream
+    # Covers a response closed before the generator ever ran
+    response.call_on_close(slot.abandon)
+    return response
 
 # ---------------- ATTENDANCE ----------------
 
@@ -1423,6 +2211,7 @@ def get_attendance_today():
         return jsonify(None) # No record found
 
 @api_bp.route("/attendance/punch", methods=["POST"])
+@query_budget(2)
 def punch_attendance():
     user_id = get_current_user_id()
     if not user_id:
@@ -1542,41 +2331,38 @@ def get_admin_attendance_history():
     target_user_id = request.args.get('user_id')
 
     try:
-        # Build Query
-        query = supabase.table("attendance").select("*").order("date", desc=True)
-        
-        if target_user_id:
-            query = query.eq("user_id", target_user_id)
-            
-        res = query.limit(100).execute()
-        attendance_data = res.data
-        
-        if not attendance_data:
-            return jsonify([])
-
-        # Get unique user IDs involved
-        user_ids = list(set([r['user_id'] for r in attendance_data]))
-        
-        # Fetch Users details
-        if user_ids:
-            users_res = supabase.table("users").select("id, full_name, email").in_("id", user_ids).execute()
-            users_map = {u['id']: u for u in users_res.data}
-            
-            # Merge
-            final_data = []
-            for record in attendance_data:
-                u = users_map.get(record['user_id'], {})
-                record['user_name'] = u.get('full_name') or u.get('email') or 'Unknown'
-                final_data.append(record)
-            
-            return jsonify(final_data)
-        
-        return jsonify(attendance_data)
-
+        return jsonify(load_admin_attendance_history(target_user_id))
     except Exception as e:
         print(f"Admin History Error: {e}")
         return jsonify({"error": str(e)}), 400
 
+def load_admin_attendance_history(target_user_id=None):
+    # Build Query
+    query = supabase.table("attendance").select("*").order("date", desc=True)
+    
+    if target_user_id:
+        query = query.eq("user_id", target_user_id)
+        
+    res = query.limit(100).execute()
+    attendance_data = res.data
+    
+    if not attendance_data:
+        return []
+
+    # Get unique user IDs involved
+    user_ids = list(set([r['user_id'] for r in attendance_data]))
+    
+    # Fetch Users details
+    users_res = supabase.table("users").select("id, full_name, email").in_("id", user_ids).execute()
+    users_map = {u['id']: u for u in users_res.data}
+    
+    # Merge
+    for record in attendance_data:
+        u = users_map.get(record['user_id'], {})
+        record['user_name'] = u.get('full_name') or u.get('email') or 'Unknown'
+    
+    return attendance_data
+
 @api_bp.route("/admin/users", methods=["GET"])
 def get_all_users_admin():
     # Role Check
@@ -1596,6 +2382,97 @@ def get_all_users_admin():
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+@api_bp.route("/admin/storage/reconcile", methods=["POST"])
+def reconcile_storage():
+    """
+    Diffs the attachments bucket against the DB and removes unreferenced objects.
+    Body: {"dry_run": true, "grace_hours": 24} (dry run by default: report only)
+    """
+    user_id = get_current_user_id()
+    if not user_id: return jsonify({"error": "Unauthorized"}), 401
+    if get_user_role(user_id) != 'Admin':
+        return jsonify({"error": "Unauthorized"}), 403
+
+    data = request.json or {}
+    try:
+        report = reconcile_bucket(
+            dry_run=data.get('dry_run', True) is not False,
+            grace_hours=float(data.get('grace_hours', RECONCILE_GRACE_HOURS))
+        )
+        return jsonify(report)
+    except Exception as e:
+        log.error("Storage Reconcile Error: %s", e)
+        return jsonify({"error": str(e)}), 400
+
+# ---------------- DEPENDENCIES (circuit breakers) ----------------
+@api_bp.route("/admin/dependencies", methods=["GET"])
+def dependency_status():
+    """Breaker state, in-flight calls and counters for each external dependency (this worker)."""
+    user_id = get_current_user_id()
+    if not user_id: return jsonify({"error": "Unauthorized"}), 401
+    if get_user_role(user_id) != 'Admin':
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify(resilience.snapshot())
+
+@api_bp.route("/admin/dependencies/faults", methods=["POST"])
+def inject_dependency_fault():
+    """
+    Development only (debug mode or FAULT_INJECTION_ENABLED=1).
+    Body: {"name": "nominatim", "error": true, "latency": 8} or {"clear": true}
+    """
+    if not (current_app.debug or os.environ.get('FAULT_INJECTION_ENABLED') == '1'):
+        return jsonify({"error": "Fault injection is disabled"}), 404
+    user_id = get_current_user_id()
+    if not user_id: return jsonify({"error": "Unauthorized"}), 401
+    if get_user_role(user_id) != 'Admin':
+        return jsonify({"error": "Unauthorized"}), 403
+
+    data = request.json or {}
+    try:
+        if data.get('clear'):
+            resilience.clear_faults()
+            resilience.reset()
+        else:
+            resilience.inject_fault(data['name'], error=data.get('error'), latency=float(data.get('latency') or 0))
+        return jsonify(resilience.snapshot())
+    except KeyError:
+        return jsonify({"error": f"Unknown dependency (one of: {', '.join(resilience.DEPENDENCIES)})"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+# ---------------- AVATARS ----------------
+@api_bp.route('/avatars/<user_id>', methods=['GET'])
+def get_avatar_image(user_id):
+    """
+    Resized member avatar (WebP). ?s=<px> picks the size (snapped to avatars.AVATAR_SIZES).
+    Public like the third-party avatar URLs it replaces, since <img> tags can't send Bearer tokens.
+    """
+    try:
+        uuid.UUID(user_id)
+    except ValueError:
+        return jsonify({"error": "User not found"}), 404
+
+    size = avatars.snap_size(request.args.get('s', avatars.DEFAULT_SIZE))
+    requested = request.args.get('v')
+    try:
+        data, etag, version = avatars.get_avatar(user_id, size, requested)
+    except Exception as e:
+        log.warning("Avatar Error: %s", e)
+        return jsonify({"error": str(e)}), 400
+    if data is None:
+        return jsonify({"error": "User not found"}), 404
+
+    response = Response(data, mimetype='image/webp')
+    response.set_etag(etag)
+    # Cached for good only when the bytes are the version the URL names
+    if not requested:
+        response.headers['Cache-Control'] = PUBLIC_DAY
+    elif requested == version:
+        response.headers['Cache-Control'] = PUBLIC_IMMUTABLE
+    else:
+        response.headers['Cache-Control'] = PUBLIC_REVALIDATE
+    return response.make_conditional(request)
+
 # ---------------- USER PROFILE ----------------
 @api_bp.route("/user/profile", methods=["POST"])
 def update_profile():
@@ -1613,6 +2490,9 @@ def update_profile():
         
         # 1. Update public.users table using admin client to bypass RLS
         admin_client.table("users").update({"full_name": full_name}).eq("id", user_id).execute()
+        # Initials avatars are rendered from the name
+        avatars.invalidate(user_id)
+        search_index.upsert_users([{"id": user_id, "full_name": full_name}])
         
         # 2. Update Flask Session metadata
         if 'user' in session:
@@ -1620,8 +2500,6 @@ def update_profile():
             # Update user_metadata in session
             if 'user_metadata' not in user: user['user_metadata'] = {}
             user['user_metadata']['full_name'] = full_name
-            # Also update direct full_name if exists
-            user['full_name'] = full_name
             session['user'] = user
             session.modified = True
             
@@ -1716,12 +2594,10 @@ def invite_member():
         return jsonify({"error": f"Database Error: {db_e}"}), 500
 
     # 4. Send Email via SMTP
-    import smtplib
     from email.mime.text import MIMEText
     from email.mime.multipart import MIMEMultipart
+    from scheduler import smtp_send
 
-    smtp_server = "smtp.gmail.com"
-    smtp_port = 587
     sender_email = Config.SMTP_EMAIL
     sender_password = Config.SMTP_PASSWORD
 
@@ -1766,15 +2642,14 @@ def invite_member():
         """
         msg.attach(MIMEText(body, "html"))
 
-        # Send
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        server.sendmail(sender_email, email, msg.as_string())
-        server.quit()
+        # Send (fails fast while SMTP is down; same fallback as an unconfigured SMTP)
+        smtp_send(email, msg)
         
         return jsonify({"message": f"Invitation and credentials sent to {email}"})
 
+    except resilience.DependencyUnavailable as e:
+        log.warning("SMTP Error: %s", e)
+        return jsonify({"message": f"User created/restored! Password: {temp_password} (email service unavailable)"}), 200
     except Exception as e:
-        print(f"SMTP Error: {e}")
+        log.error("SMTP Error: %s", e)
         return jsonify({"error": f"Failed to send email: {str(e)}"}), 500
@@ -1,7 +1,8 @@
 from flask import Blueprint, redirect, url_for, session, request, render_template, jsonify
 from utils import supabase, get_supabase_admin
-import requests
 from config import Config
+import avatars
+import session_store
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -53,12 +54,12 @@ def set_session():
                  return jsonify({"error": "Configuration Error"}), 500
             
             # 1. Check by ID first
-            existing = admin_client.table('users').select('id, role, full_name, email').eq('id', user_id).execute()
+            existing = admin_client.table('users').select('id, role, full_name, email, avatar_url').eq('id', user_id).execute()
             
             # 2. If not found by ID, check by Email (First time login after invite)
             if not existing.data and email:
                 print(f"Auth: Checking for email invite for {email}")
-                existing = admin_client.table('users').select('id, role, full_name, email').eq('email', email).execute()
+                existing = admin_client.table('users').select('id, role, full_name, email, avatar_url').eq('email', email).execute()
                 
                 if existing.data:
                     # Found by email! Link this ID to the record now.
@@ -91,11 +92,15 @@ def set_session():
 
             # Update details (Avatar/Email) using admin client
             admin_client.table('users').update(update_payload).eq('id', user_id).execute()
+            if (record.get('avatar_url') or '') != (avatar_url or ''):
+                # New profile picture -> re-render the cached /api/avatars sizes
+                avatars.invalidate(user_id)
 
-            # Set Session
+            # Set Session (only the fields the app reads; the cookie itself is just an id)
             user_data['role'] = db_role
-            session['user'] = user_data
-            session['access_token'] = access_token
+            session.clear()
+            session_store.regenerate(session)
+            session['user'] = session_store.compact_user(user_data)
             
             return jsonify({"status": "success"}), 200
 
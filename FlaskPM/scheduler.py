@@ -2,16 +2,38 @@ import time
 import threading
 import smtplib
 import os
+import tempfile
 from datetime import datetime, timedelta, timezone
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from config import Config
 from utils import supabase, get_supabase_admin
+import resilience
+from query_budget import trace as query_trace
+from app_logging import get_logger, sample, setup as setup_logging
+
+log = get_logger('scheduler')
+
+SMTP_HOST = "smtp.gmail.com"
+SMTP_PORT = 587
+
+def smtp_send(to_email, msg):
+    """
+    Delivers a prepared MIME message through the 'smtp' circuit breaker / bulkhead.
+    Raises on failure (resilience.DependencyUnavailable when SMTP is known to be down).
+    """
+    def deliver():
+        # Gmail Settings (Standard for this project context)
+        with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=resilience.smtp.timeout) as server:
+            server.starttls()
+            server.login(Config.SMTP_EMAIL, Config.SMTP_PASSWORD)
+            server.sendmail(Config.SMTP_EMAIL, to_email, msg.as_string())
+    resilience.smtp.call(deliver)
 
 def send_email(to_email, subject, html_body):
     """Sends an email using the SMTP configuration."""
     if not Config.SMTP_EMAIL or not Config.SMTP_PASSWORD:
-        print("SMTP not configured. Skipping email.")
+        log.info("SMTP not configured. Skipping email.")
         return False
     
     try:
@@ -21,21 +43,16 @@ def send_email(to_email, subject, html_body):
         msg['Subject'] = subject
         msg.attach(MIMEText(html_body, "html"))
 
-        # Gmail Settings (Standard for this project context)
-        server = smtplib.SMTP("smtp.gmail.com", 587)
-        server.starttls()
-        server.login(Config.SMTP_EMAIL, Config.SMTP_PASSWORD)
-        server.sendmail(Config.SMTP_EMAIL, to_email, msg.as_string())
-        server.quit()
-        print(f"Email sent to {to_email}: {subject}")
+        smtp_send(to_email, msg)
+        log.info("Email sent", extra={'to': to_email, 'subject': subject})
         return True
     except Exception as e:
-        print(f"Failed to send email to {to_email}: {e}")
+        log.error("Failed to send email: %s", e, extra={'to': to_email})
         return False
 
 def check_task_deadlines():
     """Checks for upcoming and overdue deadlines."""
-    print("Checking task deadlines...")
+    log.debug("Checking task deadlines")
     
     try:
         # We need the service role to read all tasks/users without RLS issues in background
@@ -50,7 +67,7 @@ def check_task_deadlines():
              res = admin_client.table("tasks").select("*").neq("status", "Completed").not_.is_("deadline", "null").execute()
              tasks = res.data
         except Exception as e:
-            print(f"Error fetching tasks: {e}")
+            log.error("Error fetching tasks: %s", e)
             return
 
         if not tasks:
@@ -74,7 +91,8 @@ def check_task_deadlines():
                 time_diff = deadline - current_time
                 hours_remaining = time_diff.total_seconds() / 3600
                 
-                print(f"[Scheduler] Task {task['id']} | Due: {deadline} | Now: {current_time} | Hours Left: {hours_remaining:.2f}")
+                # One line per open task per tick: sampled
+                log.debug("Task deadline check", extra=sample(0.01, task_id=task['id'], hours_left=round(hours_remaining, 2)))
 
                 # --- 12 Hour Warning ---
                 # Criteria: Between 0 and 12 hours remaining, and not yet reminded
@@ -95,7 +113,7 @@ def check_task_deadlines():
                         
                         # Mark as reminded
                         admin_client.table("tasks").update({"reminder_sent": True}).eq("id", task['id']).execute()
-                        print(f"Sent 12h warning for task {task['id']}")
+                        log.info("Sent 12h warning", extra={'task_id': task['id']})
 
                 # --- Overdue Email ---
                 # Criteria: Deadline passed (negative time_diff) and not yet notified
@@ -122,18 +140,18 @@ def check_task_deadlines():
                             if send_email(user_data['email'], subject, body):
                                 # Mark as notified
                                 admin_client.table("tasks").update({"overdue_notified": True}).eq("id", task['id']).execute()
-                                print(f"Sent overdue email for task {task['id']}")
+                                log.info("Sent overdue email", extra={'task_id': task['id']})
 
             except Exception as inner_e:
-                print(f"Error processing task {task.get('id')}: {inner_e}")
+                log.error("Error processing task: %s", inner_e, extra={'task_id': task.get('id')})
                 continue
 
     except Exception as e:
-        print(f"Scheduler Error: {e}")
+        log.exception("Scheduler Error: %s", e)
 
 def check_calendar_reminders():
     """Checks for calendar event reminders."""
-    print("Checking calendar reminders...")
+    log.debug("Checking calendar reminders")
     try:
         admin_client = get_supabase_admin() or supabase
         
@@ -186,7 +204,7 @@ def check_calendar_reminders():
                          if not any(u['id'] == user_id for u in target_users):
                              target_users.append({'id': user_id})
                 except Exception as role_e:
-                    print(f"Role/Audience Check Error: {role_e}")
+                    log.warning("Role/Audience Check Error: %s", role_e, extra={'event_id': event.get('id')})
                     target_users = [{'id': user_id}] # Fallback to just creator
 
                 # Reminder Logic
@@ -208,7 +226,7 @@ def check_calendar_reminders():
                      
                      reminders.remove('same_day')
                      sent_update = True
-                     print(f"Sent same_day reminder for {event['title']} to {len(notifs)} users")
+                     log.info("Sent same_day reminder", extra={'event_id': event['id'], 'recipients': len(notifs)})
 
                 # Check "One Day Before"
                 elif 'one_day_before' in reminders and 20 < hours_left <= 28:
@@ -226,27 +244,94 @@ def check_calendar_reminders():
                      
                      reminders.remove('one_day_before')
                      sent_update = True
-                     print(f"Sent one_day_before reminder for {event['title']} to {len(notifs)} users")
+                     log.info("Sent one_day_before reminder", extra={'event_id': event['id'], 'recipients': len(notifs)})
                 
                 # Update DB if we sent something
                 if sent_update:
                      admin_client.table("calendar_events").update({"reminders": reminders}).eq("id", event['id']).execute()
 
             except Exception as e:
-                print(f"Event Process Error: {e}")
+                log.error("Event Process Error: %s", e, extra={'event_id': event.get('id')})
 
     except Exception as e:
-        print(f"Calendar Scheduler Error: {e}")
+        log.exception("Calendar Scheduler Error: %s", e)
+
+# Full bucket reconciliation is expensive (lists every object); run it rarely
+STORAGE_RECONCILE_INTERVAL = timedelta(hours=int(os.environ.get('STORAGE_RECONCILE_INTERVAL_HOURS', 24)))
+_last_reconcile = None
+
+def cleanup_attachment_storage():
+    """Drains the orphaned-object queue; periodically sweeps the whole bucket."""
+    global _last_reconcile
+    from attachment_cleanup import purge_storage_orphans, reconcile_bucket
+    try:
+        purge_storage_orphans()
+
+        now = datetime.now(timezone.utc)
+        if STORAGE_RECONCILE_INTERVAL and (_last_reconcile is None or now - _last_reconcile >= STORAGE_RECONCILE_INTERVAL):
+            _last_reconcile = now
+            reconcile_bucket(dry_run=False)
+    except Exception as e:
+        log.exception("Storage Cleanup Error: %s", e)
+
+_scheduler_started = False
 
 def start_scheduler():
+    global _scheduler_started
+    if _scheduler_started:
+        return
+    _scheduler_started = True
+    setup_logging()
+
     def run_job():
         while True:
-            check_task_deadlines()
-            check_calendar_reminders()
+            # Query tracing is a no-op unless QUERY_DEBUG is set (see query_budget.py)
+            for job in (check_task_deadlines, check_calendar_reminders, cleanup_attachment_storage):
+                with query_trace(f"scheduler.{job.__name__}"):
+                    job()
             # Sleep for 60 seconds (1 minute) for better responsiveness
             time.sleep(60)
 
     # Daemon thread to run in background
-    thread = threading.Thread(target=run_job, daemon=True)
+    thread = threading.Thread(target=run_job, daemon=True, name='scheduler')
     thread.start()
-    print("Scheduler started (60s interval).")
+    log.info("Scheduler started (60s interval).")
+
+# ---------------- SINGLE INSTANCE (gunicorn) ----------------
+
+# Every gunicorn worker imports this module; only the worker holding this lock runs the jobs
+SCHEDULER_LOCK_FILE = os.environ.get('SCHEDULER_LOCK_FILE') or os.path.join(tempfile.gettempdir(), 'digianchorz-scheduler.lock')
+LOCK_POLL_SECONDS = 15
+_lock_file = None  # kept open for the life of the process: closing it releases the lock
+
+def start_scheduler_singleton():
+    """
+    Starts the scheduler in one process per machine. Each worker polls a non-blocking flock on
+    SCHEDULER_LOCK_FILE; the holder runs the jobs, and when it exits (recycled, crashed) another
+    worker takes over within LOCK_POLL_SECONDS. Polling never blocks, so it is gevent-safe.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        # No flock (Windows): single-process deployments only
+        start_scheduler()
+        return
+
+    def wait_for_lock():
+        global _lock_file
+        lock_file = open(SCHEDULER_LOCK_FILE, 'a+')
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except OSError:
+                time.sleep(LOCK_POLL_SECONDS)
+        _lock_file = lock_file
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        log.info("Scheduler lock acquired", extra={'lock_file': SCHEDULER_LOCK_FILE})
+        start_scheduler()
+
+    threading.Thread(target=wait_for_lock, daemon=True, name='scheduler-lock').start()
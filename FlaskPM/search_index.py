@@ -0,0 +1,443 @@
+"""
+In-process BM25 index over tasks, projects and comments for the chat assistant.
+
+- Built once per worker in the background (a few keyset-paged queries), then kept current by the
+  mutation handlers (upsert_* / remove_* calls in api_routes) and by a periodic delta sync
+  (updated_at / deleted_records from setup_sync.sql) that picks up writes made by other workers.
+- Searches never touch the database: scoring, role scoping and snippet building all run on
+  in-memory structures (typically well under 10 ms).
+- Scoping mirrors the API: Admins see everything; other users see tasks assigned to them,
+  projects they own or are members of, and comments on tasks they can see.
+"""
+import os
+import re
+import time
+import math
+import heapq
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timezone, timedelta
+from app_logging import get_logger
+
+log = get_logger('search_index')
+
+INDEX_REFRESH_SECONDS = int(os.environ.get('SEARCH_INDEX_REFRESH', 60))
+# Delta windows overlap a little so writes committed during a sync aren't missed
+REFRESH_OVERLAP_SECONDS = 5
+SNIPPET_CHARS = 160
+
+K1 = 1.5
+B = 0.75
+
+STOPWORDS = {
+    'a', 'an', 'the', 'and', 'or', 'of', 'to', 'in', 'on', 'for', 'is', 'are', 'was', 'be', 'it',
+    'at', 'by', 'with', 'what', 'whats', 'which', 'who', 'how', 'my', 'me', 'i', 'we', 'our',
+    'do', 'does', 'any', 'all', 'there', 'this', 'that', 'from', 'as', 'can', 'you', 'show',
+    'list', 'tell', 'about', 'please', 'project', 'projects', 'task', 'tasks',
+}
+# Query words that ask for tasks past their deadline (deadlines move relative to "now",
+# so this is decided at query time rather than indexed)
+OVERDUE_WORDS = {'overdue', 'late', 'missed', 'behind', 'delayed'}
+OVERDUE_BOOST = 3.0
+
+TASK_FIELDS = 'id, title, description, status, priority, deadline, project_id, assigned_to, created_by'
+PROJECT_FIELDS = 'id, title, description, status, owner_id, start_date, end_date'
+COMMENT_FIELDS = 'id, task_id, user_id, content'
+MEMBER_FIELDS = 'id, project_id, user_id'
+USER_FIELDS = 'id, full_name, email, role'
+
+
+def tokenize(text):
+    tokens = []
+    for word in re.findall(r'[a-z0-9]+', (text or '').lower()):
+        if len(word) < 2 or word in STOPWORDS:
+            continue
+        # Cheap plural folding ("deadlines" -> "deadline")
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def parse_deadline(value):
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def is_overdue(task, now=None):
+    deadline = parse_deadline(task.get('deadline'))
+    return bool(deadline) and task.get('status') != 'Completed' and deadline < (now or datetime.now(timezone.utc))
+
+
+class SearchIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.synced_at = None
+        self._started = False
+        self._reset()
+
+    def _reset(self):
+        self.postings = defaultdict(dict)   # term -> {doc_key: tf}
+        self.doc_terms = {}                 # doc_key -> Counter
+        self.doc_len = {}
+        self.total_len = 0
+        self.tasks = {}
+        self.projects = {}
+        self.comments = {}
+        self.users = {}
+        self.members = defaultdict(set)     # project_id -> {user_id}
+        self.memberships = {}               # project_members.id -> (project_id, user_id)
+        self.by_assignee = defaultdict(set)  # user_id -> {task_id}
+        self.comments_by_task = defaultdict(set)
+        self.open_deadlines = {}            # task_id -> deadline, unfinished tasks only
+        self.ready = False
+
+    # ---------------- DOCUMENTS ----------------
+    def _set_doc(self, key, text):
+        self._drop_doc(key)
+        terms = Counter(tokenize(text))
+        if not terms:
+            return
+        self.doc_terms[key] = terms
+        self.doc_len[key] = sum(terms.values())
+        self.total_len += self.doc_len[key]
+        for term, tf in terms.items():
+            self.postings[term][key] = tf
+
+    def _drop_doc(self, key):
+        terms = self.doc_terms.pop(key, None)
+        if not terms:
+            return
+        self.total_len -= self.doc_len.pop(key)
+        for term in terms:
+            bucket = self.postings.get(term)
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del self.postings[term]
+
+    def _task_text(self, task):
+        project = self.projects.get(str(task.get('project_id')), {})
+        assignee = self.users.get(str(task.get('assigned_to')), {})
+        return ' '.join(str(v) for v in (
+            task.get('title'), task.get('title'),  # titles weigh double
+            task.get('description'), task.get('status'), task.get('priority'),
+            project.get('title'), assignee.get('full_name')
+        ) if v)
+
+    def _project_text(self, project):
+        return ' '.join(str(v) for v in (
+            project.get('title'), project.get('title'), project.get('description'), project.get('status')
+        ) if v)
+
+    def _comment_text(self, comment):
+        task = self.tasks.get(str(comment.get('task_id')), {})
+        return ' '.join(str(v) for v in (comment.get('content'), task.get('title')) if v)
+
+    # ---------------- INCREMENTAL UPDATES ----------------
+    def _unlink_task(self, tid):
+        task = self.tasks.get(tid)
+        if task:
+            self.by_assignee[str(task.get('assigned_to'))].discard(tid)
+        self.open_deadlines.pop(tid, None)
+
+    def upsert_tasks(self, rows):
+        with self.lock:
+            for row in rows or []:
+                tid = str(row['id'])
+                self._unlink_task(tid)
+                task = {**self.tasks.get(tid, {}), **row}
+                self.tasks[tid] = task
+                self.by_assignee[str(task.get('assigned_to'))].add(tid)
+                deadline = parse_deadline(task.get('deadline'))
+                if deadline and task.get('status') != 'Completed':
+                    self.open_deadlines[tid] = deadline
+                self._set_doc(('task', tid), self._task_text(task))
+
+    def remove_tasks(self, ids):
+        with self.lock:
+            for tid in {str(i) for i in ids}:
+                self._unlink_task(tid)
+                self.tasks.pop(tid, None)
+                self._drop_doc(('task', tid))
+                # Comments cascade with their task
+                self.remove_comments(list(self.comments_by_task.pop(tid, ())))
+
+    def upsert_projects(self, rows):
+        with self.lock:
+            for row in rows or []:
+                pid = str(row['id'])
+                old_title = self.projects.get(pid, {}).get('title')
+                project = {**self.projects.get(pid, {}), **row}
+                self.projects[pid] = project
+                self._set_doc(('project', pid), self._project_text(project))
+                if old_title is not None and old_title != project.get('title'):
+                    # Task documents embed the project title
+                    self.upsert_tasks([t for t in self.tasks.values() if str(t.get('project_id')) == pid])
+
+    def remove_projects(self, ids):
+        with self.lock:
+            ids = {str(i) for i in ids}
+            for pid in ids:
+                self.projects.pop(pid, None)
+                self.members.pop(pid, None)
+                self._drop_doc(('project', pid))
+            self.remove_tasks([t for t, row in self.tasks.items() if str(row.get('project_id')) in ids])
+
+    def add_members(self, project_id, user_ids):
+        with self.lock:
+            self.members[str(project_id)].update(str(u) for u in user_ids if u)
+
+    def upsert_memberships(self, rows):
+        with self.lock:
+            for m in rows:
+                self.memberships[str(m['id'])] = (str(m['project_id']), str(m['user_id']))
+                self.add_members(m['project_id'], [m['user_id']])
+
+    def remove_memberships(self, ids):
+        """Drops memberships by row id; returns False if any id was never seen by this index."""
+        known = True
+        with self.lock:
+            for mid in map(str, ids):
+                pair = self.memberships.pop(mid, None)
+                if pair is None:
+                    known = False
+                    continue
+                self.members.get(pair[0], set()).discard(pair[1])
+        return known
+
+    def replace_memberships(self, rows):
+        with self.lock:
+            self.members = defaultdict(set)
+            self.memberships = {}
+            self.upsert_memberships(rows)
+
+    def upsert_comments(self, rows):
+        with self.lock:
+            for row in rows or []:
+                cid = str(row['id'])
+                comment = {**self.comments.get(cid, {}), **row}
+                self.comments[cid] = comment
+                self.comments_by_task[str(comment.get('task_id'))].add(cid)
+                self._set_doc(('comment', cid), self._comment_text(comment))
+
+    def remove_comments(self, ids):
+        with self.lock:
+            for cid in ids:
+                comment = self.comments.pop(str(cid), None)
+                if comment:
+                    self.comments_by_task[str(comment.get('task_id'))].discard(str(cid))
+                self._drop_doc(('comment', str(cid)))
+
+    def upsert_users(self, rows):
+        with self.lock:
+            for row in rows or []:
+                uid = str(row['id'])
+                old_name = self.users.get(uid, {}).get('full_name')
+                self.users[uid] = {**self.users.get(uid, {}), **row}
+                if old_name is not None and old_name != self.users[uid].get('full_name'):
+                    self.upsert_tasks([self.tasks[t] for t in self.by_assignee.get(uid, ())])
+
+    def role_of(self, user_id, default='Team Member'):
+        return self.users.get(str(user_id), {}).get('role') or default
+
+    # ---------------- SCOPING ----------------
+    def visible_keys(self, user_id):
+        """Documents a non-admin can see (their tasks, comments on them, their projects)."""
+        tids = self.by_assignee.get(user_id, ())
+        keys = {('task', t) for t in tids}
+        for t in tids:
+            keys.update(('comment', c) for c in self.comments_by_task.get(t, ()))
+        for pid, project in self.projects.items():
+            if str(project.get('owner_id')) == user_id or user_id in self.members.get(pid, ()):
+                keys.add(('project', pid))
+        return keys
+
+    # ---------------- SEARCH ----------------
+    def search(self, query, user_id, role=None, k=5):
+        """Top-k (score, snippet) pairs visible to the user, best first."""
+        user_id = str(user_id)
+        words = set(re.findall(r'[a-z]+', (query or '').lower()))
+        terms = set(tokenize(query))
+        wants_overdue = bool(words & OVERDUE_WORDS)
+
+        with self.lock:
+            role = role or self.role_of(user_id)
+            visible = None if role == 'Admin' else self.visible_keys(user_id)
+            n_docs = len(self.doc_terms)
+            if not n_docs:
+                return []
+            avg_len = self.total_len / n_docs
+            doc_len = self.doc_len
+
+            scores = defaultdict(float)
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                if visible is None:
+                    matches = postings.items()
+                elif len(visible) < len(postings):
+                    matches = ((key, postings[key]) for key in visible if key in postings)
+                else:
+                    matches = ((key, tf) for key, tf in postings.items() if key in visible)
+                for key, tf in matches:
+                    scores[key] += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * doc_len[key] / avg_len))
+
+            now = datetime.now(timezone.utc)
+            if wants_overdue:
+                # Every overdue task is a candidate; ones that also match the text rank first
+                for tid, deadline in self.open_deadlines.items():
+                    key = ('task', tid)
+                    if deadline < now and (visible is None or key in visible):
+                        scores[key] += OVERDUE_BOOST
+
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [(round(score, 3), self.snippet(key, now)) for key, score in best]
+
+    def snippet(self, key, now=None):
+        kind, doc_id = key
+        if kind == 'task':
+            t = self.tasks[doc_id]
+            project = self.projects.get(str(t.get('project_id')), {}).get('title', 'No project')
+            assignee = self.users.get(str(t.get('assigned_to')), {}).get('full_name') or 'Unassigned'
+            flags = [t.get('status'), t.get('priority')]
+            if t.get('deadline'):
+                flags.append(f"due {str(t['deadline'])[:10]}")
+            if is_overdue(t, now):
+                flags.append('OVERDUE')
+            desc = (t.get('description') or '')[:SNIPPET_CHARS]
+            return f"Task \"{t.get('title')}\" in {project} ({', '.join(f for f in flags if f)}), assigned to {assignee}. {desc}".strip()
+        if kind == 'project':
+            p = self.projects[doc_id]
+            open_tasks = sum(1 for t in self.tasks.values() if str(t.get('project_id')) == doc_id and t.get('status') != 'Completed')
+            desc = (p.get('description') or '')[:SNIPPET_CHARS]
+            return f"Project \"{p.get('title')}\" ({p.get('status')}, {open_tasks} open tasks). {desc}".strip()
+        c = self.comments[doc_id]
+        task = self.tasks.get(str(c.get('task_id')), {})
+        author = self.users.get(str(c.get('user_id')), {}).get('full_name') or 'Someone'
+        return f"Comment by {author} on \"{task.get('title')}\": {(c.get('content') or '')[:SNIPPET_CHARS]}"
+
+    # ---------------- LOADING ----------------
+    def build(self):
+        """Full load (run in the background; searches return nothing until it finishes)."""
+        from utils import get_supabase_admin, run_concurrently, keyset_rows
+        admin = get_supabase_admin()
+        started = datetime.now(timezone.utc)
+
+        def load(table, fields):
+            return list(keyset_rows(lambda: admin.table(table).select(fields), 'id'))
+
+        users, projects, members, tasks, comments = run_concurrently(
+            lambda: load('users', USER_FIELDS),
+            lambda: load('projects', PROJECT_FIELDS),
+            lambda: load('project_members', MEMBER_FIELDS),
+            lambda: load('tasks', TASK_FIELDS),
+            lambda: load('comments', COMMENT_FIELDS),
+        )
+        with self.lock:
+            self._reset()
+            self.upsert_users(users)
+            self.upsert_projects(projects)
+            self.upsert_memberships(members)
+            self.upsert_tasks(tasks)
+            self.upsert_comments(comments)
+            self.synced_at = started
+            self.ready = True
+            self._started = True
+        log.info("Search index built: %d documents", len(self.doc_terms))
+
+    def refresh(self):
+        """Applies rows changed since the last sync (falls back to a rebuild without setup_sync.sql)."""
+        from utils import get_supabase_admin, run_concurrently, keyset_rows
+        admin = get_supabase_admin()
+        started = datetime.now(timezone.utc)
+        since = (self.synced_at - timedelta(seconds=REFRESH_OVERLAP_SECONDS)).isoformat()
+
+        def changed(table, fields):
+            return list(keyset_rows(lambda: admin.table(table).select(fields).gte('updated_at', since), 'id'))
+
+        try:
+            users, projects, members, tasks, comments, deleted = run_concurrently(
+                lambda: changed('users', USER_FIELDS),
+                lambda: changed('projects', PROJECT_FIELDS),
+                lambda: changed('project_members', MEMBER_FIELDS),
+                lambda: changed('tasks', TASK_FIELDS),
+                lambda: changed('comments', COMMENT_FIELDS),
+                lambda: self._load_deletions(admin, since),
+            )
+        except Exception as e:
+            log.warning("Search index delta sync unavailable (%s); rebuilding", e)
+            return self.build()
+
+        gone = defaultdict(list)
+        for d in deleted:
+            gone[d['table_name']].append(d['record_id'])
+        with self.lock:
+            self.upsert_users(users)
+            self.upsert_projects(projects)
+            self.upsert_memberships(members)
+            complete = self.remove_memberships(gone['project_members'])
+            self.upsert_tasks(tasks)
+            self.upsert_comments(comments)
+            self.remove_projects(gone['projects'])
+            self.remove_tasks(gone['tasks'])
+            self.remove_comments(gone['comments'])
+            self.synced_at = started
+        if not complete:
+            # A membership added through this worker (no row id yet) was removed before a sync
+            # saw it; reload memberships so the stale grant doesn't linger
+            members = list(keyset_rows(lambda: admin.table('project_members').select(MEMBER_FIELDS), 'id'))
+            self.replace_memberships(members)
+
+    @staticmethod
+    def _load_deletions(admin, since):
+        """Real deletions only: scope-exit tombstones (user_id set) name rows that still exist."""
+        from utils import keyset_rows
+        try:
+            return list(keyset_rows(
+                lambda: admin.table('deleted_records').select('id, table_name, record_id').gte('deleted_at', since).is_('user_id', 'null'),
+                'id'))
+        except Exception as e:
+            # deleted_records predates the user_id column, so every row is a real deletion
+            log.warning("Search index: scoped tombstones unavailable (%s); reading all", e)
+            return list(keyset_rows(
+                lambda: admin.table('deleted_records').select('id, table_name, record_id').gte('deleted_at', since),
+                'id'))
+
+    def ensure_started(self):
+        """Starts the background build + periodic sync for this process (idempotent)."""
+        with self.lock:
+            if self._started:
+                return
+            self._started = True
+
+        def run():
+            while True:
+                try:
+                    if self.ready:
+                        self.refresh()
+                    else:
+                        self.build()
+                except Exception as e:
+                    log.error("Search index error: %s", e)
+                time.sleep(INDEX_REFRESH_SECONDS)
+
+        threading.Thread(target=run, daemon=True, name='search-index').start()
+
+
+index = SearchIndex()
+
+
+def retrieve(query, user_id, k=5):
+    """Snippets for the assistant prompt; empty until the index has been built."""
+    index.ensure_started()
+    if not index.ready or not user_id:
+        return []
+    return [snippet for _, snippet in index.search(query, user_id, k=k)]
@@ -0,0 +1,312 @@
+"""
+Server-side sessions: the cookie carries only an opaque random id, the session data lives here.
+
+The old signed-cookie session held the whole Supabase user object (identities, app/user metadata)
+plus the access token: several KB sent and HMAC-verified on every request, and over the 4 KB
+cookie limit for some Google accounts. Sessions now keep only what the app reads (compact_user).
+
+Backends (Config.SESSION_BACKEND):
+  - 'sqlite' (default when SESSION_SQLITE_PATH is set): in-process LRU in front of a SQLite file
+    shared by all gunicorn workers on the host. The LRU only answers for SESSION_CACHE_SECONDS,
+    so a logout or profile change made through one worker reaches the others within that window.
+    The file must outlive deploys, and it is not shared between hosts.
+  - 'memory': in-process LRU only (single-process dev servers; workers don't share it).
+  - 'cookie' (default otherwise): Flask's signed cookie, holding the same compact user.
+    Survives deploys and works across instances; a logout can't revoke a copied cookie.
+Other stores (e.g. Redis for several hosts) only need get(sid) / set(sid, data, ttl) / delete(sid),
+plus touch(sid, ttl) for sliding expiry: pass one to init_app().
+
+Server-side expiry slides like the cookie's: while a session is in use, its stored expiry is
+pushed back to a full PERMANENT_SESSION_LIFETIME (at most once per SESSION_TOUCH_SECONDS per
+worker, so reads stay reads).
+
+Cookies issued by the old signed-cookie sessions are migrated on first use.
+"""
+import os
+import json
+import time
+import sqlite3
+import secrets
+import threading
+from collections import OrderedDict
+from flask.sessions import SecureCookieSession, SecureCookieSessionInterface, SessionInterface
+from config import Config
+
+SID_BYTES = 32
+# Expired rows are swept from SQLite at most this often (per process)
+SWEEP_INTERVAL_SECONDS = 10 * 60
+
+
+def compact_user(user):
+    """
+    The parts of a Supabase user the app reads. 'user_metadata' keeps its shape because the
+    templates and handlers read session['user']['user_metadata']['full_name'/'avatar_url'].
+    """
+    metadata = user.get('user_metadata') or {}
+    compact = {
+        'id': user.get('id'),
+        'email': user.get('email'),
+        'role': user.get('role'),
+        'user_metadata': {
+            'full_name': metadata.get('full_name') or user.get('full_name'),
+            'avatar_url': metadata.get('avatar_url') or user.get('avatar_url'),
+        },
+    }
+    return compact
+
+
+# ---------------- STORES ----------------
+
+class MemoryStore:
+    """Thread-safe LRU of serialized sessions with per-entry expiry (one per process)."""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # sid -> (payload, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[sid]
+                return None
+            self._entries.move_to_end(sid)
+        return json.loads(entry[0])
+
+    def set(self, sid, data, ttl):
+        self.put(sid, json.dumps(data, separators=(',', ':')), time.time() + ttl)
+
+    def put(self, sid, payload, expires_at):
+        with self._lock:
+            self._entries[sid] = (payload, expires_at)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def touch(self, sid, ttl):
+        with self._lock:
+            entry = self._entries.get(sid)
+            now = time.time()
+            if entry is not None and entry[1] > now:
+                self._entries[sid] = (entry[0], now + ttl)
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+
+class SQLiteStore:
+    """
+    Sessions in a SQLite file (WAL mode), safe across threads and forked workers:
+    each thread of each process opens its own connection on first use.
+    Any short-lived JSON keyed by id fits: pass another table name to keep it apart from sessions.
+    """
+
+    def __init__(self, path, table='sessions'):
+        self.path = path
+        self.table = table
+        self._local = threading.local()
+        self._last_sweep = 0
+
+    def _db(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get_raw(self, sid):
+        row = self._db().execute(f"SELECT data, expires_at FROM {self.table} WHERE sid = ?", (sid,)).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return row
+
+    def get(self, sid):
+        row = self.get_raw(sid)
+        return json.loads(row[0]) if row else None
+
+    def set(self, sid, data, ttl):
+        self.put(sid, json.dumps(data, separators=(',', ':')), time.time() + ttl)
+
+    def put(self, sid, payload, expires_at):
+        db = self._db()
+        db.execute(f"INSERT OR REPLACE INTO {self.table} (sid, data, expires_at) VALUES (?, ?, ?)", (sid, payload, expires_at))
+        now = time.time()
+        if now - self._last_sweep > SWEEP_INTERVAL_SECONDS:
+            self._last_sweep = now
+            db.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (now,))
+
+    def touch(self, sid, ttl):
+        # UPDATE, not upsert: a session deleted meanwhile (logout elsewhere) stays deleted
+        now = time.time()
+        self._db().execute(f"UPDATE {self.table} SET expires_at = ? WHERE sid = ? AND expires_at > ?", (now + ttl, sid, now))
+
+    def delete(self, sid):
+        self._db().execute(f"DELETE FROM {self.table} WHERE sid = ?", (sid,))
+
+
+class TieredStore:
+    """
+    MemoryStore in front of a SQLiteStore. Memory hits are trusted for cache_seconds only
+    (a page load's burst of API calls), then the shared file is read again.
+    """
+
+    def __init__(self, memory, shared, cache_seconds=2):
+        self.memory = memory
+        self.shared = shared
+        self.cache_seconds = cache_seconds
+
+    def get(self, sid):
+        data = self.memory.get(sid)
+        if data is not None:
+            return data
+        row = self.shared.get_raw(sid)
+        if row is None:
+            return None
+        self.memory.put(sid, row[0], min(row[1], time.time() + self.cache_seconds))
+        return json.loads(row[0])
+
+    def set(self, sid, data, ttl):
+        payload = json.dumps(data, separators=(',', ':'))
+        self.shared.put(sid, payload, time.time() + ttl)
+        self.memory.put(sid, payload, time.time() + min(ttl, self.cache_seconds))
+
+    def touch(self, sid, ttl):
+        # The memory copy keeps its short expiry; only the shared row is extended
+        self.shared.touch(sid, ttl)
+
+    def delete(self, sid):
+        self.memory.delete(sid)
+        self.shared.delete(sid)
+
+
+def create_store(backend=None):
+    backend = backend or Config.SESSION_BACKEND
+    if backend == 'memory':
+        return MemoryStore(Config.SESSION_MEMORY_ENTRIES)
+    if backend == 'sqlite':
+        return TieredStore(MemoryStore(Config.SESSION_MEMORY_ENTRIES), SQLiteStore(Config.SESSION_SQLITE_PATH),
+                           cache_seconds=Config.SESSION_CACHE_SECONDS)
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+
+
+# ---------------- FLASK INTERFACE ----------------
+
+class ServerSideSession(SecureCookieSession):
+    """Same change tracking as Flask's cookie session, plus the id it is stored under."""
+
+    def __init__(self, initial=None, sid=None):
+        super().__init__(initial)
+        self.sid = sid
+        self.rotate = False
+
+    def regenerate(self):
+        """Issue a new id on the next save (call on login: an id set before login is never reused)."""
+        self.rotate = True
+        self.modified = True
+
+
+class ServerSideSessionInterface(SessionInterface):
+    session_class = ServerSideSession
+
+    def __init__(self, store, touch_seconds=None):
+        self.store = store
+        self.touch_seconds = Config.SESSION_TOUCH_SECONDS if touch_seconds is None else touch_seconds
+        # Sessions this worker extended recently (sid -> True until the next extension is due)
+        self._touched = MemoryStore(Config.SESSION_MEMORY_ENTRIES)
+        # Reads cookies issued before server-side sessions (see open_session)
+        self._legacy = SecureCookieSessionInterface()
+
+    def _ttl(self, app):
+        return int(app.permanent_session_lifetime.total_seconds())
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid:
+            return self.session_class()
+        if '.' in sid:
+            return self._migrate(app, sid)
+        data = self.store.get(sid)
+        if data is None:
+            return self.session_class()
+        return self.session_class(data, sid=sid)
+
+    def _migrate(self, app, value):
+        """A signed cookie from the old backend: keep the user logged in with a compact session."""
+        serializer = self._legacy.get_signing_serializer(app)
+        try:
+            data = serializer.loads(value, max_age=self._ttl(app)) if serializer else {}
+        except Exception:
+            data = {}
+        session = self.session_class()
+        if data.get('user'):
+            session['user'] = compact_user(data['user'])
+        else:
+            # Unreadable or empty: make save_session drop the old cookie
+            session.modified = True
+        return session
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        # Cleared (logout): forget it server-side and remove the cookie
+        if not session:
+            if session.modified:
+                if session.sid:
+                    self.store.delete(session.sid)
+                    self._touched.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       samesite=samesite, httponly=httponly)
+                response.vary.add("Cookie")
+            return
+
+        new_sid = session.sid is None or session.rotate
+        if session.modified or new_sid:
+            if session.sid and session.rotate:
+                self.store.delete(session.sid)
+            if new_sid:
+                session.sid = secrets.token_urlsafe(SID_BYTES)
+                session.rotate = False
+            self.store.set(session.sid, dict(session), self._ttl(app))
+            self._touched.set(session.sid, True, self.touch_seconds)
+        elif app.config['SESSION_REFRESH_EACH_REQUEST'] and self._touched.get(session.sid) is None:
+            # Unchanged but in use: extend the stored expiry (sliding, like the cookie's)
+            touch = getattr(self.store, 'touch', None)
+            if touch is not None:
+                touch(session.sid, self._ttl(app))
+            self._touched.set(session.sid, True, self.touch_seconds)
+
+        if new_sid or self.should_set_cookie(app, session):
+            response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                                httponly=httponly, domain=domain, path=path, secure=secure, samesite=samesite)
+            response.vary.add("Cookie")
+
+
+def regenerate(session):
+    """New session id after login (no-op with the cookie backend, which has no ids)."""
+    if hasattr(session, 'regenerate'):
+        session.regenerate()
+
+
+def init_app(app, store=None):
+    """Installs the server-side session interface (unless SESSION_BACKEND is 'cookie' and no store is given)."""
+    if store is None:
+        if Config.SESSION_BACKEND == 'cookie':
+            return
+        store = create_store()
+    app.session_interface = ServerSideSessionInterface(store)
@@ -0,0 +1,135 @@
+-- Attachment Storage Cleanup
+-- 1. task_attachments.storage_path: the object key is stored explicitly instead of being
+--    recovered from file_url.
+-- 2. storage_orphans: queue of object keys that are no longer referenced. It is filled by a
+--    trigger, so it also covers rows removed by ON DELETE CASCADE (deleting a task or project).
+--    The queue is drained in batches by attachment_cleanup.purge_storage_orphans().
+-- Requires setup_attachment_dedup.sql and setup_attachment_previews.sql. Safe to re-run.
+
+ALTER TABLE task_attachments ADD COLUMN IF NOT EXISTS storage_path TEXT;
+
+-- Backfill existing rows ("https://.../task-attachments/<key>" -> "<key>")
+UPDATE task_attachments
+SET storage_path = split_part(file_url, 'task-attachments/', 2)
+WHERE storage_path IS NULL AND file_url LIKE '%task-attachments/%';
+
+CREATE INDEX IF NOT EXISTS idx_task_attachments_storage_path ON task_attachments (storage_path);
+CREATE INDEX IF NOT EXISTS idx_attachment_blobs_storage_path ON attachment_blobs (storage_path);
+
+CREATE TABLE IF NOT EXISTS storage_orphans (
+    id BIGSERIAL PRIMARY KEY,
+    bucket TEXT NOT NULL DEFAULT 'task-attachments',
+    storage_path TEXT NOT NULL,
+    queued_at TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_storage_orphans_path ON storage_orphans (storage_path);
+
+-- Queue the object keys freed by a deleted attachment row.
+-- Thumbnail keys follow thumbnails.thumbnail_keys():
+--   content-addressed: thumbs/<hash[:2]>/<hash>-thumb.webp / -preview.webp
+--   legacy rows:       <task_id>/thumbs/<attachment_id>-thumb.webp / -preview.webp
+CREATE OR REPLACE FUNCTION queue_attachment_storage()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+    blob JSONB;
+    base TEXT;
+BEGIN
+    IF OLD.content_hash IS NOT NULL THEN
+        -- Shared blob: only freed with its last reference
+        blob := release_attachment_blob(OLD.content_hash);
+        IF blob IS NOT NULL AND (blob->>'ref_count')::INTEGER <= 0 THEN
+            base := 'thumbs/' || left(OLD.content_hash, 2) || '/' || OLD.content_hash;
+            INSERT INTO storage_orphans (storage_path)
+            VALUES (blob->>'storage_path'), (base || '-thumb.webp'), (base || '-preview.webp');
+        END IF;
+    ELSE
+        IF OLD.storage_path IS NOT NULL THEN
+            INSERT INTO storage_orphans (storage_path) VALUES (OLD.storage_path);
+        END IF;
+        IF OLD.thumbnail_url IS NOT NULL THEN
+            base := OLD.task_id || '/thumbs/' || OLD.id;
+            INSERT INTO storage_orphans (storage_path)
+            VALUES (base || '-thumb.webp'), (base || '-preview.webp');
+        END IF;
+    END IF;
+    RETURN OLD;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS task_attachments_queue_storage ON task_attachments;
+CREATE TRIGGER task_attachments_queue_storage
+AFTER DELETE ON task_attachments
+FOR EACH ROW EXECUTE FUNCTION queue_attachment_storage();
+
+-- Re-acquiring a blob whose object is queued for removal (same content uploaded again before
+-- the purge ran) must take it off the queue again. Same as setup_attachment_dedup.sql otherwise.
+CREATE OR REPLACE FUNCTION acquire_attachment_blob(
+    p_content_hash TEXT,
+    p_storage_path TEXT,
+    p_file_size BIGINT,
+    p_content_type TEXT
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+    blob JSONB;
+    current attachment_blobs%ROWTYPE;
+BEGIN
+    SELECT * INTO current FROM attachment_blobs WHERE content_hash = p_content_hash FOR UPDATE;
+    IF NOT FOUND THEN
+        INSERT INTO attachment_blobs (content_hash, storage_path, file_size, content_type, ref_count)
+        VALUES (p_content_hash, p_storage_path, p_file_size, p_content_type, 1)
+        ON CONFLICT (content_hash) DO NOTHING
+        RETURNING to_jsonb(attachment_blobs.*) INTO blob;
+        IF blob IS NULL THEN
+            RETURN acquire_attachment_blob(p_content_hash, p_storage_path, p_file_size, p_content_type);
+        END IF;
+        RETURN blob;
+    END IF;
+
+    IF current.state = 'removing' AND current.state_changed_at > NOW() - INTERVAL '5 minutes' THEN
+        RETURN jsonb_build_object('content_hash', p_content_hash, 'state', 'removing');
+    END IF;
+
+    UPDATE attachment_blobs
+    SET ref_count = CASE WHEN state = 'live' THEN ref_count + 1 ELSE 1 END,
+        state = 'live',
+        state_changed_at = NOW()
+    WHERE content_hash = p_content_hash
+    RETURNING to_jsonb(attachment_blobs.*) INTO blob;
+
+    DELETE FROM storage_orphans
+    WHERE storage_path IN (
+        p_storage_path,
+        'thumbs/' || left(p_content_hash, 2) || '/' || p_content_hash || '-thumb.webp',
+        'thumbs/' || left(p_content_hash, 2) || '/' || p_content_hash || '-preview.webp'
+    );
+    RETURN blob;
+END;
+$$;
+
+-- Bucket listing for attachment_cleanup.reconcile_bucket(), paged by name (keyset): objects
+-- deleted during the sweep can't shift others out of a page like Storage's offset-based list()
+-- does. Service role only.
+CREATE OR REPLACE FUNCTION list_storage_objects(p_bucket TEXT, p_prefix TEXT, p_after TEXT, p_limit INTEGER)
+RETURNS TABLE (name TEXT, updated_at TIMESTAMPTZ)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = storage, public
+AS $$
+    SELECT o.name, COALESCE(o.updated_at, o.created_at)
+    FROM storage.objects o
+    WHERE o.bucket_id = p_bucket
+      AND (p_prefix = '' OR o.name LIKE p_prefix || '/%')
+      AND (p_after IS NULL OR o.name COLLATE "C" > p_after COLLATE "C")
+    ORDER BY o.name COLLATE "C"
+    LIMIT p_limit;
+$$;
+
+REVOKE EXECUTE ON FUNCTION list_storage_objects(TEXT, TEXT, TEXT, INTEGER) FROM PUBLIC, anon, authenticated;
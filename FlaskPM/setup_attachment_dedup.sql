@@ -0,0 +1,122 @@
+-- Content-Addressed Attachment Storage
+-- Identical files are stored ONCE under 'blobs/<sha256[:2]>/<sha256>' and shared between
+-- task_attachments rows through a reference count. Safe to re-run.
+
+ALTER TABLE task_attachments ADD COLUMN IF NOT EXISTS content_hash TEXT;
+ALTER TABLE task_attachments ADD COLUMN IF NOT EXISTS file_size BIGINT;
+CREATE INDEX IF NOT EXISTS idx_task_attachments_content_hash ON task_attachments (content_hash);
+
+CREATE TABLE IF NOT EXISTS attachment_blobs (
+    content_hash TEXT PRIMARY KEY,          -- sha256 hex digest
+    storage_path TEXT NOT NULL,             -- object key in the 'task-attachments' bucket
+    file_size BIGINT,
+    content_type TEXT,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Removal state: 'live' -> (last reference released) 'deleting' -> (claimed by the remover,
+-- object being removed from Storage) 'removing' -> row deleted once the object is gone.
+-- A deleting blob is revived by a new upload; a removing one makes the upload wait, so an
+-- object is never removed while a reference to it exists.
+ALTER TABLE attachment_blobs ADD COLUMN IF NOT EXISTS state TEXT NOT NULL DEFAULT 'live';
+ALTER TABLE attachment_blobs ADD COLUMN IF NOT EXISTS state_changed_at TIMESTAMPTZ DEFAULT NOW();
+
+-- Take a reference (creates the blob row on first use). Atomic under concurrent uploads.
+-- Returns {"state": "removing"} without taking a reference while the object is being removed:
+-- the caller waits and calls again, then stores the object anew (ref_count = 1).
+-- A removal claimed more than 5 minutes ago is considered dead and taken over.
+CREATE OR REPLACE FUNCTION acquire_attachment_blob(
+    p_content_hash TEXT,
+    p_storage_path TEXT,
+    p_file_size BIGINT,
+    p_content_type TEXT
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+    blob JSONB;
+    current attachment_blobs%ROWTYPE;
+BEGIN
+    SELECT * INTO current FROM attachment_blobs WHERE content_hash = p_content_hash FOR UPDATE;
+    IF NOT FOUND THEN
+        INSERT INTO attachment_blobs (content_hash, storage_path, file_size, content_type, ref_count)
+        VALUES (p_content_hash, p_storage_path, p_file_size, p_content_type, 1)
+        ON CONFLICT (content_hash) DO NOTHING
+        RETURNING to_jsonb(attachment_blobs.*) INTO blob;
+        IF blob IS NULL THEN
+            -- Inserted concurrently: take a reference on that row instead
+            RETURN acquire_attachment_blob(p_content_hash, p_storage_path, p_file_size, p_content_type);
+        END IF;
+        RETURN blob;
+    END IF;
+
+    IF current.state = 'removing' AND current.state_changed_at > NOW() - INTERVAL '5 minutes' THEN
+        RETURN jsonb_build_object('content_hash', p_content_hash, 'state', 'removing');
+    END IF;
+
+    UPDATE attachment_blobs
+    SET ref_count = CASE WHEN state = 'live' THEN ref_count + 1 ELSE 1 END,
+        state = 'live',
+        state_changed_at = NOW()
+    WHERE content_hash = p_content_hash
+    RETURNING to_jsonb(attachment_blobs.*) INTO blob;
+    RETURN blob;
+END;
+$$;
+
+-- Drop a reference. When the last one goes, the row is marked 'deleting' and returned with
+-- ref_count = 0 so the caller knows the object can be removed (claim it first, see below).
+CREATE OR REPLACE FUNCTION release_attachment_blob(p_content_hash TEXT)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+    blob JSONB;
+BEGIN
+    UPDATE attachment_blobs
+    SET ref_count = GREATEST(ref_count - 1, 0),
+        state = CASE WHEN ref_count <= 1 THEN 'deleting' ELSE state END,
+        state_changed_at = CASE WHEN ref_count <= 1 THEN NOW() ELSE state_changed_at END
+    WHERE content_hash = p_content_hash AND state = 'live'
+    RETURNING to_jsonb(attachment_blobs.*) INTO blob;
+    RETURN blob;
+END;
+$$;
+
+-- Claims released blobs for removal ('deleting' -> 'removing', plus removals that died more
+-- than 5 minutes ago). Only the returned blobs may be removed from Storage.
+CREATE OR REPLACE FUNCTION claim_attachment_blobs(p_content_hashes TEXT[])
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+    claimed JSONB;
+BEGIN
+    WITH rows AS (
+        UPDATE attachment_blobs
+        SET state = 'removing', state_changed_at = NOW()
+        WHERE content_hash = ANY(p_content_hashes)
+          AND (state = 'deleting'
+               OR (state = 'removing' AND state_changed_at <= NOW() - INTERVAL '5 minutes'))
+        RETURNING *
+    )
+    SELECT COALESCE(jsonb_agg(to_jsonb(rows.*)), '[]'::jsonb) INTO claimed FROM rows;
+    RETURN claimed;
+END;
+$$;
+
+-- Called after the claimed objects were removed from Storage.
+CREATE OR REPLACE FUNCTION finish_attachment_blobs(p_content_hashes TEXT[])
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    DELETE FROM attachment_blobs WHERE content_hash = ANY(p_content_hashes) AND state = 'removing';
+END;
+$$;
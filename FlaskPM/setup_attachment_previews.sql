@@ -0,0 +1,9 @@
+-- Attachment Thumbnails / Previews
+-- Filled in by the background pipeline in thumbnails.py after each upload. Safe to re-run.
+--   thumbnail_url  : small WebP (list views)
+--   preview_url    : larger WebP (detail view; first page for PDFs)
+--   preview_status : pending | ready | failed | unsupported | skipped
+
+ALTER TABLE task_attachments ADD COLUMN IF NOT EXISTS thumbnail_url TEXT;
+ALTER TABLE task_attachments ADD COLUMN IF NOT EXISTS preview_url TEXT;
+ALTER TABLE task_attachments ADD COLUMN IF NOT EXISTS preview_status TEXT;
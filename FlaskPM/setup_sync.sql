@@ -0,0 +1,248 @@
+-- Delta Sync Support (/api/sync)
+-- Adds 'updated_at' tracking to every synced table and a 'deleted_records'
+-- log so the mobile app can fetch only what changed since its last sync.
+-- Safe to re-run.
+
+-- 1. updated_at columns (backfilled from created_at)
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+ALTER TABLE users ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+ALTER TABLE project_members ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+ALTER TABLE comments ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+ALTER TABLE calendar_events ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+
+UPDATE tasks SET updated_at = created_at WHERE created_at IS NOT NULL;
+UPDATE projects SET updated_at = created_at WHERE created_at IS NOT NULL;
+UPDATE users SET updated_at = created_at WHERE created_at IS NOT NULL;
+UPDATE project_members SET updated_at = joined_at WHERE joined_at IS NOT NULL;
+UPDATE comments SET updated_at = created_at WHERE created_at IS NOT NULL;
+UPDATE calendar_events SET updated_at = created_at WHERE created_at IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_tasks_updated_at ON tasks (updated_at);
+CREATE INDEX IF NOT EXISTS idx_projects_updated_at ON projects (updated_at);
+CREATE INDEX IF NOT EXISTS idx_users_updated_at ON users (updated_at);
+CREATE INDEX IF NOT EXISTS idx_project_members_updated_at ON project_members (updated_at);
+CREATE INDEX IF NOT EXISTS idx_comments_updated_at ON comments (updated_at);
+CREATE INDEX IF NOT EXISTS idx_calendar_events_updated_at ON calendar_events (updated_at);
+
+-- 2. Touch updated_at on every UPDATE
+CREATE OR REPLACE FUNCTION set_updated_at()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_tasks_updated_at ON tasks;
+CREATE TRIGGER trg_tasks_updated_at BEFORE UPDATE ON tasks
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+DROP TRIGGER IF EXISTS trg_projects_updated_at ON projects;
+CREATE TRIGGER trg_projects_updated_at BEFORE UPDATE ON projects
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+DROP TRIGGER IF EXISTS trg_users_updated_at ON users;
+CREATE TRIGGER trg_users_updated_at BEFORE UPDATE ON users
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+DROP TRIGGER IF EXISTS trg_project_members_updated_at ON project_members;
+CREATE TRIGGER trg_project_members_updated_at BEFORE UPDATE ON project_members
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+DROP TRIGGER IF EXISTS trg_comments_updated_at ON comments;
+CREATE TRIGGER trg_comments_updated_at BEFORE UPDATE ON comments
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+DROP TRIGGER IF EXISTS trg_calendar_events_updated_at ON calendar_events;
+CREATE TRIGGER trg_calendar_events_updated_at BEFORE UPDATE ON calendar_events
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+-- 3. Deletion log (tombstones). Fires for cascaded deletes too.
+CREATE TABLE IF NOT EXISTS deleted_records (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    table_name TEXT NOT NULL,
+    record_id TEXT NOT NULL,
+    deleted_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_deleted_records_deleted_at ON deleted_records (deleted_at);
+
+CREATE OR REPLACE FUNCTION log_deleted_record()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    INSERT INTO deleted_records (table_name, record_id)
+    VALUES (TG_TABLE_NAME, OLD.id::text);
+    RETURN OLD;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_tasks_deleted ON tasks;
+CREATE TRIGGER trg_tasks_deleted AFTER DELETE ON tasks
+    FOR EACH ROW EXECUTE FUNCTION log_deleted_record();
+
+DROP TRIGGER IF EXISTS trg_projects_deleted ON projects;
+CREATE TRIGGER trg_projects_deleted AFTER DELETE ON projects
+    FOR EACH ROW EXECUTE FUNCTION log_deleted_record();
+
+DROP TRIGGER IF EXISTS trg_users_deleted ON users;
+CREATE TRIGGER trg_users_deleted AFTER DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION log_deleted_record();
+
+DROP TRIGGER IF EXISTS trg_project_members_deleted ON project_members;
+CREATE TRIGGER trg_project_members_deleted AFTER DELETE ON project_members
+    FOR EACH ROW EXECUTE FUNCTION log_deleted_record();
+
+DROP TRIGGER IF EXISTS trg_comments_deleted ON comments;
+CREATE TRIGGER trg_comments_deleted AFTER DELETE ON comments
+    FOR EACH ROW EXECUTE FUNCTION log_deleted_record();
+
+DROP TRIGGER IF EXISTS trg_calendar_events_deleted ON calendar_events;
+CREATE TRIGGER trg_calendar_events_deleted AFTER DELETE ON calendar_events
+    FOR EACH ROW EXECUTE FUNCTION log_deleted_record();
+
+-- Optional housekeeping: tombstones older than 30 days are no longer useful
+-- (clients that old fall back to a full sync).
+-- DELETE FROM deleted_records WHERE deleted_at < NOW() - INTERVAL '30 days';
+
+-- 4. Scope-exit tombstones. A row that leaves a member's view (task reassigned away,
+-- removal from a project, project handed to a new owner) is not deleted, so the delete
+-- trigger above never fires. These entries carry the user_id of the member who lost it;
+-- /api/sync returns them to that member only. table_name '*' asks every client for a full
+-- re-sync (role changes move whole sets of rows in or out of scope).
+-- Scope entries need no trigger: /api/sync re-sends the project (with all its memberships) of a
+-- membership or ownership in the delta, and the full comment thread of a task in the delta.
+ALTER TABLE deleted_records ADD COLUMN IF NOT EXISTS user_id UUID;
+CREATE INDEX IF NOT EXISTS idx_deleted_records_user_id ON deleted_records (user_id, deleted_at);
+
+CREATE OR REPLACE FUNCTION log_task_scope_exit()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    IF OLD.assigned_to IS NOT NULL AND OLD.assigned_to IS DISTINCT FROM NEW.assigned_to THEN
+        INSERT INTO deleted_records (table_name, record_id, user_id)
+        VALUES ('tasks', OLD.id::text, OLD.assigned_to);
+        -- Members only see comments on their own tasks
+        INSERT INTO deleted_records (table_name, record_id, user_id)
+        SELECT 'comments', c.id::text, OLD.assigned_to FROM comments c WHERE c.task_id = OLD.id;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_tasks_scope_exit ON tasks;
+CREATE TRIGGER trg_tasks_scope_exit AFTER UPDATE OF assigned_to ON tasks
+    FOR EACH ROW EXECUTE FUNCTION log_task_scope_exit();
+
+-- Tombstones for a project (and its memberships) that 'member' can no longer see
+CREATE OR REPLACE FUNCTION log_project_scope_exit(p_project_id UUID, p_member UUID)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    IF p_member IS NULL
+       OR EXISTS (SELECT 1 FROM projects WHERE id = p_project_id AND owner_id = p_member)
+       OR EXISTS (SELECT 1 FROM project_members WHERE project_id = p_project_id AND user_id = p_member) THEN
+        RETURN;
+    END IF;
+    INSERT INTO deleted_records (table_name, record_id, user_id)
+    VALUES ('projects', p_project_id::text, p_member);
+    INSERT INTO deleted_records (table_name, record_id, user_id)
+    SELECT 'project_members', pm.id::text, p_member FROM project_members pm WHERE pm.project_id = p_project_id;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION log_membership_scope_exit()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    PERFORM log_project_scope_exit(OLD.project_id, OLD.user_id);
+    RETURN OLD;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_project_members_scope_exit ON project_members;
+CREATE TRIGGER trg_project_members_scope_exit AFTER DELETE ON project_members
+    FOR EACH ROW EXECUTE FUNCTION log_membership_scope_exit();
+
+CREATE OR REPLACE FUNCTION log_owner_scope_exit()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    IF OLD.owner_id IS DISTINCT FROM NEW.owner_id THEN
+        PERFORM log_project_scope_exit(OLD.id, OLD.owner_id);
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_projects_owner_scope_exit ON projects;
+CREATE TRIGGER trg_projects_owner_scope_exit AFTER UPDATE OF owner_id ON projects
+    FOR EACH ROW EXECUTE FUNCTION log_owner_scope_exit();
+
+CREATE OR REPLACE FUNCTION log_role_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    IF OLD.role IS DISTINCT FROM NEW.role THEN
+        INSERT INTO deleted_records (table_name, record_id) VALUES ('*', NEW.id::text);
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_users_role_change ON users;
+CREATE TRIGGER trg_users_role_change AFTER UPDATE OF role ON users
+    FOR EACH ROW EXECUTE FUNCTION log_role_change();
+
+-- 5. Embedded names: tasks embed project(title) and assignee(full_name, avatar_url), comments
+-- embed user(full_name, avatar_url). Touch those rows when the source changes so delta
+-- syncs pick up the new values.
+CREATE OR REPLACE FUNCTION touch_project_tasks()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    IF OLD.title IS DISTINCT FROM NEW.title THEN
+        UPDATE tasks SET updated_at = NOW() WHERE project_id = NEW.id;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_projects_touch_tasks ON projects;
+CREATE TRIGGER trg_projects_touch_tasks AFTER UPDATE OF title ON projects
+    FOR EACH ROW EXECUTE FUNCTION touch_project_tasks();
+
+CREATE OR REPLACE FUNCTION touch_user_references()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    IF OLD.full_name IS DISTINCT FROM NEW.full_name OR OLD.avatar_url IS DISTINCT FROM NEW.avatar_url THEN
+        UPDATE tasks SET updated_at = NOW() WHERE assigned_to = NEW.id;
+        UPDATE comments SET updated_at = NOW() WHERE user_id = NEW.id;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_users_touch_references ON users;
+CREATE TRIGGER trg_users_touch_references AFTER UPDATE OF full_name, avatar_url ON users
+    FOR EACH ROW EXECUTE FUNCTION touch_user_references();
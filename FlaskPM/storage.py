@@ -0,0 +1,341 @@
+import os
+import base64
+import hashlib
+import threading
+from datetime import datetime, timezone
+from config import Config
+from app_logging import get_logger
+
+log = get_logger('storage')
+
+ATTACHMENTS_BUCKET = 'task-attachments'
+
+# Supabase resumable (TUS) uploads require exactly 6 MB chunks (the last one may be smaller)
+CHUNK_SIZE = 6 * 1024 * 1024
+# How many times a failed chunk is retried (after re-syncing the offset with the server)
+CHUNK_RETRIES = 3
+# Entries per Storage list() call when walking a bucket
+LIST_PAGE_SIZE = 1000
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, limit):
+        super().__init__(f"File exceeds the maximum upload size of {limit // (1024 * 1024)} MB")
+        self.limit = limit
+
+
+class BoundedReader:
+    """
+    Wraps a file-like stream: enforces a byte limit while reading and reports progress.
+    Memory stays at one chunk regardless of the file size.
+    """
+    def __init__(self, stream, max_bytes, on_progress=None):
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.on_progress = on_progress
+        self.read_bytes = 0
+
+    def read(self, size=-1):
+        chunk = self.stream.read(size)
+        self.read_bytes += len(chunk)
+        if self.max_bytes and self.read_bytes > self.max_bytes:
+            raise UploadTooLarge(self.max_bytes)
+        if chunk and self.on_progress:
+            self.on_progress(self.read_bytes)
+        return chunk
+
+    def chunks(self, chunk_size=CHUNK_SIZE):
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def stream_size(stream):
+    """Size of a seekable stream (werkzeug spools uploads to a temp file), or None."""
+    try:
+        pos = stream.tell()
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(pos)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def hash_stream(stream, max_bytes=None, chunk_size=1024 * 1024):
+    """
+    SHA-256 of a seekable stream, read chunk by chunk (size cap enforced), rewound afterwards.
+    Returns (hex_digest, size).
+    """
+    digest = hashlib.sha256()
+    reader = BoundedReader(stream, max_bytes)
+    for chunk in reader.chunks(chunk_size):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest(), reader.read_bytes
+
+
+def content_key(content_hash):
+    """Content-addressed object key: identical bytes always map to the same key."""
+    return f"blobs/{content_hash[:2]}/{content_hash}"
+
+
+def parse_timestamp(value):
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+# ---------------- PROGRESS ----------------
+# upload_id -> {"received": int, "total": int|None, "status": str}, kept in a SQLite file so a
+# poll answered by any worker on the host sees it. "received" counts bytes stored so far: by the
+# time the route runs, werkzeug has already received the whole request body, so the browser's
+# own upload progress (XHR upload.onprogress) covers the client -> server part.
+PROGRESS_TTL_SECONDS = 60 * 60
+_progress_store = None
+_progress_lock = threading.Lock()
+
+def progress_store():
+    global _progress_store
+    if _progress_store is None:
+        with _progress_lock:
+            if _progress_store is None:
+                from session_store import SQLiteStore
+                _progress_store = SQLiteStore(Config.UPLOAD_PROGRESS_PATH, table='upload_progress')
+    return _progress_store
+
+def set_progress(upload_id, **fields):
+    if not upload_id:
+        return
+    try:
+        # Only the request handling the upload writes its entry, so read-modify-write is safe
+        store = progress_store()
+        entry = store.get(upload_id) or {"received": 0, "total": None, "status": "uploading"}
+        entry.update(fields)
+        store.set(upload_id, entry, PROGRESS_TTL_SECONDS)
+    except Exception as e:
+        # Progress is informational: never fail the upload over it
+        log.warning("Upload progress write failed: %s", e)
+
+def get_progress(upload_id):
+    try:
+        return progress_store().get(upload_id)
+    except Exception as e:
+        log.warning("Upload progress read failed: %s", e)
+        return None
+
+
+# ---------------- BACKENDS ----------------
+
+class SupabaseStorage:
+    """
+    Supabase Storage backend.
+    - Files up to one chunk: regular upload through supabase-py.
+    - Larger files: TUS resumable upload, streamed chunk by chunk (a failed chunk is resumed from
+      the offset the server reports instead of restarting the whole file).
+    """
+    def __init__(self, client, url, service_key, bucket=ATTACHMENTS_BUCKET):
+        self.client = client
+        self.url = url.rstrip('/')
+        self.service_key = service_key
+        self.bucket = bucket
+
+    def upload_stream(self, path, reader, size, content_type, chunk_size=CHUNK_SIZE, upsert=False):
+        # TUS needs Upload-Length up front: a stream of unknown size goes in one request
+        if size is None or size <= chunk_size:
+            file_options = {"content-type": content_type}
+            if upsert:
+                file_options["upsert"] = "true"
+            self.client.storage.from_(self.bucket).upload(
+                path=path,
+                file=reader.read(),
+                file_options=file_options
+            )
+            return path
+        return self._upload_resumable(path, reader, size, content_type, chunk_size, upsert)
+
+    def _upload_resumable(self, path, reader, size, content_type, chunk_size, upsert=False):
+        import requests
+
+        def b64(value):
+            return base64.b64encode(str(value).encode()).decode()
+
+        headers = {
+            "Authorization": f"Bearer {self.service_key}",
+            "apikey": self.service_key,
+            "Tus-Resumable": "1.0.0",
+        }
+        if upsert:
+            headers["x-upsert"] = "true"
+        metadata = ",".join([
+            f"bucketName {b64(self.bucket)}",
+            f"objectName {b64(path)}",
+            f"contentType {b64(content_type or 'application/octet-stream')}",
+            f"cacheControl {b64(3600)}",
+        ])
+
+        with requests.Session() as http:
+            create = http.post(
+                f"{self.url}/storage/v1/upload/resumable",
+                headers={**headers, "Upload-Length": str(size), "Upload-Metadata": metadata},
+                timeout=30
+            )
+            create.raise_for_status()
+            location = create.headers["Location"]
+
+            offset = 0
+            for chunk in reader.chunks(chunk_size):
+                sent = 0
+                for attempt in range(CHUNK_RETRIES + 1):
+                    try:
+                        res = http.patch(
+                            location,
+                            data=chunk[sent:],
+                            headers={
+                                **headers,
+                                "Upload-Offset": str(offset + sent),
+                                "Content-Type": "application/offset+octet-stream",
+                            },
+                            timeout=120
+                        )
+                        res.raise_for_status()
+                        break
+                    except Exception as e:
+                        if attempt == CHUNK_RETRIES:
+                            raise
+                        log.warning("Chunk upload retry %d for %s: %s", attempt + 1, path, e)
+                        # Resume from whatever the server actually stored
+                        head = http.head(location, headers=headers, timeout=30)
+                        sent = max(0, int(head.headers.get("Upload-Offset", offset)) - offset)
+                offset += len(chunk)
+        return path
+
+    def public_url(self, path):
+        return self.client.storage.from_(self.bucket).get_public_url(path)
+
+    def remove(self, paths):
+        return self.client.storage.from_(self.bucket).remove(list(paths))
+
+    def list_objects(self, prefix=''):
+        """
+        Yields (path, updated_at) for every object under 'prefix'. Uses the list_storage_objects
+        RPC (setup_attachment_cleanup.sql), which pages by name; without it, walks the folders.
+        """
+        try:
+            first = self._list_page(prefix, None)
+        except Exception as e:
+            log.warning("list_storage_objects RPC unavailable, walking folders: %s", e)
+            yield from self._walk_objects(prefix)
+            return
+        page = first
+        while True:
+            for entry in page:
+                yield entry['name'], parse_timestamp(entry.get('updated_at'))
+            if len(page) < LIST_PAGE_SIZE:
+                return
+            page = self._list_page(prefix, page[-1]['name'])
+
+    def _list_page(self, prefix, after):
+        return self.client.rpc('list_storage_objects', {
+            'p_bucket': self.bucket,
+            'p_prefix': prefix.strip('/'),
+            'p_after': after,
+            'p_limit': LIST_PAGE_SIZE,
+        }).execute().data or []
+
+    def _walk_objects(self, prefix):
+        # Storage's list() pages by offset: objects deleted meanwhile shift others out of a page.
+        # A skipped object is only left out of this sweep, never removed by it.
+        bucket = self.client.storage.from_(self.bucket)
+        folders = [prefix.strip('/')]
+        while folders:
+            folder = folders.pop()
+            offset = 0
+            while True:
+                entries = bucket.list(folder, {"limit": LIST_PAGE_SIZE, "offset": offset, "sortBy": {"column": "name", "order": "asc"}})
+                for entry in entries:
+                    path = f"{folder}/{entry['name']}" if folder else entry['name']
+                    # Folders are returned as entries without an id
+                    if entry.get('id') is None:
+                        folders.append(path)
+                    else:
+                        yield path, parse_timestamp(entry.get('updated_at') or entry.get('created_at'))
+                if len(entries) < LIST_PAGE_SIZE:
+                    break
+                offset += LIST_PAGE_SIZE
+
+
+class LocalStorage:
+    """
+    Disk-backed stand-in for Supabase Storage (development / tests).
+    Enable with STORAGE_BACKEND=local; files land in LOCAL_STORAGE_DIR/<bucket>/<path>
+    and are served by /api/local-storage/<bucket>/<path>.
+    """
+    def __init__(self, root, bucket=ATTACHMENTS_BUCKET, base_url=''):
+        self.root = root
+        self.bucket = bucket
+        self.base_url = base_url.rstrip('/')
+
+    def full_path(self, path):
+        bucket_dir = os.path.abspath(os.path.join(self.root, self.bucket))
+        target = os.path.abspath(os.path.join(bucket_dir, path))
+        if not target.startswith(bucket_dir + os.sep):
+            raise ValueError("Invalid storage path")
+        return target
+
+    def upload_stream(self, path, reader, size, content_type, chunk_size=CHUNK_SIZE, upsert=False):
+        # os.replace() below always overwrites, so 'upsert' needs no special handling here
+        target = self.full_path(path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = target + '.part'
+        try:
+            with open(tmp, 'wb') as out:
+                for chunk in reader.chunks(chunk_size):
+                    out.write(chunk)
+            os.replace(tmp, target)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return path
+
+    def public_url(self, path):
+        return f"{self.base_url}/api/local-storage/{self.bucket}/{path}"
+
+    def remove(self, paths):
+        removed = []
+        for p in paths:
+            try:
+                os.remove(self.full_path(p))
+                removed.append({"name": p})
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def list_objects(self, prefix=''):
+        bucket_dir = os.path.join(self.root, self.bucket)
+        start = os.path.join(bucket_dir, prefix.strip('/'))
+        for dirpath, _, files in os.walk(start):
+            for name in files:
+                if name.endswith('.part'):
+                    continue
+                full = os.path.join(dirpath, name)
+                path = os.path.relpath(full, bucket_dir).replace(os.sep, '/')
+                yield path, datetime.fromtimestamp(os.path.getmtime(full), timezone.utc)
+
+
+def get_storage(bucket=ATTACHMENTS_BUCKET):
+    """Storage backend selected by Config.STORAGE_BACKEND ('supabase' or 'local')."""
+    if Config.STORAGE_BACKEND == 'local':
+        return LocalStorage(Config.LOCAL_STORAGE_DIR, bucket, Config.LOCAL_STORAGE_BASE_URL)
+
+    from utils import get_supabase_admin
+    client = get_supabase_admin()
+    if not client:
+        return None
+    return SupabaseStorage(client, Config.SUPABASE_URL, Config.SUPABASE_SERVICE_KEY, bucket)
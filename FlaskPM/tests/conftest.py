@@ -0,0 +1,142 @@
+"""
+Shared fixtures: the production app wired to the in-process Supabase stand-in
+(benchmarks/fake_supabase.py) with the 'small' dataset, in testing mode (strict query budgets).
+Outbound services (SMTP, Nominatim, Gemini) fail fast.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+import pytest
+
+import metrics
+import resilience
+from fake_supabase import FakeDatabase, FakeSupabaseClient, install
+from datasets import generate
+
+
+@pytest.fixture
+def db():
+    database = FakeDatabase()
+    database.load(generate('small'))
+    return database
+
+
+@pytest.fixture
+def app(db):
+    from app import create_app
+    install(metrics.instrument(FakeSupabaseClient(db)))
+    for name in ('smtp', 'nominatim', 'gemini'):
+        resilience.inject_fault(name, error=True)
+    app = create_app()
+    app.testing = True
+    yield app
+    resilience.clear_faults()
+    resilience.reset()
+
+
+@pytest.fixture
+def users(db):
+    return db.table_rows('users')
+
+
+@pytest.fixture
+def admin(users):
+    return next(u for u in users if u['role'] == 'Admin')
+
+
+@pytest.fixture
+def member(users):
+    return next(u for u in users if u['role'] != 'Admin')
+
+
+@pytest.fixture
+def login(app):
+    """login(user) -> a test client with a browser session for that user."""
+    def login(user):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user'] = {'id': user['id'], 'email': user['email'],
+                            'user_metadata': {'full_name': user['full_name']}}
+        return client
+    return login
+
+
+@pytest.fixture
+def bearer():
+    """bearer(user) -> headers for a mobile-style request (the stand-in accepts 'fake-<id>' tokens)."""
+    return lambda user: {'Authorization': f"Bearer fake-{user['id']}"}
+
+
+def _blob(db, content_hash):
+    return next((b for b in db.table_rows('attachment_blobs') if b['content_hash'] == content_hash), None)
+
+
+def _acquire_blob(db, p_content_hash, p_storage_path, p_file_size, p_content_type):
+    blob = _blob(db, p_content_hash)
+    if blob is None:
+        blob = {'content_hash': p_content_hash, 'storage_path': p_storage_path, 'file_size': p_file_size,
+                'content_type': p_content_type, 'ref_count': 1, 'state': 'live'}
+        db.table_rows('attachment_blobs').append(blob)
+    elif blob['state'] == 'removing':
+        return {'content_hash': p_content_hash, 'state': 'removing'}
+    else:
+        blob['ref_count'] = blob['ref_count'] + 1 if blob['state'] == 'live' else 1
+        blob['state'] = 'live'
+    db.changed('attachment_blobs')
+    return dict(blob)
+
+
+def _release_blob(db, p_content_hash):
+    blob = _blob(db, p_content_hash)
+    if blob is None or blob['state'] != 'live':
+        return None
+    if blob['ref_count'] <= 1:
+        blob['state'] = 'deleting'
+    blob['ref_count'] = max(blob['ref_count'] - 1, 0)
+    db.changed('attachment_blobs')
+    return dict(blob)
+
+
+def _claim_blobs(db, p_content_hashes):
+    claimed = []
+    for blob in db.table_rows('attachment_blobs'):
+        if blob['content_hash'] in p_content_hashes and blob['state'] == 'deleting':
+            blob['state'] = 'removing'
+            claimed.append(dict(blob))
+    db.changed('attachment_blobs')
+    return claimed
+
+
+def _finish_blobs(db, p_content_hashes):
+    rows = db.table_rows('attachment_blobs')
+    rows[:] = [b for b in rows if not (b['content_hash'] in p_content_hashes and b['state'] == 'removing')]
+    db.changed('attachment_blobs')
+
+
+@pytest.fixture
+def blob_rpcs(db):
+    """The ref-counted blob functions of setup_attachment_dedup.sql (without the 5-minute takeover)."""
+    db.register_rpc('acquire_attachment_blob', _acquire_blob)
+    db.register_rpc('release_attachment_blob', _release_blob)
+    db.register_rpc('claim_attachment_blobs', _claim_blobs)
+    db.register_rpc('finish_attachment_blobs', _finish_blobs)
+    return db
+
+
+class RecordingStorage:
+    """Storage stand-in: a set of keys; remove() records every call."""
+    def __init__(self, keys=()):
+        self.keys = set(keys)
+        self.removed = []
+
+    def remove(self, paths):
+        self.removed.append(list(paths))
+        self.keys.difference_update(paths)
+
+
+@pytest.fixture
+def storage():
+    return RecordingStorage()
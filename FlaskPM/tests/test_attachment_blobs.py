@@ -0,0 +1,70 @@
+import hashlib
+
+import pytest
+
+import attachment_cleanup
+from attachment_cleanup import claim_blobs, finish_blobs, removable_keys
+from fake_supabase import FakeSupabaseClient
+from storage import content_key
+from thumbnails import thumbnail_keys
+
+CONTENT_HASH = hashlib.sha256(b'report.pdf').hexdigest()
+KEY = content_key(CONTENT_HASH)
+PARAMS = {'p_content_hash': CONTENT_HASH, 'p_storage_path': KEY, 'p_file_size': 10, 'p_content_type': 'application/pdf'}
+
+
+@pytest.fixture
+def client(app, blob_rpcs, storage, monkeypatch):
+    monkeypatch.setattr(attachment_cleanup, 'get_storage', lambda *args: storage)
+    return FakeSupabaseClient(blob_rpcs)
+
+
+def blob_row(db):
+    return next((b for b in db.table_rows('attachment_blobs') if b['content_hash'] == CONTENT_HASH), None)
+
+
+def test_object_is_removed_with_the_last_reference(client, db, storage):
+    from routes.api_routes import acquire_attachment_blob, release_attachment_blob
+    assert acquire_attachment_blob(client, PARAMS)[0]['ref_count'] == 1
+    assert acquire_attachment_blob(client, PARAMS)[0]['ref_count'] == 2
+
+    release_attachment_blob(client, CONTENT_HASH)
+    assert blob_row(db)['ref_count'] == 1
+    assert storage.removed == []
+
+    release_attachment_blob(client, CONTENT_HASH)
+    assert storage.removed == [[KEY, *thumbnail_keys(None, CONTENT_HASH)]]
+    assert blob_row(db) is None
+
+
+def test_upload_waits_for_a_claimed_removal_then_stores_again(client, db, monkeypatch):
+    from routes import api_routes
+    api_routes.acquire_attachment_blob(client, PARAMS)
+    client.rpc('release_attachment_blob', {'p_content_hash': CONTENT_HASH}).execute()
+    assert claim_blobs(client, [CONTENT_HASH]) == {CONTENT_HASH}
+
+    # The remover finishes while the upload is waiting
+    waits = []
+    def sleep(seconds):
+        waits.append(seconds)
+        finish_blobs(client, [CONTENT_HASH])
+    monkeypatch.setattr(api_routes.time, 'sleep', sleep)
+
+    blob, waited = api_routes.acquire_attachment_blob(client, PARAMS)
+    assert waited and len(waits) == 1
+    # A fresh row: the upload must store the object again
+    assert blob['ref_count'] == 1 and blob['state'] == 'live'
+
+
+def test_released_blob_taken_again_before_the_claim_is_kept(client, db):
+    from routes.api_routes import acquire_attachment_blob
+    acquire_attachment_blob(client, PARAMS)
+    client.rpc('release_attachment_blob', {'p_content_hash': CONTENT_HASH}).execute()
+    assert blob_row(db)['state'] == 'deleting'
+
+    # Same content uploaded again before the purge ran
+    assert acquire_attachment_blob(client, PARAMS)[0]['ref_count'] == 1
+
+    removable, claimed = removable_keys(client, [KEY, *thumbnail_keys(None, CONTENT_HASH)])
+    assert removable == set() and claimed == set()
+    assert blob_row(db)['state'] == 'live'
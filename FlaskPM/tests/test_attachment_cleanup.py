@@ -0,0 +1,53 @@
+import hashlib
+
+import pytest
+
+import attachment_cleanup
+from attachment_cleanup import purge_storage_orphans
+from fake_supabase import FakeSupabaseClient
+from storage import content_key
+from thumbnails import thumbnail_keys
+
+RELEASED = hashlib.sha256(b'released').hexdigest()
+REVIVED = hashlib.sha256(b'revived').hexdigest()
+
+
+@pytest.fixture
+def client(app, blob_rpcs, storage, monkeypatch):
+    monkeypatch.setattr(attachment_cleanup, 'get_storage', lambda *args: storage)
+    return FakeSupabaseClient(blob_rpcs)
+
+
+def queue(db, paths):
+    db.seed('storage_orphans', [{'id': i, 'bucket': 'task-attachments', 'storage_path': p}
+                                for i, p in enumerate(paths, start=1000)])
+
+
+def test_purge_removes_unreferenced_keys_and_drains_the_queue(client, db, storage):
+    db.seed('task_attachments', [{'id': 'att-1', 'task_id': 1, 'storage_path': '1/kept.pdf'}])
+    db.seed('attachment_blobs', [
+        {'content_hash': RELEASED, 'storage_path': content_key(RELEASED), 'ref_count': 0, 'state': 'deleting'},
+        {'content_hash': REVIVED, 'storage_path': content_key(REVIVED), 'ref_count': 1, 'state': 'live'},
+    ])
+    released = [content_key(RELEASED), *thumbnail_keys(None, RELEASED)]
+    queue(db, ['1/gone.pdf', '1/kept.pdf', *released, content_key(REVIVED)])
+
+    removed = purge_storage_orphans(client, batch_size=2)
+
+    removed_keys = {key for call in storage.removed for key in call}
+    assert removed == len(removed_keys) == 4
+    assert removed_keys == {'1/gone.pdf', *released}
+    assert db.table_rows('storage_orphans') == []
+    # Claimed blobs are finished once their objects are gone; live ones are untouched
+    assert [b['content_hash'] for b in db.table_rows('attachment_blobs')] == [REVIVED]
+
+
+def test_failed_remove_keeps_the_batch_queued(client, db, storage, monkeypatch):
+    queue(db, ['1/a.pdf', '1/b.pdf'])
+    def fail(paths):
+        raise RuntimeError("storage down")
+    monkeypatch.setattr(storage, 'remove', fail)
+
+    with pytest.raises(RuntimeError):
+        purge_storage_orphans(client)
+    assert len(db.table_rows('storage_orphans')) == 2
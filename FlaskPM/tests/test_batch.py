@@ -0,0 +1,73 @@
+import threading
+
+from fake_supabase import FakeAuth
+
+
+def unread_notification_owner(db, users):
+    notifs = [n for n in db.table_rows('notifications') if not n.get('is_read')]
+    user = next(u for u in users if any(n['user_id'] == u['id'] for n in notifs))
+    return user, next(n for n in notifs if n['user_id'] == user['id'])
+
+
+def record_calls(app, endpoint, calls):
+    view = app.view_functions[endpoint]
+
+    def recorded(**kwargs):
+        calls.append((endpoint, threading.current_thread().name))
+        return view(**kwargs)
+    app.view_functions[endpoint] = recorded
+
+
+def test_reads_run_concurrently_and_writes_are_barriers(app, db, users, login):
+    user, notif = unread_notification_owner(db, users)
+    calls = []
+    record_calls(app, 'api.get_notifications', calls)
+    record_calls(app, 'api.mark_notification_read', calls)
+
+    res = login(user).post('/api/batch', json={'requests': [
+        {'id': 'a', 'method': 'GET', 'path': '/api/notifications'},
+        {'id': 'b', 'method': 'GET', 'path': '/api/notifications'},
+        {'id': 'c', 'method': 'POST', 'path': f"/api/notifications/{notif['id']}/read"},
+        {'id': 'd', 'method': 'GET', 'path': '/api/notifications'},
+    ]})
+    assert res.status_code == 200
+    responses = res.get_json()['responses']
+    assert [r['id'] for r in responses] == ['a', 'b', 'c', 'd']
+    assert all(r['status'] == 200 for r in responses)
+
+    def is_read(response):
+        return next(n['is_read'] for n in response['body']['notifications'] if n['id'] == notif['id'])
+    assert not is_read(responses[0]) and not is_read(responses[1])
+    assert is_read(responses[3])
+
+    # Both leading reads ran (on the batch pool) before the write; the trailing read after it
+    assert [c[0] for c in calls[2:]] == ['api.mark_notification_read', 'api.get_notifications']
+    assert all(thread.startswith('batch') for _, thread in calls[:2])
+
+
+def test_sub_requests_share_the_batch_auth(app, db, users, bearer, monkeypatch):
+    user, notif = unread_notification_owner(db, users)
+    verified = []
+    get_user = FakeAuth.get_user
+
+    def counting_get_user(self, token=None):
+        verified.append(token)
+        return get_user(self, token)
+    monkeypatch.setattr(FakeAuth, 'get_user', counting_get_user)
+
+    res = app.test_client().post('/api/batch', headers=bearer(user), json={'requests': [
+        {'id': '1', 'method': 'GET', 'path': '/api/notifications'},
+        {'id': '2', 'method': 'POST', 'path': f"/api/notifications/{notif['id']}/read"},
+        {'id': '3', 'method': 'GET', 'path': '/api/tasks'},
+    ]})
+    assert res.status_code == 200
+    assert [r['status'] for r in res.get_json()['responses']] == [200, 200, 200]
+    assert len(verified) == 1
+
+
+def test_rejects_paths_outside_the_api(login, member):
+    res = login(member).post('/api/batch', json={'requests': [
+        {'id': '1', 'method': 'GET', 'path': '/dashboard'},
+        {'id': '2', 'method': 'POST', 'path': '/api/batch', 'body': {'requests': []}},
+    ]})
+    assert [r['status'] for r in res.get_json()['responses']] == [400, 400]
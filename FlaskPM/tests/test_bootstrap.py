@@ -0,0 +1,53 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import utils
+
+CONCURRENT_REQUESTS = 8
+TIMEOUT_SECONDS = 30
+
+
+@pytest.fixture
+def small_query_pool(monkeypatch):
+    # Fewer workers than concurrent requests: nested fan-out onto a full pool would deadlock
+    pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix=utils.QUERY_THREAD_PREFIX)
+    monkeypatch.setattr(utils, 'query_pool', pool)
+    yield pool
+    pool.shutdown(wait=False)
+
+
+def test_concurrent_bootstrap_requests_complete(db, login, users, small_query_pool):
+    db.latency = 0.005
+    statuses = []
+    lock = threading.Lock()
+
+    def fetch(user):
+        response = login(user).get('/api/bootstrap/tasks')
+        with lock:
+            statuses.append(response.status_code)
+
+    threads = [
+        threading.Thread(target=fetch, args=(users[i % len(users)],), daemon=True)
+        for i in range(CONCURRENT_REQUESTS)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(TIMEOUT_SECONDS)
+
+    assert not any(t.is_alive() for t in threads), "bootstrap requests hung on the query pool"
+    assert statuses == [200] * CONCURRENT_REQUESTS
+
+
+def test_nested_fan_out_runs_inline_on_pool_threads(small_query_pool):
+    def inner():
+        return utils.run_concurrently(threading.current_thread, threading.current_thread)
+
+    def outer():
+        return threading.current_thread(), inner()
+
+    for outer_thread, nested in utils.run_concurrently(outer, outer):
+        assert outer_thread.name.startswith(utils.QUERY_THREAD_PREFIX)
+        assert nested == [outer_thread, outer_thread]
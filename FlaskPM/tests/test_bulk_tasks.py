@@ -0,0 +1,35 @@
+import metrics
+
+
+def capture_queries(monkeypatch):
+    queries = []
+    monkeypatch.setattr(metrics, 'query_listeners',
+                        metrics.query_listeners + [lambda table, op, seconds, steps: queries.append((table, op, steps))])
+    return queries
+
+
+def test_bulk_update_is_one_statement_and_one_notification_per_recipient(db, login, admin, monkeypatch):
+    tasks = [t for t in db.table_rows('tasks') if t['status'] != 'Completed'][:5]
+    ids = [t['id'] for t in tasks]
+    notifs_before = len(db.table_rows('notifications'))
+    queries = capture_queries(monkeypatch)
+
+    res = login(admin).patch('/api/tasks/bulk', json={'ids': ids, 'updates': {'status': 'Completed'}})
+    assert res.status_code == 200
+    assert res.get_json()['updated'] == len(ids)
+
+    updates = [q for q in queries if q[:2] == ('tasks', 'update')]
+    assert len(updates) == 1
+    assert ('in_', ('id', ids)) in [(name, tuple(args)) for name, args in updates[0][2]]
+    assert all(t['status'] == 'Completed' for t in db.table_rows('tasks') if t['id'] in ids)
+
+    assert len([q for q in queries if q[:2] == ('notifications', 'insert')]) == 1
+    sent = [n['user_id'] for n in db.table_rows('notifications')[notifs_before:]]
+    admins = {u['id'] for u in db.table_rows('users') if u['role'] == 'Admin'}
+    involved = {uid for t in tasks for uid in (t.get('assigned_to'), t.get('created_by')) if uid}
+    assert sorted(sent) == sorted(admins | involved)
+
+
+def test_bulk_delete_rejects_oversized_selections(login, admin):
+    res = login(admin).post('/api/tasks/bulk/delete', json={'ids': list(range(1, 202))})
+    assert res.status_code == 400
@@ -0,0 +1,23 @@
+import pytest
+
+
+@pytest.mark.parametrize('encoding', ['gzip', 'identity'])
+def test_not_modified_echoes_the_validator_of_the_200(login, member, encoding):
+    client = login(member)
+    headers = {'Accept-Encoding': encoding}
+    first = client.get('/api/tasks', headers=headers)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert etag.startswith('W/')
+
+    again = client.get('/api/tasks', headers={**headers, 'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == etag
+
+
+def test_compressed_and_plain_bodies_share_one_validator(db, login, member):
+    client = login(member)
+    compressed = client.get('/api/team', headers={'Accept-Encoding': 'gzip'})
+    plain = client.get('/api/team', headers={'Accept-Encoding': 'identity'})
+    assert compressed.headers.get('Content-Encoding') == 'gzip'
+    assert compressed.headers['ETag'] == plain.headers['ETag']
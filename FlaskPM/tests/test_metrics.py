@@ -0,0 +1,52 @@
+import json
+import os
+
+import metrics
+
+
+def worker_file(directory, pid, dead=False, requests=0, in_flight=0):
+    data = {
+        'pid': pid,
+        'metrics': {
+            'pm_http_requests_total': [[['GET', '/api/tasks', '200'], requests]],
+            'pm_http_requests_in_flight': [[[], in_flight]],
+        },
+        'dependencies': {'smtp': {'state': 'open', 'in_flight': 0, 'successes': 1, 'failures': 2,
+                                  'timeouts': 0, 'rejected_open': 0, 'rejected_full': 0}},
+    }
+    name = f"{pid}{'.dead' if dead else ''}.json"
+    (directory / name).write_text(json.dumps(data))
+
+
+def sample(text, prefix):
+    return next(float(line.rsplit(' ', 1)[1]) for line in text.splitlines() if line.startswith(prefix))
+
+
+def test_metrics_merge_every_worker(app, login, member, tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    before = metrics.http_requests.snapshot().get(('GET', '/api/tasks', '200'), 0)
+    login(member).get('/api/tasks')
+    worker_file(tmp_path, 101, requests=5, in_flight=2)
+    worker_file(tmp_path, 102, dead=True, requests=7, in_flight=4)
+
+    text = app.test_client().get('/metrics').get_data(as_text=True)
+
+    # Exited workers still count towards the totals, but not towards the gauges
+    assert sample(text, 'pm_http_requests_total{method="GET",endpoint="/api/tasks",status="200"}') == before + 1 + 5 + 7
+    assert sample(text, 'pm_http_requests_in_flight ') == 2 + 1   # + the scrape itself
+    assert 'pm_dependency_state{dependency="smtp",worker="101"} 2' in text
+    assert 'worker="102"' not in text
+    assert f'worker="{os.getpid()}"' in text
+    assert (tmp_path / f"{os.getpid()}.json").exists()
+
+
+def test_exited_worker_is_marked_dead(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    worker_file(tmp_path, 101)
+    metrics.mark_process_dead(101)
+    assert os.listdir(tmp_path) == ['101.dead.json']
+
+
+def test_metrics_need_a_token_outside_debug(app, monkeypatch):
+    monkeypatch.setattr(app, 'testing', False)
+    assert app.test_client().get('/metrics').status_code == 403
@@ -0,0 +1,33 @@
+import pytest
+
+from query_budget import QueryBudgetExceeded
+
+BUDGETED_ROUTES = ['/api/notifications', '/api/projects', '/api/calendar/events']
+
+
+@pytest.mark.parametrize('path', BUDGETED_ROUTES)
+def test_session_check_is_not_charged_to_the_route(login, member, path):
+    response = login(member).get(path)
+    assert response.status_code == 200
+    # The app-wide user check ran too, so the request made more queries than the view did
+    assert int(response.headers['X-Query-Count']) > 0
+
+
+def test_punch_within_budget_with_session_auth(login, member):
+    response = login(member).post('/api/attendance/punch', json={})
+    assert response.status_code == 200
+
+
+def test_route_over_budget_fails(app, login, member, monkeypatch):
+    view = app.view_functions['api.get_notifications']
+    monkeypatch.setattr(view, 'query_budget', 1)
+    with pytest.raises(QueryBudgetExceeded, match=r'GET /api/notifications: 2 queries \(budget 1\)'):
+        login(member).get('/api/notifications')
+
+
+def test_bearer_and_session_count_the_same_view_queries(app, login, bearer, member):
+    session_response = login(member).get('/api/notifications')
+    bearer_response = app.test_client().get('/api/notifications', headers=bearer(member))
+    assert session_response.status_code == bearer_response.status_code == 200
+    # Only the session request pays for the app-wide user check
+    assert int(session_response.headers['X-Query-Count']) == int(bearer_response.headers['X-Query-Count']) + 1
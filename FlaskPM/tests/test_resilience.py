@@ -0,0 +1,100 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import resilience
+from resilience import Dependency, DependencyUnavailable, DependencyTimeout, CLOSED, OPEN, HALF_OPEN
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(resilience, 'time', SimpleNamespace(time=lambda: now.value, sleep=lambda s: None))
+    return now
+
+
+def fail():
+    raise ConnectionError("down")
+
+
+def test_breaker_opens_then_half_opens_and_closes(clock):
+    dep = Dependency('svc', timeout=1, max_concurrent=2, failure_threshold=2, reset_timeout=30)
+    calls = []
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            dep.call(fail)
+    assert dep.breaker.state == OPEN
+
+    with pytest.raises(DependencyUnavailable, match='circuit open'):
+        dep.call(calls.append, 'skipped')
+    assert calls == [] and dep.stats['rejected_open'] == 1
+    assert dep.call(calls.append, 'skipped', fallback=lambda: 'cached') == 'cached'
+
+    clock.value += 30
+    # One trial at a time while half-open
+    assert dep.breaker.allow() and dep.breaker.state == HALF_OPEN
+    assert not dep.breaker.allow()
+    dep.breaker.record_success()
+    assert dep.breaker.state == CLOSED
+    dep.call(calls.append, 'sent')
+    assert calls == ['sent']
+
+
+def test_failed_trial_reopens_the_circuit(clock):
+    dep = Dependency('svc', timeout=1, max_concurrent=2, failure_threshold=1, reset_timeout=30)
+    with pytest.raises(ConnectionError):
+        dep.call(fail)
+    clock.value += 30
+    with pytest.raises(ConnectionError):
+        dep.call(fail)
+    assert dep.breaker.state == OPEN
+    assert dep.breaker.retry_after() == 31
+
+
+def test_client_errors_do_not_trip_the_breaker():
+    dep = Dependency('svc', timeout=1, max_concurrent=2, failure_threshold=1)
+    err = PermissionError("bad token")
+    err.status = 401
+
+    def bad_token():
+        raise err
+    with pytest.raises(PermissionError):
+        dep.call(bad_token)
+    assert dep.breaker.state == CLOSED
+
+
+def test_full_bulkhead_rejects_instead_of_queueing():
+    dep = Dependency('svc', timeout=5, max_concurrent=1)
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return 'done'
+    worker = threading.Thread(target=lambda: dep.call(slow))
+    worker.start()
+    assert started.wait(5)
+    try:
+        with pytest.raises(DependencyUnavailable, match='too many concurrent calls'):
+            dep.call(lambda: 'never')
+        assert dep.call(lambda: 'never', fallback=lambda: 'busy') == 'busy'
+        assert dep.stats['rejected_full'] == 2
+    finally:
+        release.set()
+        worker.join(5)
+    assert dep.call(lambda: 'ok') == 'ok'
+    assert dep.breaker.state == CLOSED
+
+
+def test_timed_out_call_keeps_its_slot_until_it_finishes():
+    dep = Dependency('svc', timeout=0.05, max_concurrent=1, failure_threshold=5)
+    release = threading.Event()
+    with pytest.raises(DependencyTimeout):
+        dep.call(release.wait, 5)
+    assert dep.breaker.failures == 1
+    with pytest.raises(DependencyUnavailable, match='too many concurrent calls'):
+        dep.call(lambda: 'never')
+    release.set()
+    dep._executor().shutdown(wait=True)
+    assert dep.in_flight == 0
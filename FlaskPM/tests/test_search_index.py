@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from search_index import SearchIndex
+
+
+@pytest.fixture
+def index():
+    past = (datetime.now(timezone.utc) - timedelta(days=3)).isoformat()
+    idx = SearchIndex()
+    idx.upsert_users([
+        {'id': 'boss', 'full_name': 'Bea Boss', 'role': 'Admin'},
+        {'id': 'ana', 'full_name': 'Ana', 'role': 'Team Member'},
+        {'id': 'ben', 'full_name': 'Ben', 'role': 'Team Member'},
+    ])
+    idx.upsert_projects([
+        {'id': 1, 'title': 'Billing revamp', 'owner_id': 'ana', 'status': 'Active'},
+        {'id': 2, 'title': 'Warehouse billing', 'owner_id': 'ben', 'status': 'Active'},
+    ])
+    idx.upsert_memberships([{'id': 'm1', 'project_id': 2, 'user_id': 'ana'}])
+    idx.upsert_tasks([
+        {'id': 10, 'title': 'Invoice export', 'project_id': 1, 'assigned_to': 'ana', 'status': 'To Do', 'deadline': past},
+        {'id': 20, 'title': 'Invoice reminders', 'project_id': 2, 'assigned_to': 'ben', 'status': 'To Do', 'deadline': past},
+    ])
+    idx.upsert_comments([
+        {'id': 100, 'task_id': 10, 'user_id': 'ana', 'content': 'invoice totals are off'},
+        {'id': 200, 'task_id': 20, 'user_id': 'ben', 'content': 'invoice wording approved'},
+    ])
+    return idx
+
+
+def found(index, query, user_id):
+    return ' | '.join(snippet for _, snippet in index.search(query, user_id, k=10))
+
+
+def test_admin_sees_everything(index):
+    hits = found(index, 'invoice', 'boss')
+    assert 'Invoice export' in hits and 'Invoice reminders' in hits
+    assert 'totals are off' in hits and 'wording approved' in hits
+
+
+def test_member_sees_own_tasks_and_their_comments_only(index):
+    hits = found(index, 'invoice', 'ana')
+    assert 'Invoice export' in hits and 'totals are off' in hits
+    assert 'Invoice reminders' not in hits and 'wording approved' not in hits
+
+
+def test_projects_follow_ownership_and_membership(index):
+    assert 'Warehouse billing' in found(index, 'billing', 'ana')
+    index.remove_memberships(['m1'])
+    hits = found(index, 'billing', 'ana')
+    assert 'Billing revamp' in hits and 'Warehouse billing' not in hits
+
+
+def test_reassignment_moves_visibility(index):
+    index.upsert_tasks([{'id': 20, 'assigned_to': 'ana'}])
+    assert 'Invoice reminders' in found(index, 'invoice', 'ana')
+    assert 'Invoice reminders' not in found(index, 'invoice', 'ben')
+
+
+def test_overdue_boost_stays_in_scope(index):
+    hits = found(index, 'what is overdue', 'ben')
+    assert 'Invoice reminders' in hits and 'OVERDUE' in hits
+    assert 'Invoice export' not in hits
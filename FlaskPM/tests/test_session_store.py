@@ -0,0 +1,56 @@
+import time
+
+import pytest
+from flask import Flask, session
+
+from session_store import MemoryStore, SQLiteStore, TieredStore, ServerSideSessionInterface
+
+
+@pytest.fixture
+def shared(tmp_path):
+    return SQLiteStore(str(tmp_path / 'sessions.sqlite3'))
+
+
+@pytest.fixture
+def app(shared):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.session_interface = ServerSideSessionInterface(
+        TieredStore(MemoryStore(), shared, cache_seconds=0), touch_seconds=0)
+
+    @app.route('/login')
+    def login():
+        session['user'] = {'id': 'u1'}
+        return 'ok'
+
+    @app.route('/whoami')
+    def whoami():
+        return (session.get('user') or {}).get('id', '')
+
+    return app
+
+
+def stored_expiry(shared, client):
+    sid = client.get_cookie('session').value
+    row = shared.get_raw(sid)
+    return sid, row and row[1]
+
+
+def test_active_session_expiry_slides(app, shared):
+    client = app.test_client()
+    client.get('/login')
+    sid, first = stored_expiry(shared, client)
+    time.sleep(0.05)
+    assert client.get('/whoami').text == 'u1'
+    _, extended = stored_expiry(shared, client)
+    assert extended > first
+
+
+def test_touch_does_not_revive_a_deleted_session(app, shared):
+    client = app.test_client()
+    client.get('/login')
+    sid, _ = stored_expiry(shared, client)
+    shared.delete(sid)
+    assert client.get('/whoami').text == ''
+    assert shared.get_raw(sid) is None
+
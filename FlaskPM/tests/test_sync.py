@@ -0,0 +1,80 @@
+from datetime import datetime, timezone
+
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def sync(client, token=None):
+    response = client.get('/api/sync', query_string={'since': token} if token else None)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def ids(rows):
+    return {str(row['id']) for row in rows}
+
+
+def outside_project(db, user):
+    """A project the user neither owns nor belongs to."""
+    joined = {m['project_id'] for m in db.table_rows('project_members') if m['user_id'] == user['id']}
+    return next(p for p in db.table_rows('projects') if p['id'] not in joined and p['owner_id'] != user['id'])
+
+
+def test_added_member_receives_the_project_and_its_memberships(db, login, member):
+    client = login(member)
+    token = sync(client)['token']
+    project = outside_project(db, member)
+
+    db.seed('project_members', [{'id': 'new-membership', 'project_id': project['id'], 'user_id': member['id'],
+                                 'role': 'Member', 'created_at': now_iso(), 'updated_at': now_iso()}])
+
+    delta = sync(client, token)
+    assert not delta['full']
+    assert project['id'] in ids(delta['changes']['projects'])
+    # The other memberships didn't change, but the member has never seen them
+    expected = {str(m['id']) for m in db.table_rows('project_members') if m['project_id'] == project['id']}
+    assert expected <= ids(delta['changes']['project_members'])
+
+
+def test_newly_assigned_task_brings_its_comments(db, login, member):
+    client = login(member)
+    token = sync(client)['token']
+    task = next(t for t in db.table_rows('tasks')
+                if t['assigned_to'] != member['id'] and any(c['task_id'] == t['id'] for c in db.table_rows('comments')))
+    task.update(assigned_to=member['id'], updated_at=now_iso())
+    db.changed('tasks')
+
+    delta = sync(client, token)
+    assert str(task['id']) in ids(delta['changes']['tasks'])
+    thread = {c['id'] for c in db.table_rows('comments') if c['task_id'] == task['id']}
+    assert thread <= ids(delta['changes']['comments'])
+
+
+def test_scope_exit_tombstones_reach_only_their_member(db, login, users, member):
+    other = next(u for u in users if u['id'] != member['id'] and u['role'] != 'Admin')
+    client = login(member)
+    token = sync(client)['token']
+    db.seed('deleted_records', [
+        {'id': 9001, 'table_name': 'tasks', 'record_id': '101', 'deleted_at': now_iso(), 'user_id': member['id']},
+        {'id': 9002, 'table_name': 'tasks', 'record_id': '102', 'deleted_at': now_iso(), 'user_id': other['id']},
+        {'id': 9003, 'table_name': 'comments', 'record_id': 'gone', 'deleted_at': now_iso(), 'user_id': None},
+    ])
+
+    delta = sync(client, token)
+    assert delta['deleted']['tasks'] == ['101']
+    assert delta['deleted']['comments'] == ['gone']
+
+
+def test_role_change_marker_forces_a_full_snapshot(db, login, member):
+    client = login(member)
+    token = sync(client)['token']
+    db.seed('deleted_records', [{'id': 9100, 'table_name': '*', 'record_id': member['id'],
+                                 'deleted_at': now_iso(), 'user_id': None}])
+
+    delta = sync(client, token)
+    assert delta['full']
+    assert delta['deleted']['tasks'] == []
+    # Full snapshot: every assigned task, not just the ones changed since the token
+    assigned = {str(t['id']) for t in db.table_rows('tasks') if t['assigned_to'] == member['id']}
+    assert ids(delta['changes']['tasks']) == assigned
@@ -0,0 +1,207 @@
+"""
+Background thumbnail / preview generation for task attachments.
+
+After an upload the original is copied to a temp file and handed to a small, bounded process pool
+(Pillow work is CPU-bound and would otherwise block request threads / hold the GIL).
+Each job renders:
+  - thumbnail: small WebP for list views      -> task_attachments.thumbnail_url
+  - preview:   larger WebP for the detail view -> task_attachments.preview_url
+Images are downscaled directly; PDFs have their first page rendered (needs pypdfium2, optional).
+task_attachments.preview_status tracks the job: pending -> ready | failed | unsupported
+(or 'skipped' when the queue was full).
+"""
+import io
+import os
+import shutil
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from app_logging import get_logger
+
+log = get_logger('thumbnails')
+
+IMAGE_TYPES = {'jpg', 'jpeg', 'png', 'gif', 'webp', 'bmp', 'tif', 'tiff'}
+PDF_TYPES = {'pdf'}
+
+THUMBNAIL_SIZE = (256, 256)
+PREVIEW_SIZE = (1024, 1024)
+WEBP_QUALITY = 80
+# Refuse to decode absurdly large images (decompression bombs)
+MAX_SOURCE_PIXELS = 50_000_000
+
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 2))
+# Jobs allowed in flight (running + queued); beyond this new uploads simply get no preview
+THUMBNAIL_MAX_PENDING = int(os.environ.get('THUMBNAIL_MAX_PENDING', 16))
+THUMBNAIL_TIMEOUT = int(os.environ.get('THUMBNAIL_TIMEOUT', 60))
+
+
+def preview_kind(file_ext):
+    ext = (file_ext or '').lower()
+    if ext in IMAGE_TYPES:
+        return 'image'
+    if ext in PDF_TYPES:
+        return 'pdf'
+    return None
+
+
+# ---------------- RENDERING (runs in the worker processes) ----------------
+
+def _open_source(path, kind):
+    from PIL import Image, ImageOps
+    Image.MAX_IMAGE_PIXELS = MAX_SOURCE_PIXELS
+
+    if kind == 'pdf':
+        try:
+            import pypdfium2 as pdfium
+        except ImportError:
+            return None
+        pdf = pdfium.PdfDocument(path)
+        try:
+            page = pdf[0]
+            # Scale the page so its longest side is about the preview size
+            width, height = page.get_size()
+            scale = max(PREVIEW_SIZE) / max(width, height, 1)
+            return page.render(scale=scale).to_pil()
+        finally:
+            pdf.close()
+
+    img = Image.open(path)
+    img.seek(0)  # first frame of animated GIF/WebP
+    # Cheap downscale while decoding (JPEG draft mode) before the real resample
+    img.draft('RGB', PREVIEW_SIZE)
+    return ImageOps.exif_transpose(img)
+
+
+def _to_webp(img, size):
+    copy = img.copy()
+    copy.thumbnail(size)
+    if copy.mode not in ('RGB', 'RGBA'):
+        copy = copy.convert('RGBA' if 'A' in copy.getbands() or 'transparency' in copy.info else 'RGB')
+    out = io.BytesIO()
+    copy.save(out, 'WEBP', quality=WEBP_QUALITY, method=4)
+    return out.getvalue()
+
+
+def render_previews(path, kind):
+    """
+    Renders (thumbnail_bytes, preview_bytes) for the file at 'path', or None when the type
+    can't be rendered here. Module-level so it can be pickled into the process pool.
+    """
+    img = _open_source(path, kind)
+    if img is None:
+        return None
+    with img:
+        img.load()
+        return _to_webp(img, THUMBNAIL_SIZE), _to_webp(img, PREVIEW_SIZE)
+
+
+# ---------------- PIPELINE (runs in the web process) ----------------
+
+_render_pool = None
+_jobs_pool = None
+_pool_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(THUMBNAIL_MAX_PENDING)
+
+
+def _mp_context():
+    """
+    Never fork the web worker itself: it runs request, query-pool and logging threads, and a
+    forked child can inherit a lock one of them was holding. forkserver forks the render
+    processes from a clean single-threaded server instead (spawn where it isn't available).
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def _pools():
+    # Created lazily so each gunicorn worker gets its own pool after fork
+    global _render_pool, _jobs_pool
+    with _pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(max_workers=THUMBNAIL_WORKERS, mp_context=_mp_context())
+            # Waits on the renders and does the Storage/DB I/O for finished jobs
+            _jobs_pool = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix='thumbs')
+        return _render_pool, _jobs_pool
+
+
+def thumbnail_keys(attachment, content_hash=None):
+    """
+    Storage keys for the generated images: content-addressed (shared, like the original) when
+    content_hash is given, otherwise per attachment row.
+    """
+    if content_hash:
+        base = f"thumbs/{content_hash[:2]}/{content_hash}"
+    else:
+        base = f"{attachment['task_id']}/thumbs/{attachment['id']}"
+    return f"{base}-thumb.webp", f"{base}-preview.webp"
+
+
+def schedule_previews(attachment, stream, storage, admin_client, content_hash=None):
+    """
+    Queues preview generation for a freshly inserted attachment row.
+    'stream' is the (seekable) uploaded file; it is copied to a temp file because the request's
+    spooled upload is closed as soon as the response is sent.
+    Returns the preview_status stored on the row ('pending', 'unsupported' or 'skipped').
+    """
+    kind = preview_kind(attachment.get('file_type'))
+    if not kind:
+        return 'unsupported'
+    if not _pending.acquire(blocking=False):
+        log.warning("Thumbnail queue full, skipping previews", extra={'attachment_id': attachment['id']})
+        return 'skipped'
+
+    try:
+        fd, tmp_path = tempfile.mkstemp(prefix='pm-thumb-', suffix=f".{attachment['file_type']}")
+        with os.fdopen(fd, 'wb') as tmp:
+            stream.seek(0)
+            shutil.copyfileobj(stream, tmp, 1024 * 1024)
+        render_pool, jobs_pool = _pools()
+        future = render_pool.submit(render_previews, tmp_path, kind)
+        jobs_pool.submit(_finish_job, future, tmp_path, attachment, storage, admin_client, content_hash)
+    except Exception as e:
+        _pending.release()
+        log.error("Thumbnail Schedule Error: %s", e)
+        return 'skipped'
+    return 'pending'
+
+
+def _finish_job(future, tmp_path, attachment, storage, admin_client, content_hash):
+    from storage import BoundedReader
+
+    status, update = 'failed', {}
+    try:
+        result = future.result(timeout=THUMBNAIL_TIMEOUT)
+        if result is None:
+            status = 'unsupported'
+        else:
+            urls = []
+            for key, data in zip(thumbnail_keys(attachment, content_hash), result):
+                storage.upload_stream(key, BoundedReader(io.BytesIO(data), None), len(data), 'image/webp', upsert=True)
+                urls.append(storage.public_url(key))
+            update = {'thumbnail_url': urls[0], 'preview_url': urls[1]}
+            status = 'ready'
+    except Exception as e:
+        log.error("Thumbnail Error: %s", e, extra={'attachment_id': attachment['id']})
+    finally:
+        _pending.release()
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+    try:
+        update['preview_status'] = status
+        admin_client.table('task_attachments').update(update).eq('id', attachment['id']).execute()
+    except Exception as e:
+        log.error("Thumbnail Row Update Error: %s", e, extra={'attachment_id': attachment['id']})
+
+
+def shutdown(wait=True):
+    global _render_pool, _jobs_pool
+    with _pool_lock:
+        if _jobs_pool:
+            _jobs_pool.shutdown(wait=wait)
+        if _render_pool:
+            _render_pool.shutdown(wait=wait)
+        _render_pool = _jobs_pool = None
@@ -1,18 +1,113 @@
-from supabase import create_client, Client
+import os
+import contextvars
+import threading
+from typing import TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
 from config import Config
+from metrics import instrument
 
-def get_supabase() -> Client:
+if TYPE_CHECKING:
+    from supabase import Client
+
+def _create_client(key):
     url = Config.SUPABASE_URL
-    key = Config.SUPABASE_KEY
     if not url or not key:
         return None
-    return create_client(url, key)
+    # Imported on first use: the supabase package is over half of the app's import time
+    from supabase import create_client
+    return instrument(create_client(url, key))
 
-supabase = get_supabase()
+def get_supabase() -> 'Client':
+    """A new anon-key client (scripts). The app shares the per-process `supabase` below."""
+    return _create_client(Config.SUPABASE_KEY)
 
-def get_supabase_admin() -> Client:
-    url = Config.SUPABASE_URL
-    key = Config.SUPABASE_SERVICE_KEY
-    if not url or not key:
-        return None
-    return create_client(url, key)
+class ProcessLocalClient:
+    """
+    Per-process client handle. The real client is built on first use and again in every forked
+    worker: a client (and its HTTP connection pool) created in the gunicorn master before fork
+    must not be shared with the children. Thread-safe; attribute access goes to the real client.
+    """
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._client = None
+        self._pid = None
+
+    def get(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._client = self._factory()
+                    self._pid = pid
+        return self._client
+
+    def reset(self):
+        with self._lock:
+            self._client = None
+            self._pid = None
+
+    def __bool__(self):
+        return self.get() is not None
+
+    def __getattr__(self, name):
+        client = self.get()
+        if client is None:
+            raise RuntimeError("Supabase is not configured (SUPABASE_URL / key missing)")
+        return getattr(client, name)
+
+supabase = ProcessLocalClient(get_supabase)
+_supabase_admin = ProcessLocalClient(lambda: _create_client(Config.SUPABASE_SERVICE_KEY))
+
+def get_supabase_admin() -> 'Client':
+    """
+    Service-role client, shared by all threads of this process.
+    (Building one costs ~60ms of CPU, so it is no longer created per call.)
+    """
+    return _supabase_admin.get()
+
+def reset_clients():
+    """Drops this process's clients; gunicorn's post_fork calls this in every worker."""
+    supabase.reset()
+    _supabase_admin.reset()
+
+# Shared pool for running independent Supabase queries side by side (I/O bound, so threads are fine)
+QUERY_THREAD_PREFIX = 'query'
+query_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('QUERY_POOL_SIZE', 8)),
+    thread_name_prefix=QUERY_THREAD_PREFIX
+)
+
+def run_concurrently(*calls):
+    """
+    Runs zero-argument callables on the shared query pool and returns their results in order.
+    Each call gets a copy of the caller's context (contextvars), and the first exception is re-raised.
+    Note: Flask's request/session are NOT available inside the calls - pass values in explicitly.
+    Called from a job already on the pool (load_projects inside bootstrap_tasks), the calls run
+    inline: a pool thread waiting on jobs queued behind other waiting parents would deadlock it.
+    """
+    if len(calls) <= 1 or threading.current_thread().name.startswith(QUERY_THREAD_PREFIX + '_'):
+        return [call() for call in calls]
+    futures = [query_pool.submit(contextvars.copy_context().run, call) for call in calls]
+    return [f.result() for f in futures]
+
+# PostgREST returns at most this many rows per request (the project's max-rows setting)
+KEYSET_PAGE_SIZE = 1000
+
+def keyset_rows(query, key, page_size=None):
+    """
+    Yields every row of query() in 'key' order, one page at a time. Each page starts after the
+    last key seen (not at an offset), so rows deleted during the scan can't shift live rows
+    out of the next page, and tables larger than the server's row cap aren't cut short.
+    """
+    page_size = page_size or KEYSET_PAGE_SIZE
+    last = None
+    while True:
+        q = query()
+        if last is not None:
+            q = q.gt(key, last)
+        rows = q.order(key).limit(page_size).execute().data or []
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last = rows[-1][key]
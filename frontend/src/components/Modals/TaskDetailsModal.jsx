@@ -15,6 +15,8 @@ import {
     RectangleStackIcon
 } from '@heroicons/react/24/outline'
 import { format } from 'date-fns'
+import axios from 'axios'
+import batch from '../../services/batch'
 
 function classNames(...classes) {
     return classes.filter(Boolean).join(' ')
@@ -54,6 +56,13 @@ export default function TaskDetailsModal({ isOpen, onClose, task, projects = [],
         }
     }, [task])
 
+    useEffect(() => {
+        if (!isOpen || !task?.id) return
+        axios.get(`/api/tasks/${task.id}/attachments`)
+            .then(res => setAttachments(res.data))
+            .catch(e => console.error(e))
+    }, [isOpen, task?.id])
+
     const handleSave = () => {
         onUpdate({ ...task, ...formData })
     }
@@ -77,41 +86,34 @@ export default function TaskDetailsModal({ isOpen, onClose, task, projects = [],
         }
     }
 
-    const handleFileSelect = (e) => {
+    const handleFileSelect = async (e) => {
         const file = e.target.files[0]
-        if (!file) return
-
-        // create a mock attachment object from the real file
-        const newAttachment = {
-            id: Date.now(),
-            name: file.name,
-            size: (file.size / (1024 * 1024)).toFixed(2) + ' MB',
-            date: new Date().toISOString(),
-            file: file
-        }
-        setAttachments([...attachments, newAttachment])
-
+        if (!file || !task?.id) return
         // Reset input so same file can be selected again if needed
         e.target.value = ''
+
+        const data = new FormData()
+        data.append('file', file)
+        try {
+            const res = await axios.post(`/api/tasks/${task.id}/attachments`, data)
+            setAttachments(prev => [res.data, ...prev])
+        } catch (err) { console.error(err) }
     }
 
-    const removeAttachment = (id) => {
-        setAttachments(attachments.filter(a => a.id !== id))
+    const removeAttachment = async (id) => {
+        setAttachments(prev => prev.filter(a => a.id !== id))
+        try {
+            // Clearing out several files in a row goes out as one /api/batch call
+            await batch.delete(`/api/attachments/${id}`)
+        } catch (err) {
+            console.error(err)
+            const res = await axios.get(`/api/tasks/${task.id}/attachments`)
+            setAttachments(res.data)
+        }
     }
 
     const handleDownload = (attachment) => {
-        if (attachment.file) {
-            const url = URL.createObjectURL(attachment.file)
-            const a = document.createElement('a')
-            a.href = url
-            a.download = attachment.name
-            document.body.appendChild(a)
-            a.click()
-            document.body.removeChild(a)
-            URL.revokeObjectURL(url)
-        } else {
-            console.log("No downloadable file source found.")
-        }
+        window.open(attachment.file_url, '_blank', 'noopener')
     }
 
     if (!isOpen) return null
@@ -374,8 +376,11 @@ export default function TaskDetailsModal({ isOpen, onClose, task, projects = [],
                                                                         <DocumentIcon className="w-6 h-6" />
                                                                     </div>
                                                                     <div>
-                                                                        <p className="text-sm font-bold text-slate-800">{file.name}</p>
-                                                                        <p className="text-xs text-slate-400">{file.size} • {format(new Date(file.date), 'MMM d, yyyy')}</p>
+                                                                        <p className="text-sm font-bold text-slate-800">{file.file_name}</p>
+                                                                        <p className="text-xs text-slate-400">
+                                                                            {file.file_size ? (file.file_size / (1024 * 1024)).toFixed(2) + ' MB • ' : ''}
+                                                                            {format(new Date(file.created_at), 'MMM d, yyyy')}
+                                                                        </p>
                                                                     </div>
                                                                 </div>
                                                                 <div className="flex items-center gap-2 lg:opacity-0 lg:group-hover:opacity-100 transition-opacity">
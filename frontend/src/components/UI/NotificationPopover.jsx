@@ -2,6 +2,7 @@ import { useState, useEffect } from 'react'
 import { Popover } from '@headlessui/react'
 import { BellIcon, CheckIcon } from '@heroicons/react/24/outline'
 import axios from 'axios'
+import batch from '../../services/batch'
 import { format } from 'date-fns'
 import { Link } from 'react-router-dom'
 import { useToast } from '../../contexts/ToastContext'
@@ -46,9 +47,10 @@ export default function NotificationPopover() {
 
     const markAsRead = async (id) => {
         try {
-            await axios.post(`/api/notifications/${id}/read`)
+            // Clicking through several notifications quickly sends them as one /api/batch call
+            await batch.post(`/api/notifications/${id}/read`)
             // Optimistic update
-            setNotifications(notifications.map(n => n.id === id ? { ...n, is_read: true } : n))
+            setNotifications(prev => prev.map(n => n.id === id ? { ...n, is_read: true } : n))
             setUnreadCount(prev => Math.max(0, prev - 1))
         } catch (e) { console.error(e) }
     }
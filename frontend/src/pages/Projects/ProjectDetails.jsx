@@ -1,6 +1,7 @@
 import { useState, useEffect } from 'react'
 import { useParams, Link } from 'react-router-dom'
 import axios from 'axios'
+import batch from '../../services/batch'
 import Modal from '../../components/UI/Modal'
 import TaskDetailsModal from '../../components/Modals/TaskDetailsModal'
 import ViewTaskModal from '../../components/Modals/ViewTaskModal'
@@ -19,6 +20,7 @@ import {
 import { format } from 'date-fns'
 import { useAuth } from '../../contexts/AuthContext'
 import { useToast } from '../../contexts/ToastContext'
+import { avatarSrc } from '../../services/avatar'
 
 export default function ProjectDetails() {
     const { id } = useParams()
@@ -44,19 +46,21 @@ export default function ProjectDetails() {
     // Data for modals
     const [allUsers, setAllUsers] = useState([])
 
+    // Kanban drag-and-drop: Ctrl/Cmd-click cards to select several, then drag them together
+    const [selectedIds, setSelectedIds] = useState([])
+    const [dragOverStatus, setDragOverStatus] = useState(null)
+
     useEffect(() => {
-        fetchData()
-        fetchUsers() // Fetch full team for assignments
+        fetchData() // Includes full team for assignments
     }, [id])
 
     const fetchData = async () => {
         try {
-            const [pRes, tRes] = await Promise.all([
-                axios.get(`/api/projects/${id}`),
-                axios.get(`/api/projects/${id}/tasks`)
-            ])
-            setProject(pRes.data)
-            setTasks(tRes.data)
+            // Single round trip: project + tasks + team
+            const res = await axios.get(`/api/bootstrap/project/${id}`)
+            setProject(res.data.project)
+            setTasks(res.data.tasks)
+            setAllUsers(res.data.team)
         } catch (e) { console.error(e) }
         finally { setLoading(false) }
     }
@@ -160,17 +164,47 @@ export default function ProjectDetails() {
     const moveTask = async (taskId, currentStatus) => {
         const nextStatus = currentStatus === 'To Do' ? 'In Progress' : (currentStatus === 'In Progress' ? 'Completed' : 'To Do')
         // Optimistic
-        const oldTasks = [...tasks]
-        setTasks(tasks.map(t => t.id === taskId ? { ...t, status: nextStatus } : t))
+        setTasks(prev => prev.map(t => t.id === taskId ? { ...t, status: nextStatus } : t))
 
         try {
-            await axios.patch(`/api/tasks/${taskId}`, { status: nextStatus })
+            // A run of moves goes out as one /api/batch call
+            await batch.patch(`/api/tasks/${taskId}`, { status: nextStatus })
         } catch (e) {
-            setTasks(oldTasks)
+            setTasks(prev => prev.map(t => t.id === taskId ? { ...t, status: currentStatus } : t))
             console.error(e)
         }
     }
 
+    const toggleSelected = (taskId) => {
+        setSelectedIds(prev => prev.includes(taskId) ? prev.filter(i => i !== taskId) : [...prev, taskId])
+    }
+
+    const handleDragStart = (e, task) => {
+        const ids = selectedIds.includes(task.id) ? selectedIds : [task.id]
+        e.dataTransfer.setData('text/plain', JSON.stringify(ids))
+        e.dataTransfer.effectAllowed = 'move'
+    }
+
+    const handleDrop = async (e, status) => {
+        e.preventDefault()
+        setDragOverStatus(null)
+        let ids
+        try { ids = JSON.parse(e.dataTransfer.getData('text/plain')) } catch { return }
+        const moving = tasks.filter(t => ids.includes(t.id) && t.status !== status)
+        if (moving.length === 0) return
+
+        // Optimistic; the whole drop is ONE bulk update on the server
+        const previous = Object.fromEntries(moving.map(t => [t.id, t.status]))
+        setTasks(prev => prev.map(t => previous[t.id] ? { ...t, status } : t))
+        setSelectedIds([])
+        try {
+            await axios.patch('/api/tasks/bulk', { ids: moving.map(t => t.id), updates: { status } })
+        } catch (err) {
+            setTasks(prev => prev.map(t => previous[t.id] ? { ...t, status: previous[t.id] } : t))
+            addToast(err.response?.data?.error || 'Failed to move tasks', 'error')
+        }
+    }
+
     if (loading) return <div className="p-8 text-center text-slate-500">Loading project...</div>
     if (!project) return <div className="p-8 text-center text-red-500">Project not found.</div>
 
@@ -180,7 +214,12 @@ export default function ProjectDetails() {
     const completedTasks = tasks.filter(t => t.status === 'Completed')
 
     const TaskCard = ({ task }) => (
-        <div className="bg-white p-4 rounded-xl shadow-sm border border-slate-100 hover:shadow-md transition group relative">
+        <div
+            draggable
+            onDragStart={(e) => handleDragStart(e, task)}
+            onClick={(e) => { if (e.ctrlKey || e.metaKey) toggleSelected(task.id) }}
+            className={`bg-white p-4 rounded-xl shadow-sm border hover:shadow-md transition group relative cursor-grab ${selectedIds.includes(task.id) ? 'border-emerald-400 ring-2 ring-emerald-200' : 'border-slate-100'}`}
+        >
             <div className="flex justify-between items-start mb-2">
                 <span className={`text-xs font-bold px-2 py-0.5 rounded ${task.priority === 'High' ? 'bg-red-100 text-red-600' :
                     (task.priority === 'Medium' ? 'bg-orange-100 text-orange-600' : 'bg-green-100 text-green-600')
@@ -222,7 +261,7 @@ export default function ProjectDetails() {
                 <div className="flex -space-x-2">
                     {task.assignee ? (
                         <img
-                            src={task.assignee.avatar_url || `https://ui-avatars.com/api/?name=${task.assignee.full_name}`}
+                            src={avatarSrc(task.assigned_to, task.assignee, 24)}
                             className="w-6 h-6 rounded-full border-2 border-white"
                             title={task.assignee.full_name}
                         />
@@ -263,7 +302,7 @@ export default function ProjectDetails() {
                                 <h4 className="text-xs font-bold text-slate-400 uppercase mb-1">Team</h4>
                                 <div className="flex -space-x-2">
                                     {project.members && project.members.map((m, i) => (
-                                        <img key={i} src={m.avatar_url || `https://ui-avatars.com/api/?name=${m.full_name}`} className="w-8 h-8 rounded-full border-2 border-white" title={m.full_name} />
+                                        <img key={i} src={avatarSrc(m.id, m, 32)} className="w-8 h-8 rounded-full border-2 border-white" title={m.full_name} />
                                     ))}
                                     {(!project.members || project.members.length === 0) && <span className="text-xs text-slate-400 italic">No members</span>}
                                 </div>
@@ -293,38 +332,27 @@ export default function ProjectDetails() {
 
             {/* Kanban Board */}
             <div className="flex overflow-x-auto pb-4 space-x-6 h-[calc(100vh-350px)]">
-                {/* To Do */}
-                <div className="w-80 flex-shrink-0 flex flex-col bg-slate-100/50 rounded-2xl border border-slate-200">
-                    <div className="p-4 flex items-center justify-between border-b border-white/50">
-                        <h3 className="font-bold text-slate-700">To Do</h3>
-                        <span className="bg-slate-200 text-slate-600 px-2 py-0.5 rounded-full text-xs font-bold">{todoTasks.length}</span>
-                    </div>
-                    <div className="flex-1 overflow-y-auto p-3 space-y-3">
-                        {todoTasks.map(t => <TaskCard key={t.id} task={t} />)}
-                    </div>
-                </div>
-
-                {/* In Progress */}
-                <div className="w-80 flex-shrink-0 flex flex-col bg-slate-100/50 rounded-2xl border border-slate-200">
-                    <div className="p-4 flex items-center justify-between border-b border-white/50">
-                        <h3 className="font-bold text-amber-700">In Progress</h3>
-                        <span className="bg-amber-100 text-amber-600 px-2 py-0.5 rounded-full text-xs font-bold">{progressTasks.length}</span>
-                    </div>
-                    <div className="flex-1 overflow-y-auto p-3 space-y-3">
-                        {progressTasks.map(t => <TaskCard key={t.id} task={t} />)}
-                    </div>
-                </div>
-
-                {/* Completed */}
-                <div className="w-80 flex-shrink-0 flex flex-col bg-slate-100/50 rounded-2xl border border-slate-200">
-                    <div className="p-4 flex items-center justify-between border-b border-white/50">
-                        <h3 className="font-bold text-emerald-700">Completed</h3>
-                        <span className="bg-emerald-100 text-emerald-600 px-2 py-0.5 rounded-full text-xs font-bold">{completedTasks.length}</span>
-                    </div>
-                    <div className="flex-1 overflow-y-auto p-3 space-y-3">
-                        {completedTasks.map(t => <TaskCard key={t.id} task={t} />)}
+                {[
+                    { status: 'To Do', tasks: todoTasks, title: 'text-slate-700', badge: 'bg-slate-200 text-slate-600' },
+                    { status: 'In Progress', tasks: progressTasks, title: 'text-amber-700', badge: 'bg-amber-100 text-amber-600' },
+                    { status: 'Completed', tasks: completedTasks, title: 'text-emerald-700', badge: 'bg-emerald-100 text-emerald-600' }
+                ].map(column => (
+                    <div
+                        key={column.status}
+                        onDragOver={(e) => { e.preventDefault(); setDragOverStatus(column.status) }}
+                        onDragLeave={() => setDragOverStatus(null)}
+                        onDrop={(e) => handleDrop(e, column.status)}
+                        className={`w-80 flex-shrink-0 flex flex-col rounded-2xl border transition ${dragOverStatus === column.status ? 'bg-emerald-50 border-emerald-300' : 'bg-slate-100/50 border-slate-200'}`}
+                    >
+                        <div className="p-4 flex items-center justify-between border-b border-white/50">
+                            <h3 className={`font-bold ${column.title}`}>{column.status}</h3>
+                            <span className={`${column.badge} px-2 py-0.5 rounded-full text-xs font-bold`}>{column.tasks.length}</span>
+                        </div>
+                        <div className="flex-1 overflow-y-auto p-3 space-y-3">
+                            {column.tasks.map(t => <TaskCard key={t.id} task={t} />)}
+                        </div>
                     </div>
-                </div>
+                ))}
             </div>
 
             {/* Create Task Modal */}
@@ -8,6 +8,7 @@ import { Menu, Transition } from '@headlessui/react'
 import { Fragment } from 'react'
 import { useAuth } from '../../contexts/AuthContext'
 import { useToast } from '../../contexts/ToastContext'
+import { avatarSrc } from '../../services/avatar'
 
 export default function Projects() {
     const { isAdmin } = useAuth()
@@ -188,7 +189,7 @@ export default function Projects() {
                                 {project.members && project.members.slice(0, 4).map((m, i) => (
                                     <img
                                         key={i}
-                                        src={m.avatar_url || `https://ui-avatars.com/api/?name=${m.full_name}`}
+                                        src={avatarSrc(m.id, m, 32)}
                                         className="inline-block h-8 w-8 rounded-full ring-2 ring-white"
                                         title={m.full_name}
                                     />
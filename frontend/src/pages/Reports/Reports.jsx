@@ -21,24 +21,21 @@ export default function Reports() {
     const [logLoading, setLogLoading] = useState(true)
 
     useEffect(() => {
-        fetchStats()
-        fetchUsers()
-        fetchAttendanceLog()
+        fetchBootstrap()
     }, [])
 
-    const fetchStats = async () => {
+    // Single round trip on page load: stats + team + attendance log (Admins)
+    const fetchBootstrap = async () => {
         try {
-            const res = await axios.get('/api/stats')
-            setStats(res.data)
-        } catch (e) { console.error(e) }
-        finally { setLoading(false) }
-    }
-
-    const fetchUsers = async () => {
-        try {
-            const res = await axios.get('/api/team')
-            setUsers(res.data)
+            const res = await axios.get('/api/bootstrap/reports')
+            setStats(res.data.stats)
+            setUsers(res.data.team)
+            setAttendanceLog(res.data.attendance || [])
         } catch (e) { console.error(e) }
+        finally {
+            setLoading(false)
+            setLogLoading(false)
+        }
     }
 
     const fetchAttendanceLog = async (userId = selectedUser) => {
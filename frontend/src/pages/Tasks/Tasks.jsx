@@ -15,6 +15,7 @@ import {
 } from '@heroicons/react/24/outline'
 import { useAuth } from '../../contexts/AuthContext'
 import { useToast } from '../../contexts/ToastContext'
+import { avatarSrc } from '../../services/avatar'
 import { format, isPast, isToday, isTomorrow } from 'date-fns'
 
 export default function Tasks() {
@@ -43,6 +44,10 @@ export default function Tasks() {
     const [selectedTask, setSelectedTask] = useState(null)
     const [isViewOpen, setIsViewOpen] = useState(false)
 
+    // Multi-select (bulk status / reassign / delete go through /api/tasks/bulk*)
+    const [selectedIds, setSelectedIds] = useState([])
+    const [isBulkDeleteOpen, setIsBulkDeleteOpen] = useState(false)
+
     useEffect(() => {
         fetchData()
     }, [])
@@ -50,14 +55,11 @@ export default function Tasks() {
     const fetchData = async () => {
         setLoading(true)
         try {
-            const [tasksRes, projectsRes, teamRes] = await Promise.all([
-                axios.get('/api/tasks'),
-                axios.get('/api/projects'),
-                axios.get('/api/team')
-            ])
-            setTasks(tasksRes.data)
-            setProjects(projectsRes.data)
-            setTeam(teamRes.data)
+            // Single round trip: tasks + projects + team
+            const res = await axios.get('/api/bootstrap/tasks')
+            setTasks(res.data.tasks)
+            setProjects(res.data.projects)
+            setTeam(res.data.team)
         } catch (e) {
             console.error("Fetch Data Error:", e)
             const status = e.response?.status ? `(${e.response.status})` : ''
@@ -143,6 +145,50 @@ export default function Tasks() {
         }
     }
 
+    const toggleSelected = (taskId) => {
+        setSelectedIds(prev => prev.includes(taskId) ? prev.filter(id => id !== taskId) : [...prev, taskId])
+    }
+
+    const handleBulkStatus = async (newStatus) => {
+        if (!newStatus) return
+        try {
+            await axios.patch('/api/tasks/bulk', { ids: selectedIds, updates: { status: newStatus } })
+            setTasks(prev => prev.map(t => selectedIds.includes(t.id) ? { ...t, status: newStatus } : t))
+            addToast(`Moved ${selectedIds.length} task(s) to ${newStatus}`, 'success')
+            setSelectedIds([])
+        } catch (e) {
+            addToast(e.response?.data?.error || 'Failed to update tasks', 'error')
+        }
+    }
+
+    const handleBulkReassign = async (assigneeId) => {
+        if (assigneeId === '') return
+        const assignedTo = assigneeId === 'unassigned' ? null : assigneeId
+        try {
+            await axios.post('/api/tasks/bulk/reassign', { ids: selectedIds, assigned_to: assignedTo })
+            const assignee = team.find(m => m.id == assignedTo) || null
+            setTasks(prev => prev.map(t => selectedIds.includes(t.id) ? { ...t, assigned_to: assignedTo, assignee } : t))
+            addToast(`Reassigned ${selectedIds.length} task(s)`, 'success')
+            setSelectedIds([])
+        } catch (e) {
+            addToast(e.response?.data?.error || 'Failed to reassign tasks', 'error')
+        }
+    }
+
+    const confirmBulkDelete = async () => {
+        try {
+            const res = await axios.post('/api/tasks/bulk/delete', { ids: selectedIds })
+            const deleted = res.data.deleted
+            setTasks(prev => prev.filter(t => !deleted.includes(t.id)))
+            addToast(`Deleted ${deleted.length} task(s)`, 'success')
+            setSelectedIds([])
+        } catch (e) {
+            addToast(e.response?.data?.error || 'Error deleting tasks', 'error')
+        } finally {
+            setIsBulkDeleteOpen(false)
+        }
+    }
+
     const handleDeleteClick = (task) => {
         setTaskToDelete(task)
         setIsDeleteOpen(true)
@@ -167,6 +213,11 @@ export default function Tasks() {
         return { text: format(d, 'MMM d'), color: 'text-slate-600' }
     }
 
+    const allFilteredSelected = filteredTasks.length > 0 && filteredTasks.every(t => selectedIds.includes(t.id))
+    const toggleAllFiltered = () => {
+        setSelectedIds(allFilteredSelected ? [] : filteredTasks.map(t => t.id))
+    }
+
     if (loading) return (
         <div className="flex items-center justify-center p-20">
             <div className="animate-spin rounded-full h-12 w-12 border-b-2 border-emerald-600"></div>
@@ -218,12 +269,61 @@ export default function Tasks() {
                 </div>
             </div>
 
+            {/* Bulk Actions Bar */}
+            {selectedIds.length > 0 && (
+                <div className="flex flex-col md:flex-row items-start md:items-center gap-3 bg-emerald-50 border border-emerald-100 px-6 py-4 rounded-[2rem]">
+                    <span className="text-sm font-bold text-emerald-800">{selectedIds.length} selected</span>
+                    <div className="flex flex-wrap items-center gap-2 md:ml-auto">
+                        <select
+                            value=""
+                            onChange={(e) => handleBulkStatus(e.target.value)}
+                            className="px-4 py-2 bg-white border-none rounded-xl text-xs font-bold text-slate-600 focus:ring-2 focus:ring-emerald-500/20"
+                        >
+                            <option value="">Set status...</option>
+                            <option value="To Do">To Do</option>
+                            <option value="In Progress">In Progress</option>
+                            <option value="Completed">Completed</option>
+                        </select>
+                        <select
+                            value=""
+                            onChange={(e) => handleBulkReassign(e.target.value)}
+                            className="px-4 py-2 bg-white border-none rounded-xl text-xs font-bold text-slate-600 focus:ring-2 focus:ring-emerald-500/20"
+                        >
+                            <option value="">Reassign to...</option>
+                            <option value="unassigned">Unassigned</option>
+                            {team.map(m => <option key={m.id} value={m.id}>{m.full_name}</option>)}
+                        </select>
+                        <button
+                            onClick={() => setIsBulkDeleteOpen(true)}
+                            className="flex items-center px-4 py-2 bg-white text-red-600 text-xs font-bold rounded-xl hover:bg-red-50 transition"
+                        >
+                            <TrashIcon className="w-4 h-4 mr-1" />
+                            Delete
+                        </button>
+                        <button
+                            onClick={() => setSelectedIds([])}
+                            className="px-4 py-2 text-xs font-bold text-slate-500 hover:bg-white rounded-xl transition"
+                        >
+                            Clear
+                        </button>
+                    </div>
+                </div>
+            )}
+
             {/* Tasks Table */}
             <div className="bg-white rounded-[2.5rem] border border-slate-100 shadow-[0_20px_50px_rgba(0,0,0,0.02)] overflow-hidden">
                 <div className="overflow-x-auto">
                     <table className="w-full text-left">
                         <thead>
                             <tr className="bg-slate-50/50 border-b border-slate-100">
+                                <th className="pl-8 py-5 w-4">
+                                    <input
+                                        type="checkbox"
+                                        checked={allFilteredSelected}
+                                        onChange={toggleAllFiltered}
+                                        className="rounded border-slate-300 text-emerald-600 focus:ring-emerald-500/20"
+                                    />
+                                </th>
                                 <th className="px-8 py-5 text-[10px] font-black text-slate-400 uppercase tracking-[0.2em]">Task Details</th>
                                 <th className="px-6 py-5 text-[10px] font-black text-slate-400 uppercase tracking-[0.2em]">Project</th>
                                 <th className="px-6 py-5 text-[10px] font-black text-slate-400 uppercase tracking-[0.2em]">Status</th>
@@ -237,7 +337,15 @@ export default function Tasks() {
                             {filteredTasks.map(task => {
                                 const deadline = getDeadlineStyle(task.deadline, task.status)
                                 return (
-                                    <tr key={task.id} className="hover:bg-slate-50/80 transition-colors group">
+                                    <tr key={task.id} className={`hover:bg-slate-50/80 transition-colors group ${selectedIds.includes(task.id) ? 'bg-emerald-50/40' : ''}`}>
+                                        <td className="pl-8 py-5">
+                                            <input
+                                                type="checkbox"
+                                                checked={selectedIds.includes(task.id)}
+                                                onChange={() => toggleSelected(task.id)}
+                                                className="rounded border-slate-300 text-emerald-600 focus:ring-emerald-500/20"
+                                            />
+                                        </td>
                                         <td className="px-8 py-5">
                                             <div className="font-bold text-slate-800 line-clamp-1">{task.title}</div>
                                             <div className="text-xs text-slate-400 font-medium line-clamp-1 mt-0.5">{task.description || 'No description'}</div>
@@ -276,7 +384,7 @@ export default function Tasks() {
                                             <div className="flex items-center space-x-2">
                                                 <div className="w-7 h-7 rounded-full bg-emerald-100 flex items-center justify-center text-[10px] font-bold text-emerald-700 border-2 border-white shadow-sm overflow-hidden">
                                                     {task.assignee?.avatar_url ? (
-                                                        <img src={task.assignee.avatar_url} alt="" className="w-full h-full object-cover" />
+                                                        <img src={avatarSrc(task.assigned_to, task.assignee, 28)} alt="" className="w-full h-full object-cover" />
                                                     ) : (
                                                         <span>{task.assignee?.full_name?.[0] || '?'}</span>
                                                     )}
@@ -406,6 +514,17 @@ export default function Tasks() {
                 confirmText="Delete"
                 isDanger={true}
             />
+
+            {/* Bulk Delete Confirmation Modal */}
+            <ConfirmationModal
+                isOpen={isBulkDeleteOpen}
+                onClose={() => setIsBulkDeleteOpen(false)}
+                onConfirm={confirmBulkDelete}
+                title="Delete Tasks"
+                message={<>Are you sure you want to delete <span className="font-bold text-slate-800">{selectedIds.length} task(s)</span> permanently? This action cannot be undone.</>}
+                confirmText="Delete"
+                isDanger={true}
+            />
         </div>
     )
 }
@@ -4,6 +4,7 @@ import Modal from '../../components/UI/Modal'
 import { PlusIcon, TrashIcon, EnvelopeIcon } from '@heroicons/react/24/outline'
 import { useAuth } from '../../contexts/AuthContext'
 import { useToast } from '../../contexts/ToastContext'
+import { avatarSrc } from '../../services/avatar'
 
 export default function Team() {
     const { user, isAdmin } = useAuth()
@@ -78,7 +79,7 @@ export default function Team() {
                         <div key={member.id} className="bg-white p-6 rounded-2xl border border-slate-100 shadow-sm hover:shadow-md transition flex items-center space-x-4 relative group">
                             <div className="w-16 h-16 rounded-full bg-slate-100 flex items-center justify-center text-xl font-bold text-slate-600 border-2 border-slate-50 overflow-hidden">
                                 {member.avatar_url ? (
-                                    <img src={member.avatar_url} className="w-full h-full object-cover" />
+                                    <img src={avatarSrc(member.id, member, 64)} className="w-full h-full object-cover" />
                                 ) : (
                                     <span>{(member.full_name?.[0] || member.email?.[0] || 'U').toUpperCase()}</span>
                                 )}
@@ -0,0 +1,14 @@
+import axios from 'axios'
+
+// Small string hash (djb2) - only used to version avatar URLs
+const hash = (text) => {
+    let h = 5381
+    for (let i = 0; i < text.length; i++) h = ((h << 5) + h + text.charCodeAt(i)) | 0
+    return (h >>> 0).toString(36)
+}
+
+// Resized, cached avatar from the backend (/api/avatars/<id>) instead of the full-size
+// Google picture / ui-avatars.com. 'v' changes with the picture or name, so each URL can be
+// cached by the browser for good. 'size' is the rendered size in CSS pixels (2x for retina).
+export const avatarSrc = (userId, { avatar_url, full_name } = {}, size = 32) =>
+    `${axios.defaults.baseURL || ''}/api/avatars/${userId}?s=${size * 2}&v=${hash(`${avatar_url || ''}|${full_name || ''}`)}`
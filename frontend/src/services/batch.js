@@ -0,0 +1,65 @@
+import axios from 'axios'
+
+// Small calls fired in bursts (marking notifications read, Kanban moves, attachment deletes)
+// are queued briefly and sent as one POST /api/batch instead of one round trip each.
+const BATCH_WINDOW_MS = 30
+const BATCH_MAX_REQUESTS = 25 // Same cap as the server (BATCH_MAX_REQUESTS in api_routes.py)
+
+let queue = []
+let timer = null
+
+// Shaped like an axios error so callers can keep reading e.response?.data?.error
+const batchError = (status, data) => {
+    const error = new Error(data?.error || `Request failed with status code ${status}`)
+    error.response = { status, data }
+    return error
+}
+
+const send = async (items) => {
+    // Nothing to multiplex -> plain request
+    if (items.length === 1) {
+        const { method, path, body, resolve, reject } = items[0]
+        try {
+            const res = await axios.request({ method, url: path, data: body })
+            resolve({ status: res.status, data: res.data })
+        } catch (e) { reject(e) }
+        return
+    }
+
+    try {
+        const res = await axios.post('/api/batch', {
+            requests: items.map((item, i) => ({ id: String(i), method: item.method, path: item.path, body: item.body }))
+        })
+        res.data.responses.forEach((r, i) => {
+            if (r.status >= 200 && r.status < 300) items[i].resolve({ status: r.status, data: r.body })
+            else items[i].reject(batchError(r.status, r.body))
+        })
+    } catch (e) {
+        items.forEach(item => item.reject(e))
+    }
+}
+
+const flush = () => {
+    const items = queue
+    queue = []
+    timer = null
+    for (let i = 0; i < items.length; i += BATCH_MAX_REQUESTS) {
+        send(items.slice(i, i + BATCH_MAX_REQUESTS))
+    }
+}
+
+const enqueue = (method, path, body) => new Promise((resolve, reject) => {
+    queue.push({ method, path, body, resolve, reject })
+    if (!timer) timer = setTimeout(flush, BATCH_WINDOW_MS)
+})
+
+// Resolves to { status, data }; rejects like axios on a non-2xx sub-response.
+// Calls keep their order: writes run one at a time on the server, in the order queued.
+const batch = {
+    get: (path) => enqueue('GET', path),
+    post: (path, body) => enqueue('POST', path, body),
+    patch: (path, body) => enqueue('PATCH', path, body),
+    delete: (path) => enqueue('DELETE', path)
+}
+
+export default batch